@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+
+#--------------------------------------------------------------------------------
+# OpenWFS: run_benchmarks.py
+#
+# Measure rendering and control cost across a sweep of source counts, module
+# counts (32 speakers each) and output buffer sizes. Runs headless, using the
+# NumPy render engine (used for offline and distributed rendering) rather than
+# any audio device.
+#
+# For each setting, reports:
+#  - per-block render time (mean, median, 99th percentile and maximum)
+#  - real-time factor: render time divided by audio duration (lower is better;
+#    below 1.0 is faster than realtime)
+#  - peak resident set size of the process running the setting
+#  - OSC-to-panner control latency, from an OSC message being sent to the new
+#    position being read by a render process polling once per block. Messages
+#    pass through the spatialiser's OSC control path: the SpatialDispatcher,
+#    the PositionCoalescer and the OSCControlServer's control ticks.
+#
+# Results are written as JSON lines, one per setting, so that runs can be
+# compared between releases with --compare.
+#
+# With --live, each setting is instead rendered by the SignalFlow renderer used
+# for live playback, on a null audio backend paced at the real-time rate. The
+# render process itself records the control latency of each position update,
+# and the peak RSS is that of the render process.
+#
+# Each result records the engine that was measured: "numpy" or "signalflow".
+#--------------------------------------------------------------------------------
+
+from openwfs.engine import RenderEngine
+from openwfs.cache import DrivingFunctionCache
+from openwfs.layout import get_speaker_layout, create_module_ring
+from openwfs.positions import PositionTable
+from openwfs.automation import AutomationPlayer
+from openwfs.backend import NullBackend
+from openwfs.source import SpatialRenderer
+from openwfs.stats import RenderStats
+from openwfs.osc import SpatialDispatcher, PositionCoalescer, OSCControlServer, parse_source_positions
+from openwfs.constants import osc_control_rate
+from pythonosc.udp_client import SimpleUDPClient
+import multiprocessing
+import numpy as np
+import coloredlogs
+import itertools
+import threading
+import platform
+import socket
+import argparse
+import resource
+import logging
+import json
+import time
+import sys
+
+logger = logging.getLogger(__file__)
+
+sample_rate = 48000
+
+#--------------------------------------------------------------------------------
+# Latency messages move source 0 along the X axis, in steps of message_spacing
+# metres, so that the index of each message can be recovered from its position.
+#--------------------------------------------------------------------------------
+message_spacing = 0.01
+
+
+def get_peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """
+    Args:
+        who: RUSAGE_SELF for this process, or RUSAGE_CHILDREN for the largest child process that
+             has been joined.
+    """
+    peak_rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak_rss / (1024 * 1024)
+    return peak_rss / 1024
+
+
+def get_free_port() -> int:
+    """
+    Returns:
+        A UDP port on the loopback interface that is not currently in use.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_control_server(position_table: PositionTable, send_times: np.ndarray) -> tuple[OSCControlServer, int]:
+    """
+    Serve OSC through the same control path as the Spatialiser: position messages are dispatched
+    by a SpatialDispatcher, coalesced by a PositionCoalescer, and written to the position table
+    once per control tick. Each update is timestamped with the time at which its message was sent,
+    so that control latency measured by a render process runs from send to read.
+
+    Returns:
+        A tuple of (server, port).
+    """
+    def set_source_positions(source_indices, positions, receive_times, target_times):
+        message_indices = np.clip(np.rint(positions[:, 0] / message_spacing).astype(int), 0, len(send_times) - 1)
+        position_table.write_many(source_indices, positions, send_times[message_indices], target_times)
+
+    coalescer = PositionCoalescer(set_source_positions)
+
+    def handle_set_source_position(address, *args):
+        coalescer.push(*parse_source_positions(address, args))
+
+    dispatcher = SpatialDispatcher(coalescer.push)
+    dispatcher.map("/source/*/xyz", handle_set_source_position)
+    dispatcher.map("/sources/xyz", handle_set_source_position)
+    port = get_free_port()
+    server = OSCControlServer(("127.0.0.1", port), dispatcher, coalescer, control_interval=1.0 / osc_control_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, port
+
+
+def send_messages(port: int, send_times: np.ndarray, interval: float):
+    """
+    Send one position message for source 0 per entry of send_times, recording the time.monotonic()
+    at which each was sent.
+    """
+    client = SimpleUDPClient("127.0.0.1", port)
+    for message_index in range(len(send_times)):
+        send_times[message_index] = time.monotonic()
+        client.send_message("/source/1/xyz", [message_index * message_spacing, 0.0, 0.0])
+        time.sleep(interval)
+
+
+def run_position_reader(position_table: PositionTable,
+                        block_duration: float,
+                        read_times,
+                        num_messages: int):
+    """
+    Emulate a render process, polling the position table once per block and recording the
+    time at which each position update is first seen.
+    """
+    last_sequence = position_table.sequence
+    num_read = 0
+    deadline = time.monotonic() + 10.0
+    while num_read < num_messages and time.monotonic() < deadline:
+        if position_table.sequence != last_sequence:
+            positions, _, last_sequence = position_table.read()
+            now = time.monotonic()
+            message_index = int(round(positions[0][0] / message_spacing))
+            if 0 <= message_index < num_messages and read_times[message_index] == 0:
+                read_times[message_index] = now
+                num_read += 1
+        time.sleep(block_duration)
+
+
+def measure_control_latency(num_sources: int,
+                            buffer_size: int,
+                            num_messages: int,
+                            interval: float) -> np.ndarray:
+    """
+    Returns:
+        The latency of each OSC message that reached the reader, in seconds. Messages that are
+        superseded by a later message within the same control tick are coalesced away, so never
+        reach the reader.
+    """
+    position_table = PositionTable(num_sources)
+    send_times = np.zeros(num_messages)
+    server, port = start_control_server(position_table, send_times)
+
+    read_times = multiprocessing.RawArray("d", num_messages)
+    reader = multiprocessing.Process(target=run_position_reader,
+                                     args=(position_table, buffer_size / sample_rate, read_times, num_messages))
+    reader.start()
+    time.sleep(0.2)
+    send_messages(port, send_times, interval)
+
+    reader.join(timeout=10.0)
+    if reader.is_alive():
+        reader.terminate()
+    server.shutdown()
+
+    read_times = np.frombuffer(read_times, dtype=np.float64)
+    received = read_times > 0
+    return read_times[received] - send_times[received]
+
+
+def run_setting(num_sources: int,
+                num_modules: int,
+                buffer_size: int,
+                duration: float,
+                num_messages: int,
+                use_cache: bool = False,
+                automation_path: str = None) -> dict:
+    """
+    Benchmark a single setting. Runs in its own process, so that peak RSS is per-setting.
+    """
+    speaker_positions, speaker_orientations = get_speaker_layout(create_module_ring(num_modules))
+    cache = DrivingFunctionCache() if use_cache else None
+    engine = RenderEngine(speaker_positions, speaker_orientations, num_sources, sample_rate, buffer_size, cache=cache)
+
+    rng = np.random.default_rng(0)
+    input_block = rng.uniform(-0.5, 0.5, size=(num_sources, buffer_size)).astype(np.float32)
+    phases = np.linspace(0, 2 * np.pi, num_sources, endpoint=False)
+    player = AutomationPlayer(automation_path, num_sources) if automation_path else None
+    num_blocks = int(duration * sample_rate / buffer_size)
+    block_times = np.zeros(num_blocks)
+    active_ratios = np.zeros(num_blocks)
+    for block_index in range(num_blocks):
+        if player is not None:
+            # Replay recorded motion, looping over the recording
+            block_time = block_index * buffer_size / sample_rate
+            positions = player.positions_at(block_time % player.duration if player.duration else 0.0)
+        else:
+            # Move sources in a slow orbit so that driving functions change every block
+            angle = phases + block_index * buffer_size / sample_rate
+            positions = np.stack([np.sin(angle), np.cos(angle), np.zeros(num_sources)], axis=1)
+        t0 = time.perf_counter()
+        engine.process(input_block, positions)
+        block_times[block_index] = time.perf_counter() - t0
+        active_ratios[block_index] = engine.active_ratio
+
+    latencies = measure_control_latency(num_sources, buffer_size, num_messages, interval=0.005)
+
+    block_duration = buffer_size / sample_rate
+    return {
+        "engine": "numpy",
+        "num_sources": num_sources,
+        "num_modules": num_modules,
+        "num_speakers": len(speaker_positions),
+        "buffer_size": buffer_size,
+        "sample_rate": sample_rate,
+        "driving_function_cache": use_cache,
+        "automation": automation_path,
+        "block_time_mean_ms": 1000 * np.mean(block_times),
+        "block_time_median_ms": 1000 * np.median(block_times),
+        "block_time_p99_ms": 1000 * np.percentile(block_times, 99),
+        "block_time_max_ms": 1000 * np.max(block_times),
+        "real_time_factor": np.mean(block_times) / block_duration,
+        "active_speaker_ratio": np.mean(active_ratios),
+        "peak_rss_mb": get_peak_rss_mb(),
+        "control_latency_median_ms": 1000 * np.median(latencies) if len(latencies) else None,
+        "control_latency_p99_ms": 1000 * np.percentile(latencies, 99) if len(latencies) else None,
+        "control_messages_received": len(latencies),
+    }
+
+
+def run_live_setting(num_sources: int,
+                     num_modules: int,
+                     buffer_size: int,
+                     duration: float,
+                     num_messages: int) -> dict:
+    """
+    Benchmark the live SignalFlow renderer for a single setting, rendering to a null audio backend
+    at the real-time rate while position messages are sent through the OSC control path.
+    """
+    speaker_positions, _ = get_speaker_layout(create_module_ring(num_modules))
+    position_table = PositionTable(num_sources)
+    phases = np.linspace(0, 2 * np.pi, num_sources, endpoint=False)
+    for source_index, phase in enumerate(phases):
+        position_table.write(source_index, [np.sin(phase), np.cos(phase), 0.0])
+
+    # Render for long enough to send every message, with a margin either side
+    interval = 0.005
+    duration = max(duration, num_messages * interval + 1.0)
+    backend = NullBackend(int(duration * sample_rate), len(speaker_positions), sample_rate, buffer_size, realtime=True)
+    stats = RenderStats(1)
+    renderer = SpatialRenderer(position_table, stats=stats, backend=backend)
+    renderer.start(speaker_positions.tolist())
+    send_times = np.zeros(num_messages)
+    server, port = start_control_server(position_table, send_times)
+
+    # Wait for the render loop to start, so that latencies do not include the graph setup time
+    deadline = time.monotonic() + 10.0
+    while backend.frames_rendered[0] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    send_messages(port, send_times, interval)
+    renderer.join()
+    server.shutdown()
+
+    latency = stats.summary()["control_latency"]
+    return {
+        "engine": "signalflow",
+        "num_sources": num_sources,
+        "num_modules": num_modules,
+        "num_speakers": len(speaker_positions),
+        "buffer_size": buffer_size,
+        "sample_rate": sample_rate,
+        "block_time_mean_ms": 1000 * backend.render_seconds[0] * buffer_size / max(backend.frames_rendered[0], 1),
+        "real_time_factor": 1.0 / backend.realtime_factor if backend.realtime_factor else None,
+        "peak_rss_mb": get_peak_rss_mb(resource.RUSAGE_CHILDREN),
+        # Percentiles are estimated from the render process's latency histogram
+        "control_latency_mean_ms": 1000 * latency["mean"] if latency["count"] else None,
+        "control_latency_median_ms": 1000 * latency["median"] if latency["count"] else None,
+        "control_latency_p99_ms": 1000 * latency["p99"] if latency["count"] else None,
+        "control_messages_received": latency["count"],
+    }
+
+
+def run_setting_process(queue: multiprocessing.Queue, *args):
+    queue.put(run_setting(*args))
+
+
+def run_live_setting_process(queue: multiprocessing.Queue, *args):
+    queue.put(run_live_setting(*args))
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float):
+    """
+    Compare the real-time factor of each setting against a previous run, warning on regressions.
+    """
+    keys = ("engine", "num_sources", "num_modules", "buffer_size")
+    with open(baseline_path) as fd:
+        baseline = {}
+        for result in map(json.loads, fd):
+            if "num_sources" in result:
+                # Results from before the engine was recorded mark live runs with "live"
+                result.setdefault("engine", "signalflow" if result.get("live") else "numpy")
+                baseline[tuple(result[key] for key in keys)] = result
+    for result in results:
+        previous = baseline.get(tuple(result[key] for key in keys))
+        if previous is None:
+            continue
+        ratio = result["real_time_factor"] / previous["real_time_factor"]
+        message = "[%s] sources=%d modules=%d buffer=%d: real-time factor %.3f -> %.3f (%.2fx)" % (
+            result["engine"], result["num_sources"], result["num_modules"], result["buffer_size"],
+            previous["real_time_factor"], result["real_time_factor"], ratio)
+        if ratio > 1 + threshold:
+            logger.warning("Regression: %s" % message)
+        else:
+            logger.info(message)
+
+
+def main(args):
+    settings = list(itertools.product(args.sources, args.modules, args.buffer_sizes))
+    metadata = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+    results = []
+    output = open(args.output, "w") if args.output else sys.stdout
+    output.write(json.dumps(metadata) + "\n")
+
+    for num_sources, num_modules, buffer_size in settings:
+        queue = multiprocessing.Queue()
+        if args.live:
+            process = multiprocessing.Process(target=run_live_setting_process,
+                                              args=(queue, num_sources, num_modules, buffer_size, args.duration,
+                                                    args.messages))
+        else:
+            process = multiprocessing.Process(target=run_setting_process,
+                                              args=(queue, num_sources, num_modules, buffer_size, args.duration, args.messages,
+                                                    args.driving_function_cache, args.automation))
+        process.start()
+        result = queue.get()
+        process.join()
+        logger.info("[%s] sources=%3d modules=%2d buffer=%4d: %.3fms/block, RTF %.3f, RSS %.0fMB, latency %.2fms" %
+                    (result["engine"], num_sources, num_modules, buffer_size, result["block_time_mean_ms"],
+                     result["real_time_factor"], result["peak_rss_mb"], result["control_latency_median_ms"] or -1))
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        results.append(result)
+
+    if args.output:
+        output.close()
+    if args.compare:
+        compare(results, args.compare, args.threshold)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark render cost against sources, speakers and buffer size")
+    parser.add_argument("--verbose", action="store_true", help="Verbose output")
+    parser.add_argument("--sources", type=int, nargs="+", default=[1, 8, 32], help="Numbers of sources")
+    parser.add_argument("--modules", type=int, nargs="+", default=[4, 8, 16], help="Numbers of modules (32 speakers each)")
+    parser.add_argument("--buffer-sizes", type=int, nargs="+", default=[128, 256, 512], help="Output buffer sizes")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds of audio to render per setting")
+    parser.add_argument("--messages", type=int, default=200, help="Number of OSC messages for latency measurement")
+    parser.add_argument("--driving-function-cache", action="store_true", help="Interpolate driving functions from a cached grid")
+    parser.add_argument("--automation", help="Drive source positions from a binary automation recording")
+    parser.add_argument("--live", action="store_true", help="Benchmark the live SignalFlow renderer on a real-time null audio backend")
+    parser.add_argument("--output", help="Write JSON lines results to this file (default: stdout)")
+    parser.add_argument("--compare", help="Compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.verbose:
+        coloredlogs.install(level="DEBUG", fmt="%(asctime)s [%(levelname)s] %(message)s")
+    else:
+        coloredlogs.install(level="INFO", fmt="%(asctime)s [%(levelname)s] %(message)s")
+
+    main(args)
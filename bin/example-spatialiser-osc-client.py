@@ -12,10 +12,23 @@
 #
 # where <index> is the number of the sound source (beginning from 1), and
 # <x>, <y> and <z> are the floating-point coordinates, typically in metres.
+#
+# With --timetag-lead, each message is sent in a bundle timetagged with the
+# time at which the source should arrive at the position, so that the Python
+# spatialiser can ramp smoothly between positions sent at a much lower rate:
+#
+#    example-spatialiser-osc-client.py --rate 20 --timetag-lead 0.1
+#
+# With --server-side, a single trajectory command is sent instead, and the
+# Python spatialiser moves the source itself:
+#
+#    example-spatialiser-osc-client.py --server-side
 #--------------------------------------------------------------------------------
 
 from openwfs.constants import osc_port
 import pythonosc.udp_client
+from pythonosc.osc_bundle_builder import OscBundleBuilder
+from pythonosc.osc_message_builder import OscMessageBuilder
 import coloredlogs
 import argparse
 import logging
@@ -30,13 +43,30 @@ def main(args):
 
     x_lfo_amplitude = 1.0
     x_lfo_frequency = 0.2
-    interval = 0.01
+    interval = 1.0 / args.rate
     frame_count = 0
 
+    if args.server_side:
+        # Move the source back and forth along a line, taking half an LFO period in each direction
+        osc_client.send_message("/source/1/xyz", [-x_lfo_amplitude, 3.0, 0.0])
+        osc_client.send_message("/source/1/line", [x_lfo_amplitude, 3.0, 0.0, 0.5 / x_lfo_frequency, "pingpong"])
+        return
+
     while True:
         # Oscillate the sound source from left to right.
-        x_pos = x_lfo_amplitude * math.sin(x_lfo_frequency * math.pi * 2 * frame_count * interval)
-        osc_client.send_message("/source/1/xyz", [x_pos, 3, 0])
+        if args.timetag_lead:
+            # Send the position that the source should reach timetag_lead seconds from now
+            frame_time = frame_count * interval + args.timetag_lead
+            x_pos = x_lfo_amplitude * math.sin(x_lfo_frequency * math.pi * 2 * frame_time)
+            message = OscMessageBuilder("/source/1/xyz")
+            for value in [x_pos, 3.0, 0.0]:
+                message.add_arg(value)
+            bundle = OscBundleBuilder(time.time() + args.timetag_lead)
+            bundle.add_content(message.build())
+            osc_client.send(bundle.build())
+        else:
+            x_pos = x_lfo_amplitude * math.sin(x_lfo_frequency * math.pi * 2 * frame_count * interval)
+            osc_client.send_message("/source/1/xyz", [x_pos, 3, 0])
         frame_count += 1
         time.sleep(interval)
 
@@ -46,6 +76,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the spatialiser")
     parser.add_argument("--verbose", action="store_true", help="Verbose output")
     parser.add_argument("--osc-port", type=int, default=osc_port)
+    parser.add_argument("--rate", type=float, default=100.0, help="Position messages per second")
+    parser.add_argument("--server-side", action="store_true",
+                        help="Send a single trajectory command, and let the spatialiser move the source")
+    parser.add_argument("--timetag-lead", type=float, default=0.0,
+                        help="Send timetagged bundles, this many seconds ahead of the position's time")
     args = parser.parse_args()
 
     if args.verbose:
@@ -2,36 +2,45 @@
 
 #--------------------------------------------------------------------------------
 # OpenWFS: generate-spat-layout.py
-# 
+#
 # Generate coordinates for every driver of an OpenWFS module array, for use
-# in the Max/MSP Spat spatialiser.
-# 
+# in the Max/MSP Spat spatialiser, or as JSON or a binary compiled layout.
+#
 # Configuration should be done by modifying the contents of
 # spatialiser/constants.py, updating the `module_layout` lines with the
 # centroid positions of each of the OpenWFS modules.
 #--------------------------------------------------------------------------------
 
 
-from openwfs import Spatialiser
+from openwfs.layout import compile_layout, format_spat_layout, format_json_layout, save_layout
+from openwfs.constants import layout_cache_dir
 import coloredlogs
 import argparse
-import numpy as np
 
 import logging
 logger = logging.getLogger(__file__)
 
 def main(args):
-    spatialiser = Spatialiser()
+    layout = compile_layout(cache_dir=None if args.no_cache else args.cache_dir)
+    logger.info("Compiled layout %s with %d speakers" % (layout.key, layout.num_speakers))
+    if args.format == "binary":
+        save_layout(layout, args.output_file)
+        return
     with open(args.output_file, "w") as fd:
-        layout = spatialiser.dump_spat_layout()
-        fd.write(layout + "\n")
+        if args.format == "json":
+            fd.write(format_json_layout(layout) + "\n")
+        else:
+            fd.write(format_spat_layout(layout) + "\n")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate coefficients for Spat")
     parser.add_argument("--verbose", action="store_true", help="Verbose output")
+    parser.add_argument("--format", choices=["spat", "json", "binary"], default="spat",
+                        help="Output format: Spat OSC messages, JSON, or a binary compiled layout (.npy)")
+    parser.add_argument("--cache-dir", default=layout_cache_dir, help="Directory of cached compiled layouts")
+    parser.add_argument("--no-cache", action="store_true", help="Always recompile the layout")
     parser.add_argument("output_file", help="Path to Spat's speaker-layout.txt file")
     args = parser.parse_args()
 
-    coloredlogs.install(level="WARNING", fmt="%(asctime)s [%(levelname)s] %(message)s")
-
+    coloredlogs.install(level="INFO" if args.verbose else "WARNING", fmt="%(asctime)s [%(levelname)s] %(message)s")
     main(args)
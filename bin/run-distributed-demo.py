@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+#--------------------------------------------------------------------------------
+# OpenWFS: run-distributed-demo.py
+#
+# Demonstrate distributed rendering on a single host. Starts several render
+# node processes, each rendering an equal share of the modules of a ring
+# array, and a coordinator that moves every source in an orbit, sending
+# positions to the nodes over loopback UDP.
+#
+# At the end of the run, reports the render cost of each node and verifies
+# that every node applied each position update on the same block. With
+# --output-dir, each node also writes its rendered speakers to a WAV file.
+#--------------------------------------------------------------------------------
+
+from openwfs.distributed import RenderCoordinator, RenderNode, FileOutput
+from openwfs.layout import create_module_ring
+from openwfs.constants import num_speakers_per_module
+import multiprocessing
+import numpy as np
+import coloredlogs
+import argparse
+import time
+import os
+
+import logging
+logger = logging.getLogger(__file__)
+
+sample_rate = 48000
+block_size = 256
+
+
+def run_node(port: int, module_indices: list[int], num_modules: int, num_sources: int, duration: float, queue,
+             output_dir: str = None):
+    rng = np.random.default_rng(0)
+    noise = rng.uniform(-0.5, 0.5, size=(num_sources, block_size)).astype(np.float32)
+    output = None
+    if output_dir is not None:
+        output = FileOutput(os.path.join(output_dir, "node-%d.wav" % port), len(module_indices) * num_speakers_per_module, duration,
+                            sample_rate)
+    node = RenderNode(port,
+                      module_indices,
+                      num_sources,
+                      sample_rate,
+                      block_size,
+                      modules=create_module_ring(num_modules),
+                      input_callback=lambda block_index: noise,
+                      output_callback=output,
+                      host="127.0.0.1",
+                      log_applied_blocks=True)
+    queue.put(("ready", port))
+    node.run(duration=duration)
+    node.close()
+    if output is not None:
+        output.close()
+    queue.put(("done", {
+        "port": port,
+        "num_speakers": len(node.speaker_indices),
+        "num_blocks": node.num_blocks,
+        "render_time_mean_ms": 1000 * node.render_time.mean,
+        "render_time_p99_ms": 1000 * node.render_time.percentile(99),
+        "num_late_updates": node.num_late_updates,
+        "applied_blocks": node.applied_blocks,
+    }))
+
+
+def main(args):
+    module_chunks = np.array_split(np.arange(args.modules), args.nodes)
+    ports = [args.port + node_index for node_index in range(args.nodes)]
+
+    queue = multiprocessing.Queue()
+    processes = []
+    for port, module_indices in zip(ports, module_chunks):
+        process = multiprocessing.Process(target=run_node,
+                                          args=(port, module_indices.tolist(), args.modules, args.sources,
+                                                args.duration, queue, args.output_dir))
+        process.start()
+        processes.append(process)
+    for _ in processes:
+        queue.get()
+
+    coordinator = RenderCoordinator([("127.0.0.1", port) for port in ports], args.sources, sample_rate, block_size)
+    logger.info("Rendering %d sources to %d modules across %d nodes for %.1fs..." %
+                (args.sources, args.modules, args.nodes, args.duration))
+    phases = np.linspace(0, 2 * np.pi, args.sources, endpoint=False)
+    all_sources = np.arange(args.sources)
+    start_time = time.time()
+    # Continue sending until every node has finished, so that no node waits for its first packet
+    while any(process.is_alive() for process in processes) and queue.empty():
+        angle = phases + (time.time() - start_time) * 0.5
+        positions = np.stack([np.sin(angle), np.cos(angle), np.zeros(args.sources)], axis=1)
+        coordinator.send_positions(all_sources, positions)
+        time.sleep(1.0 / args.rate)
+    coordinator.close()
+
+    results = [queue.get()[1] for _ in processes]
+    for process in processes:
+        process.join()
+
+    block_duration_ms = 1000 * block_size / sample_rate
+    for result in sorted(results, key=lambda result: result["port"]):
+        logger.info("Node %d: %d speakers, %d blocks, %.3fms/block (p99 %.3fms, %.0f%% of block), %d late updates" %
+                    (result["port"], result["num_speakers"], result["num_blocks"], result["render_time_mean_ms"],
+                     result["render_time_p99_ms"], 100 * result["render_time_mean_ms"] / block_duration_ms,
+                     result["num_late_updates"]))
+
+    # Compare the block on which each update was applied, across updates applied by every node
+    common = set.intersection(*[set(result["applied_blocks"]) for result in results])
+    mismatched = [sequence for sequence in common
+                  if len(set(result["applied_blocks"][sequence] for result in results)) > 1]
+    if mismatched:
+        logger.warning("%d of %d updates were applied on different blocks" % (len(mismatched), len(common)))
+    else:
+        logger.info("All %d updates were applied on the same block by every node" % len(common))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Demonstrate distributed rendering on localhost")
+    parser.add_argument("--verbose", action="store_true", help="Verbose output")
+    parser.add_argument("--nodes", type=int, default=2, help="Number of render nodes")
+    parser.add_argument("--modules", type=int, default=8, help="Number of modules (32 speakers each)")
+    parser.add_argument("--sources", type=int, default=8, help="Number of sources")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to render")
+    parser.add_argument("--rate", type=float, default=100.0, help="Position updates per second")
+    parser.add_argument("--port", type=int, default=9140, help="UDP port of the first node")
+    parser.add_argument("--output-dir", help="Write each node's rendered speakers to a WAV file in this directory")
+    args = parser.parse_args()
+
+    if args.verbose:
+        coloredlogs.install(level="DEBUG", fmt="%(asctime)s [%(levelname)s] %(message)s")
+    else:
+        coloredlogs.install(level="INFO", fmt="%(asctime)s [%(levelname)s] %(message)s")
+
+    main(args)
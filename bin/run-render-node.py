@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+#--------------------------------------------------------------------------------
+# OpenWFS: run-render-node.py
+#
+# Run a render node for distributed rendering. The node renders the speakers
+# of the given modules (indices into `module_layout` in constants.py), using
+# source positions sent by a spatialiser running with audio_engine set to
+# "distributed", which should list this node's address in `render_nodes`.
+#
+# Source audio is read from a multichannel WAV file, looped, with one channel
+# per source. Every node must read the same file, so that all nodes render the
+# same audio on each block.
+#
+# The rendered speakers are played on the configured output device, one
+# channel per speaker, in module order. With --output, they are instead
+# written to a WAV file of --duration seconds, after which the node exits.
+#--------------------------------------------------------------------------------
+
+from openwfs.distributed import RenderNode, DeviceOutput, FileOutput
+from openwfs.audiofile import WavFile
+from openwfs.constants import num_sources, num_speakers_per_module, render_sample_rate, output_buffer_size
+import numpy as np
+import coloredlogs
+import argparse
+
+import logging
+logger = logging.getLogger(__file__)
+
+
+def create_file_input(path: str, num_sources: int, block_size: int):
+    reader = WavFile(path)
+    if reader.sample_rate != render_sample_rate:
+        logger.warning("Input sample rate (%dHz) does not match render_sample_rate (%dHz)" %
+                       (reader.sample_rate, render_sample_rate))
+
+    def read_block(block_index: int) -> np.ndarray:
+        input_block = np.zeros((num_sources, block_size), dtype=np.float32)
+        start = (block_index * block_size) % reader.num_frames
+        block = reader.read(start, block_size)[:num_sources]
+        input_block[:len(block)] = block
+        return input_block
+
+    return read_block
+
+
+def main(args):
+    input_callback = None
+    if args.input:
+        input_callback = create_file_input(args.input, num_sources, output_buffer_size)
+    num_outputs = len(args.modules) * num_speakers_per_module
+    if args.output:
+        if args.duration is None:
+            raise ValueError("--duration must be specified with --output")
+        output = FileOutput(args.output, num_outputs, args.duration)
+    else:
+        output = DeviceOutput(num_outputs)
+    node = RenderNode(args.port, args.modules, num_sources, input_callback=input_callback, output_callback=output)
+    logger.info("Render node listening on port %d, modules %s" % (node.port, args.modules))
+    block_duration = output_buffer_size / render_sample_rate
+    num_blocks = None if args.duration is None else int(np.ceil(args.duration / block_duration))
+    try:
+        while num_blocks is None or node.num_blocks < num_blocks:
+            interval = args.log_interval
+            if num_blocks is not None:
+                # Rounded up by half a block, as run() renders a whole number of blocks
+                interval = min(interval, (num_blocks - node.num_blocks + 0.5) * block_duration)
+            node.run(duration=interval)
+            logger.info("Rendered %d blocks, %.3fms/block (p99 %.3fms), %d late updates" %
+                        (node.num_blocks, 1000 * node.render_time.mean, 1000 * node.render_time.percentile(99),
+                         node.num_late_updates))
+    except KeyboardInterrupt:
+        print("Terminating...")
+    output.close()
+    node.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a distributed render node")
+    parser.add_argument("--verbose", action="store_true", help="Verbose output")
+    parser.add_argument("--port", type=int, default=9140, help="UDP port to receive source positions on")
+    parser.add_argument("--modules", type=int, nargs="+", required=True, help="Indices of the modules to render")
+    parser.add_argument("--input", help="Multichannel WAV file of source audio, one channel per source")
+    parser.add_argument("--output", help="Write the rendered speakers to this WAV file, rather than the output device")
+    parser.add_argument("--duration", type=float, help="Seconds to render before exiting (required with --output)")
+    parser.add_argument("--log-interval", type=float, default=10.0, help="Seconds between statistics log lines")
+    args = parser.parse_args()
+
+    if args.verbose:
+        coloredlogs.install(level="DEBUG", fmt="%(asctime)s [%(levelname)s] %(message)s")
+    else:
+        coloredlogs.install(level="INFO", fmt="%(asctime)s [%(levelname)s] %(message)s")
+
+    main(args)
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
 from openwfs import Spatialiser
+from openwfs.offline import render_offline
+from openwfs.calibration import analyse_recording_file
+from openwfs.layout import compile_layout
+from openwfs.constants import calibration_mic_position
 import coloredlogs
 import argparse
 import time
@@ -9,16 +13,36 @@ import logging
 logger = logging.getLogger(__file__)
 
 def main(args):
+    if args.render:
+        if not args.automation or not args.output:
+            raise ValueError("--render requires --automation and --output")
+        render_offline(args.render, args.automation, args.output, num_processes=args.processes)
+        return
+    if args.analyse_calibration:
+        if not args.output:
+            raise ValueError("--analyse-calibration requires --output")
+        layout = compile_layout()
+        calibration = analyse_recording_file(args.analyse_calibration, layout.num_speakers,
+                                             layout.positions, calibration_mic_position)
+        calibration.save(args.output)
+        return
+
     logger.info("Creating spatialiser...")
     spatialiser = Spatialiser(show_cpu=args.show_cpu)
 
     try:
         if args.sound_check:
             spatialiser.run_sound_check()
+        elif args.calibrate:
+            spatialiser.run_calibration(args.calibrate, args.save_recording)
         elif args.dump_spat_layout:
-            spatialiser.dump_spat_layout()
+            print(spatialiser.dump_spat_layout(), end="")
         else:
             spatialiser.start()
+            if args.record:
+                spatialiser.start_recording(args.record)
+            if args.play:
+                spatialiser.play_automation(args.play, loop=args.loop)
             while True:
                 spatialiser.tick()
                 time.sleep(2)
@@ -31,7 +55,17 @@ if __name__ == "__main__":
     parser.add_argument("--sound-check", action="store_true", help="Run a sound check")
     parser.add_argument("--show-cpu", action="store_true", help="Show CPU usage")
     parser.add_argument("--verbose", action="store_true", help="Verbose output")
+    parser.add_argument("--calibrate", metavar="OUTPUT", help="Measure every driver with exponential sweeps, and save per-driver corrections")
+    parser.add_argument("--save-recording", metavar="PATH", help="Save the microphone recording of --calibrate to a WAV file")
+    parser.add_argument("--analyse-calibration", metavar="RECORDING", help="Compute per-driver corrections from a recorded calibration, saving them to --output")
     parser.add_argument("--dump-spat-layout", action="store_true", help="Print speaker layout suitable for Max/MSP Spat config")
+    parser.add_argument("--record", metavar="PATH", help="Record source position updates to a binary automation file")
+    parser.add_argument("--play", metavar="PATH", help="Replay source positions from a binary automation file")
+    parser.add_argument("--loop", action="store_true", help="Loop automation playback")
+    parser.add_argument("--render", metavar="INPUT", help="Render a multichannel WAV file offline, without audio devices")
+    parser.add_argument("--automation", help="Position automation file for --render (CSV or binary recording)")
+    parser.add_argument("--output", help="Output WAV file for --render, or calibration file for --analyse-calibration")
+    parser.add_argument("--processes", type=int, default=None, help="Number of processes for --render (default: number of CPUs)")
     args = parser.parse_args()
 
     if args.verbose:
@@ -0,0 +1,161 @@
+import struct
+import numpy as np
+
+#--------------------------------------------------------------------------------
+# Memory-mapped WAV file I/O.
+#
+# Sample data is never loaded into memory in full: readers and writers map the
+# data chunk of the file, so that multiple processes can read from and write to
+# disjoint blocks or channels of the same file concurrently. Files larger than
+# 4GB are written in the RF64 format.
+#--------------------------------------------------------------------------------
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+RIFF_SIZE_LIMIT = 0xFFFFFFFF
+
+
+class WavFile:
+    def __init__(self, path: str):
+        """
+        Read a PCM (16/24/32-bit) or IEEE float (32/64-bit) WAV or RF64 file, memory-mapping
+        its sample data.
+
+        Args:
+            path: The path to the file.
+        """
+        self.path = path
+        with open(path, "rb") as fd:
+            riff_id, riff_size, wave_id = struct.unpack("<4sI4s", fd.read(12))
+            if riff_id not in (b"RIFF", b"RF64") or wave_id != b"WAVE":
+                raise ValueError("Not a WAV file: %s" % path)
+            data_size_64 = None
+            format_tag = None
+            while True:
+                header = fd.read(8)
+                if len(header) < 8:
+                    raise ValueError("WAV file has no data chunk: %s" % path)
+                chunk_id, chunk_size = struct.unpack("<4sI", header)
+                if chunk_id == b"ds64":
+                    _, data_size_64 = struct.unpack("<QQ", fd.read(16))
+                    fd.seek(chunk_size - 16, 1)
+                elif chunk_id == b"fmt ":
+                    fmt = fd.read(chunk_size)
+                    format_tag, self.num_channels, self.sample_rate = struct.unpack("<HHI", fmt[:8])
+                    bits_per_sample, = struct.unpack("<H", fmt[14:16])
+                    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+                        format_tag, = struct.unpack("<H", fmt[24:26])
+                elif chunk_id == b"data":
+                    self.data_offset = fd.tell()
+                    data_size = data_size_64 if chunk_size == RIFF_SIZE_LIMIT and data_size_64 else chunk_size
+                    break
+                else:
+                    fd.seek(chunk_size + (chunk_size % 2), 1)
+
+        if format_tag is None:
+            raise ValueError("WAV file has no fmt chunk: %s" % path)
+        self.bytes_per_sample = bits_per_sample // 8
+        self.num_frames = data_size // (self.bytes_per_sample * self.num_channels)
+
+        if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits_per_sample in (32, 64):
+            self.dtype = np.dtype("<f%d" % self.bytes_per_sample)
+            self.scale = 1.0
+        elif format_tag == WAVE_FORMAT_PCM and bits_per_sample in (16, 32):
+            self.dtype = np.dtype("<i%d" % self.bytes_per_sample)
+            self.scale = 1.0 / (2 ** (bits_per_sample - 1))
+        elif format_tag == WAVE_FORMAT_PCM and bits_per_sample == 24:
+            self.dtype = np.dtype("u1")
+            self.scale = 1.0 / (2 ** 23)
+        else:
+            raise ValueError("Unsupported WAV format (format %d, %d bits): %s" % (format_tag, bits_per_sample, path))
+
+        if self.dtype.itemsize == self.bytes_per_sample:
+            shape = (self.num_frames, self.num_channels)
+        else:
+            shape = (self.num_frames, self.num_channels, self.bytes_per_sample)
+        self.data = np.memmap(path, dtype=self.dtype, mode="r", offset=self.data_offset, shape=shape)
+
+    @property
+    def duration(self) -> float:
+        return self.num_frames / self.sample_rate
+
+    def read(self, start: int, num_frames: int) -> np.ndarray:
+        """
+        Read a block of audio. Frames beyond the end of the file are returned as silence.
+
+        Args:
+            start: The index of the first frame to read.
+            num_frames: The number of frames to read.
+
+        Returns:
+            A float32 array of shape [num_channels, num_frames].
+        """
+        block = np.zeros((self.num_channels, num_frames), dtype=np.float32)
+        end = min(start + num_frames, self.num_frames)
+        if end <= start:
+            return block
+        frames = self.data[start:end]
+        if frames.ndim == 3:
+            # 24-bit PCM: sign-extend little-endian byte triplets to 32 bits
+            frames = frames.astype(np.int32)
+            frames = frames[..., 0] | (frames[..., 1] << 8) | (frames[..., 2] << 16)
+            frames = np.where(frames >= (1 << 23), frames - (1 << 24), frames)
+        block[:, :end - start] = frames.T * self.scale
+        return block
+
+
+def create_wav(path: str, num_channels: int, num_frames: int, sample_rate: int) -> np.memmap:
+    """
+    Create a 32-bit float WAV file of a fixed length, filled with silence, and memory-map its
+    sample data for writing. Files whose data exceeds 4GB are written as RF64.
+
+    Args:
+        path: The path to write to.
+        num_channels: The number of channels.
+        num_frames: The number of frames.
+        sample_rate: The sample rate, in Hz.
+
+    Returns:
+        A writable float32 memmap of shape [num_frames, num_channels].
+    """
+    bytes_per_sample = 4
+    data_size = num_frames * num_channels * bytes_per_sample
+    channel_mask = 0
+    fmt = struct.pack("<HHIIHHHHIH14s",
+                      WAVE_FORMAT_EXTENSIBLE, num_channels, sample_rate,
+                      sample_rate * num_channels * bytes_per_sample,
+                      num_channels * bytes_per_sample, bytes_per_sample * 8,
+                      22, bytes_per_sample * 8, channel_mask,
+                      WAVE_FORMAT_IEEE_FLOAT,
+                      b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71")
+
+    # The ds64 chunk is the same size as a JUNK chunk, so the header length is fixed.
+    header_size = 12 + (8 + 28) + (8 + len(fmt)) + 8
+    riff_size = header_size - 8 + data_size
+    is_rf64 = riff_size > RIFF_SIZE_LIMIT
+
+    with open(path, "wb") as fd:
+        if is_rf64:
+            fd.write(struct.pack("<4sI4s", b"RF64", RIFF_SIZE_LIMIT, b"WAVE"))
+            fd.write(struct.pack("<4sIQQQI", b"ds64", 28, riff_size, data_size, num_frames, 0))
+        else:
+            fd.write(struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE"))
+            fd.write(struct.pack("<4sI28s", b"JUNK", 28, bytes(28)))
+        fd.write(struct.pack("<4sI", b"fmt ", len(fmt)) + fmt)
+        fd.write(struct.pack("<4sI", b"data", RIFF_SIZE_LIMIT if is_rf64 else data_size))
+        fd.truncate(header_size + data_size)
+
+    return open_wav_for_writing(path, num_channels, num_frames)
+
+
+def open_wav_for_writing(path: str, num_channels: int, num_frames: int) -> np.memmap:
+    """
+    Memory-map the sample data of a file created by create_wav(), so that further
+    processes can write to it concurrently.
+
+    Returns:
+        A writable float32 memmap of shape [num_frames, num_channels].
+    """
+    header_size = 12 + (8 + 28) + (8 + 40) + 8
+    return np.memmap(path, dtype="<f4", mode="r+", offset=header_size, shape=(num_frames, num_channels))
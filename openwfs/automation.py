@@ -0,0 +1,292 @@
+import os
+import time
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# Binary automation recordings.
+#
+# A recording is a fixed-size header followed by fixed-width records, one per
+# source position update, in order of time. Records can be appended to a
+# recording at any time, and recordings are read via memory-mapped I/O, so
+# that long recordings never need to be loaded into memory.
+#--------------------------------------------------------------------------------
+
+automation_magic = b"OWFSAUTO"
+automation_version = 1
+
+header_dtype = np.dtype([("magic", "S8"),
+                         ("version", "<u4"),
+                         ("num_sources", "<u4"),
+                         ("record_size", "<u4"),
+                         ("reserved", "<u4", 5)])
+
+#--------------------------------------------------------------------------------
+# Each record holds the time of the update in seconds since the start of the
+# recording, the 0-indexed source, and the source's [x, y, z] position.
+#--------------------------------------------------------------------------------
+record_dtype = np.dtype([("time", "<f8"),
+                         ("source", "<u4"),
+                         ("position", "<f4", 3)])
+
+
+def is_automation_recording(path: str) -> bool:
+    """
+    Returns:
+        True if the file at the given path is a binary automation recording.
+    """
+    with open(path, "rb") as fd:
+        return fd.read(len(automation_magic)) == automation_magic
+
+
+def read_header(path: str) -> np.ndarray:
+    header = np.fromfile(path, dtype=header_dtype, count=1)
+    if len(header) == 0 or header["magic"][0] != automation_magic:
+        raise ValueError("Not an automation recording: %s" % path)
+    if header["version"][0] != automation_version or header["record_size"][0] != record_dtype.itemsize:
+        raise ValueError("Unsupported automation recording version: %s" % path)
+    return header[0]
+
+
+class AutomationRecorder:
+    def __init__(self, path: str, num_sources: int):
+        """
+        Records timestamped source positions to a binary automation file. If the file already
+        exists, new records are appended, with times continuing from the end of the recording.
+
+        Recording may be called from several threads (OSC, MIDI and animation).
+
+        Args:
+            path: The path of the recording.
+            num_sources: The number of sources.
+        """
+        self.path = path
+        self.num_sources = num_sources
+        self.lock = threading.Lock()
+        self.time_offset = 0.0
+        self.last_time = 0.0
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            header = read_header(path)
+            if header["num_sources"] != num_sources:
+                raise ValueError("Cannot append to recording of %d sources with %d sources" %
+                                 (header["num_sources"], num_sources))
+            records = np.memmap(path, dtype=record_dtype, mode="r", offset=header_dtype.itemsize)
+            if len(records):
+                self.time_offset = self.last_time = float(records["time"][-1])
+            del records
+            self.fd = open(path, "ab")
+        else:
+            self.fd = open(path, "wb")
+            header = np.zeros(1, dtype=header_dtype)
+            header["magic"] = automation_magic
+            header["version"] = automation_version
+            header["num_sources"] = num_sources
+            header["record_size"] = record_dtype.itemsize
+            self.fd.write(header.tobytes())
+        self.start_time = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, source_indices: np.ndarray, positions: np.ndarray, update_times: np.ndarray = None):
+        """
+        Append the positions of one or more sources.
+
+        Args:
+            source_indices: The 0-indexed source indices.
+            positions: The [x, y, z] position of each source, of shape [len(source_indices), 3].
+            update_times: The time.monotonic() at which each update was received. Defaults to now.
+        """
+        source_indices = np.atleast_1d(np.asarray(source_indices, dtype=int))
+        if update_times is None:
+            update_times = np.full(len(source_indices), time.monotonic())
+        records = np.zeros(len(source_indices), dtype=record_dtype)
+        records["source"] = source_indices
+        records["position"] = np.asarray(positions, dtype=float).reshape(-1, 3)
+
+        with self.lock:
+            if self.fd is None:
+                return
+            # Records must be in order of time. Updates received on different threads may arrive
+            # slightly out of order, so times are clamped to be non-decreasing.
+            times = self.time_offset + np.asarray(update_times, dtype=float) - self.start_time
+            order = np.argsort(times, kind="stable")
+            records = records[order]
+            records["time"] = np.maximum(times[order], self.last_time)
+            self.fd.write(records.tobytes())
+            self.last_time = float(records["time"][-1])
+
+    def flush(self):
+        with self.lock:
+            if self.fd is not None:
+                self.fd.flush()
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                self.fd.close()
+                self.fd = None
+
+
+class AutomationPlayer:
+    def __init__(self, path: str, num_sources: int = None, max_interpolation_gap: float = 0.5):
+        """
+        Plays back a binary automation recording, reading it via memory-mapped I/O.
+
+        Each source is interpolated linearly between consecutive records that are no more than
+        max_interpolation_gap seconds apart. Across a longer gap, the source holds its position
+        until the next record, as it did when the recording was made. Before its first record, a
+        source remains at the origin; after its last, it holds its last position.
+
+        Playback is most efficient when positions are requested in order of time. Seeking
+        backwards scans the recording backwards from the seek point.
+
+        Args:
+            path: The path of the recording.
+            num_sources: The number of sources to return. Defaults to the number in the recording.
+                         Sources beyond those in the recording remain at the origin.
+            max_interpolation_gap: The longest interval between records to interpolate over, in seconds.
+        """
+        header = read_header(path)
+        self.path = path
+        self.num_sources = int(header["num_sources"]) if num_sources is None else num_sources
+        self.max_interpolation_gap = max_interpolation_gap
+        self._open()
+
+    def _open(self):
+        self.records = np.memmap(self.path, dtype=record_dtype, mode="r", offset=header_dtype.itemsize)
+        self.times = self.records["time"]
+        self.seek(0.0)
+
+    def __getstate__(self):
+        # The memory map is reopened by each process, rather than being pickled
+        return {"path": self.path,
+                "num_sources": self.num_sources,
+                "max_interpolation_gap": self.max_interpolation_gap}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def duration(self) -> float:
+        return float(self.times[-1]) if len(self.records) else 0.0
+
+    def seek(self, time: float, chunk_size: int = 65536):
+        """
+        Move the playback cursor to the given time, finding the most recent record of each source.
+        """
+        self.cursor = int(np.searchsorted(self.times, time, side="right"))
+        self.cursor_time = time
+        self.last_times = np.full(self.num_sources, np.nan)
+        self.last_positions = np.zeros((self.num_sources, 3))
+        end = self.cursor
+        while end > 0 and np.any(np.isnan(self.last_times)):
+            start = max(0, end - chunk_size)
+            chunk = self.records[start:end]
+            self._apply_latest(chunk, only_missing=True)
+            end = start
+
+    def _apply_latest(self, records: np.ndarray, only_missing: bool = False):
+        # Find the last record of each source within the given records
+        sources = records["source"][::-1]
+        sources, reverse_indices = np.unique(sources, return_index=True)
+        indices = len(records) - 1 - reverse_indices
+        valid = sources < self.num_sources
+        sources, indices = sources[valid], indices[valid]
+        if only_missing:
+            missing = np.isnan(self.last_times[sources])
+            sources, indices = sources[missing], indices[missing]
+        self.last_times[sources] = records["time"][indices]
+        self.last_positions[sources] = records["position"][indices]
+
+    def advance(self, time: float):
+        """
+        Move the playback cursor forward to the given time, applying the records up to it.
+        """
+        if time < self.cursor_time:
+            self.seek(time)
+            return
+        end = int(np.searchsorted(self.times, time, side="right"))
+        if end > self.cursor:
+            self._apply_latest(self.records[self.cursor:end])
+        self.cursor = end
+        self.cursor_time = time
+
+    def positions_at(self, times) -> np.ndarray:
+        """
+        Interpolate the position of every source at one or more times, for block-rate or sample-rate playback.
+
+        Args:
+            times: A time in seconds, or an array of non-decreasing times.
+
+        Returns:
+            The position of every source, of shape [num_sources, 3] for a single time, or
+            [len(times), num_sources, 3] for an array of times.
+        """
+        scalar = np.ndim(times) == 0
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        self.advance(times[0])
+
+        # Records after the cursor that may be interpolated towards within the requested times
+        end = int(np.searchsorted(self.times, times[-1] + self.max_interpolation_gap, side="right"))
+        upcoming = np.array(self.records[self.cursor:end])
+        if len(upcoming) == 0:
+            positions = np.broadcast_to(self.last_positions, (len(times), self.num_sources, 3)).copy()
+            return positions[0] if scalar else positions
+        if len(times) == 1:
+            positions = self._interpolate_next(times[0], upcoming)
+            return positions if scalar else positions[np.newaxis]
+
+        positions = np.zeros((len(times), self.num_sources, 3))
+        for source_index in range(self.num_sources):
+            source_records = upcoming[upcoming["source"] == source_index]
+            if len(source_records) == 0 or np.isnan(self.last_times[source_index]):
+                # No upcoming records, or no previous position to interpolate from
+                positions[:, source_index] = self.last_positions[source_index]
+                if len(source_records):
+                    reached = times >= source_records["time"][0]
+                    positions[reached, source_index] = self._interpolate(times[reached],
+                                                                         source_records["time"],
+                                                                         source_records["position"])
+                continue
+            record_times = np.concatenate([[self.last_times[source_index]], source_records["time"]])
+            record_positions = np.concatenate([[self.last_positions[source_index]], source_records["position"]])
+            positions[:, source_index] = self._interpolate(times, record_times, record_positions)
+        return positions[0] if scalar else positions
+
+    def _interpolate_next(self, time: float, upcoming: np.ndarray) -> np.ndarray:
+        # Interpolate every source at a single time, between its last record and its next upcoming record
+        sources, indices = np.unique(upcoming["source"], return_index=True)
+        valid = sources < self.num_sources
+        sources, indices = sources[valid], indices[valid]
+        last_times = self.last_times[sources]
+        next_times = upcoming["time"][indices]
+        interpolated = ~np.isnan(last_times) & (next_times - last_times <= self.max_interpolation_gap)
+        sources, indices = sources[interpolated], indices[interpolated]
+        last_times, next_times = last_times[interpolated], next_times[interpolated]
+
+        positions = self.last_positions.copy()
+        fractions = np.divide(time - last_times, next_times - last_times,
+                              out=np.ones_like(last_times), where=next_times > last_times)
+        positions[sources] += fractions[:, np.newaxis] * (upcoming["position"][indices] - positions[sources])
+        return positions
+
+    def _interpolate(self, times: np.ndarray, record_times: np.ndarray, record_positions: np.ndarray) -> np.ndarray:
+        # Hold across gaps longer than max_interpolation_gap by inserting a keyframe with the
+        # previous position immediately before the next record
+        gaps = np.flatnonzero(np.diff(record_times) > self.max_interpolation_gap)
+        if len(gaps):
+            record_times = np.insert(record_times, gaps + 1, np.nextafter(record_times[gaps + 1], -np.inf))
+            record_positions = np.insert(record_positions, gaps + 1, record_positions[gaps], axis=0)
+        return np.stack([np.interp(times, record_times, record_positions[:, axis]) for axis in range(3)], axis=-1)
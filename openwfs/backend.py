@@ -0,0 +1,251 @@
+import time
+import ctypes
+import logging
+import numpy as np
+from signalflow import *
+from multiprocessing.sharedctypes import RawArray
+from .audiofile import WavFile, create_wav
+from .constants import input_device_name, output_device_name, input_buffer_size, output_buffer_size
+from .constants import num_speakers, render_sample_rate
+
+logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# Audio backends.
+#
+# A backend creates the AudioGraph for a render process, provides its audio
+# input, and paces its render loop. The device backend opens the configured
+# audio devices, and the graph is driven in real time by the audio hardware.
+# The other backends need no audio hardware: the graph renders to a null
+# output device, one block at a time, as fast as the CPU allows, so that
+# rendering can be measured and checked on a machine with no sound card.
+#
+# A backend is passed to each render process, so state that must be read back
+# by the control process (captured output and throughput) is held in shared
+# memory, with one row per render process.
+#--------------------------------------------------------------------------------
+
+
+class DeviceBackend:
+    """
+    Renders to the configured audio input and output devices, in real time.
+    """
+
+    def create_graph(self) -> AudioGraph:
+        config = AudioGraphConfig()
+        config.input_device_name = input_device_name
+        config.output_device_name = output_device_name
+        config.input_buffer_size = input_buffer_size
+        config.output_buffer_size = output_buffer_size
+        return AudioGraph(config=config, start=True)
+
+    def create_input(self, num_channels: int) -> Node:
+        return AudioIn(num_channels)
+
+    def time(self) -> float:
+        """
+        Returns:
+            The current time of the audio stream, on the same clock as time.time().
+        """
+        return time.time()
+
+    def wait(self, graph: AudioGraph, process_index: int = 0) -> bool:
+        """
+        Wait for the next block of audio to be rendered.
+
+        Returns:
+            True while rendering should continue.
+        """
+        time.sleep(output_buffer_size / graph.sample_rate)
+        return True
+
+
+class NullBackend:
+    def __init__(self,
+                 num_frames: int = None,
+                 num_output_channels: int = num_speakers,
+                 sample_rate: int = render_sample_rate,
+                 block_size: int = output_buffer_size,
+                 num_processes: int = 1,
+                 realtime: bool = False):
+        """
+        Renders to a null output device, discarding the output, with silent input. Blocks are
+        rendered as fast as the CPU allows, and the time spent rendering is recorded, to measure
+        throughput.
+
+        Args:
+            num_frames: The number of frames to render, after which the render loop ends.
+                        Defaults to rendering until the render process is stopped.
+            num_output_channels: The number of output channels.
+            sample_rate: The sample rate, in Hz.
+            block_size: The number of frames rendered per block.
+            num_processes: The number of render processes that will use this backend.
+            realtime: If True, blocks are rendered at the rate an audio device would request them,
+                      so that control latency can be measured as it would be live.
+        """
+        self.num_frames = num_frames
+        self.num_output_channels = num_output_channels
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.num_processes = num_processes
+        self.realtime = realtime
+        self._counters = RawArray(ctypes.c_double, num_processes * 2)
+        self.start_time = None
+        self._create_views()
+
+    def _create_views(self):
+        counters = np.frombuffer(self._counters, dtype=np.float64).reshape(self.num_processes, 2)
+        self.frames_rendered = counters[:, 0]
+        self.render_seconds = counters[:, 1]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["frames_rendered"], state["render_seconds"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_views()
+
+    def create_graph(self) -> AudioGraph:
+        output = AudioOut_Dummy(self.num_output_channels, self.sample_rate, self.block_size)
+        self.start_time = time.time()
+        return AudioGraph(output_device=output, start=False)
+
+    def create_input(self, num_channels: int) -> Node:
+        return BufferPlayer(Buffer(np.zeros((num_channels, self.block_size), dtype=np.float32)), loop=True)
+
+    def time(self) -> float:
+        return self.start_time + self.frames_rendered.max() / self.sample_rate
+
+    def wait(self, graph: AudioGraph, process_index: int = 0) -> bool:
+        """
+        Render the next block of audio.
+
+        Returns:
+            True until num_frames have been rendered.
+        """
+        start = int(self.frames_rendered[process_index])
+        if self.num_frames is not None and start >= self.num_frames:
+            return False
+        t0 = time.perf_counter()
+        graph.render(self.block_size)
+        self.render_seconds[process_index] += time.perf_counter() - t0
+        self.capture(graph, process_index, start)
+        self.frames_rendered[process_index] += self.block_size
+        if self.realtime:
+            end_time = self.start_time + self.frames_rendered[process_index] / self.sample_rate
+            time.sleep(max(end_time - time.time(), 0.0))
+        return self.num_frames is None or self.frames_rendered[process_index] < self.num_frames
+
+    def capture(self, graph: AudioGraph, process_index: int, start: int):
+        pass
+
+    @property
+    def realtime_factor(self) -> float:
+        """
+        The duration of audio rendered per second of render time, for the slowest render process.
+        """
+        render_seconds = self.render_seconds.max()
+        return float(self.frames_rendered.min() / self.sample_rate / render_seconds) if render_seconds else 0.0
+
+
+class ArrayBackend(NullBackend):
+    def __init__(self,
+                 input_audio: np.ndarray,
+                 num_output_channels: int = num_speakers,
+                 sample_rate: int = render_sample_rate,
+                 block_size: int = output_buffer_size,
+                 num_processes: int = 1):
+        """
+        Renders the given input audio to a null output device, capturing every output block into a
+        preallocated array in shared memory. The render loop ends at the end of the input.
+
+        With several render processes (for example, one per source), each process's output is
+        captured separately, and `output` is their sum.
+
+        Args:
+            input_audio: The input audio, of shape [num_channels, num_frames].
+            num_output_channels: The number of output channels.
+            sample_rate: The sample rate, in Hz.
+            block_size: The number of frames rendered per block.
+            num_processes: The number of render processes that will use this backend.
+        """
+        self.input_audio = np.asarray(input_audio, dtype=np.float32)
+        num_blocks = int(np.ceil(self.input_audio.shape[1] / block_size))
+        super().__init__(num_blocks * block_size, num_output_channels, sample_rate, block_size, num_processes)
+        self._output = RawArray(ctypes.c_float, num_processes * num_output_channels * self.num_frames)
+        self._create_views()
+
+    def _create_views(self):
+        super()._create_views()
+        if hasattr(self, "_output"):
+            self.outputs = np.frombuffer(self._output, dtype=np.float32).reshape(self.num_processes,
+                                                                                 self.num_output_channels,
+                                                                                 self.num_frames)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        del state["outputs"]
+        return state
+
+    def create_input(self, num_channels: int) -> Node:
+        input_audio = np.zeros((num_channels, self.num_frames), dtype=np.float32)
+        num_input_channels = min(num_channels, len(self.input_audio))
+        input_audio[:num_input_channels, :self.input_audio.shape[1]] = self.input_audio[:num_input_channels]
+        return BufferPlayer(Buffer(input_audio), loop=False)
+
+    def capture(self, graph: AudioGraph, process_index: int, start: int):
+        self.outputs[process_index, :, start:start + self.block_size] = graph.output.output_buffer[:, :self.block_size]
+
+    @property
+    def output(self) -> np.ndarray:
+        """
+        The captured output, of shape [num_output_channels, num_frames].
+        """
+        return self.outputs.sum(axis=0)
+
+
+class FileBackend(ArrayBackend):
+    def __init__(self,
+                 input_path: str,
+                 output_path: str,
+                 num_output_channels: int = num_speakers,
+                 block_size: int = output_buffer_size,
+                 num_processes: int = 1):
+        """
+        Renders a multichannel WAV file to a null output device, at the file's sample rate, and
+        writes the captured output to a WAV file when save() is called.
+
+        Args:
+            input_path: The input WAV file, with one channel per source.
+            output_path: The output WAV file, with one channel per output.
+            num_output_channels: The number of output channels.
+            block_size: The number of frames rendered per block.
+            num_processes: The number of render processes that will use this backend.
+        """
+        reader = WavFile(input_path)
+        self.output_path = output_path
+        super().__init__(reader.read(0, reader.num_frames), num_output_channels, reader.sample_rate,
+                         block_size, num_processes)
+
+    def save(self):
+        """
+        Write the captured output to output_path. Called once rendering has finished.
+        """
+        output = create_wav(self.output_path, self.num_output_channels, self.num_frames, self.sample_rate)
+        output[:] = self.output.T
+        output.flush()
+        logger.info("Wrote %d frames to %s" % (self.num_frames, self.output_path))
+
+
+def create_backend(name: str, num_processes: int = 1) -> DeviceBackend:
+    """
+    Create a backend by name: "device" to render to the audio devices, or "null" to render
+    silence to a null device as fast as possible. Array and file backends are created directly.
+    """
+    if name == "device":
+        return DeviceBackend()
+    elif name == "null":
+        return NullBackend(num_processes=num_processes)
+    raise ValueError("Invalid audio backend: %s" % name)
@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import numpy as np
+from .driving import compute_driving_functions, get_speaker_spacing
+from .constants import environment_radius_x, environment_radius_y, environment_radius_z
+from .constants import driving_function_cache_resolution, driving_function_cache_size_mb
+
+logger = logging.getLogger(__name__)
+
+
+class DrivingFunctionCache:
+    def __init__(self,
+                 resolution: float = driving_function_cache_resolution,
+                 max_size_mb: float = driving_function_cache_size_mb,
+                 bounds: np.ndarray = None):
+        """
+        A cache of per-speaker gain and delay coefficients on a regular spatial grid, from which the
+        driving functions of a source are interpolated trilinearly from the 8 surrounding grid points.
+
+        Grid points are computed on first use (or in advance with precompute()), and evicted on a
+        least-recently-used basis once the cache reaches its memory limit. Sources outside the grid
+        are computed directly. The cache is cleared automatically whenever the speaker layout changes.
+
+        Interpolation smooths the driving functions across the boundaries of secondary source
+        selection, so the resolution should be small relative to the speaker spacing of interest.
+
+        Args:
+            resolution: The grid spacing, in metres.
+            max_size_mb: The maximum memory used by cached coefficients, in megabytes.
+            bounds: The [min, max] extent of the grid along each axis, of shape [3, 2].
+                    Defaults to the environment size.
+        """
+        if bounds is None:
+            bounds = [[-environment_radius_x, environment_radius_x],
+                      [-environment_radius_y, environment_radius_y],
+                      [-environment_radius_z, environment_radius_z]]
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.resolution = resolution
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.grid_shape = np.maximum(np.ceil((self.bounds[:, 1] - self.bounds[:, 0]) / resolution).astype(int) + 1, 2)
+
+        self.num_grid_points = int(np.prod(self.grid_shape))
+        self.max_entries = 0
+        self.num_entries = 0
+        self.layout_key = None
+        self.speaker_positions = None
+        self.speaker_orientations = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.num_entries
+
+    def set_layout(self, speaker_positions: np.ndarray, speaker_orientations: np.ndarray):
+        """
+        Set the speaker layout, clearing the cache if it differs from the current layout.
+        """
+        speaker_positions = np.ascontiguousarray(speaker_positions, dtype=float)
+        speaker_orientations = np.ascontiguousarray(speaker_orientations, dtype=float)
+        layout_key = hashlib.sha1(speaker_positions.tobytes() + speaker_orientations.tobytes()).hexdigest()
+        if layout_key == self.layout_key:
+            return
+        if self.layout_key is not None:
+            logger.info("Speaker layout changed, clearing driving function cache")
+        self.layout_key = layout_key
+        self.speaker_positions = speaker_positions
+        self.speaker_orientations = speaker_orientations
+        self.speaker_spacing = get_speaker_spacing(speaker_positions)
+
+        # Coefficients are held in preallocated slots. Each entry holds float32 gains and delays
+        # for every speaker, and the slot of each grid point is looked up in a dense index.
+        entry_size = 2 * 4 * len(speaker_positions)
+        self.max_entries = min(max(int(self.max_size_bytes // entry_size), 8), self.num_grid_points)
+        self.slot_gains = np.zeros((self.max_entries, len(speaker_positions)), dtype=np.float32)
+        self.slot_delays = np.zeros((self.max_entries, len(speaker_positions)), dtype=np.float32)
+        self.slot_keys = np.full(self.max_entries, -1)
+        self.slot_last_used = np.zeros(self.max_entries, dtype=np.int64)
+        self.grid_slots = np.full(self.num_grid_points, -1)
+        self.num_entries = 0
+        self.tick = 0
+
+    def get_grid_positions(self, keys: np.ndarray) -> np.ndarray:
+        indices = np.stack(np.unravel_index(keys, self.grid_shape), axis=-1)
+        return self.bounds[:, 0] + indices * self.resolution
+
+    def get_entries(self, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Fetch the coefficients of the given unique grid points, computing any that are missing in one batch.
+
+        Returns:
+            A tuple of (gains, delays), each of shape [len(keys), num_speakers].
+        """
+        self.tick += 1
+        slots = self.grid_slots[keys]
+        missing = slots < 0
+        num_missing = int(np.count_nonzero(missing))
+        self.misses += num_missing
+        self.hits += len(keys) - num_missing
+
+        if num_missing:
+            # Use free slots first, then evict the least-recently-used entries not needed by this lookup
+            self.slot_last_used[slots[~missing]] = self.tick
+            num_free = min(self.max_entries - self.num_entries, num_missing)
+            new_slots = np.arange(self.num_entries, self.num_entries + num_free)
+            self.slot_last_used[new_slots] = self.tick
+            self.num_entries += num_free
+            if num_free < num_missing:
+                num_evicted = num_missing - num_free
+                evicted = np.argpartition(self.slot_last_used, num_evicted - 1)[:num_evicted]
+                self.grid_slots[self.slot_keys[evicted]] = -1
+                new_slots = np.concatenate([new_slots, evicted])
+
+            missing_keys = keys[missing]
+            gains, delays = compute_driving_functions(self.get_grid_positions(missing_keys),
+                                                      self.speaker_positions,
+                                                      self.speaker_orientations,
+                                                      speaker_spacing=self.speaker_spacing)
+            self.slot_gains[new_slots] = gains
+            self.slot_delays[new_slots] = delays
+            self.slot_keys[new_slots] = missing_keys
+            self.grid_slots[missing_keys] = new_slots
+            slots[missing] = new_slots
+
+        self.slot_last_used[slots] = self.tick
+        return self.slot_gains[slots], self.slot_delays[slots]
+
+    def precompute(self, speaker_positions: np.ndarray, speaker_orientations: np.ndarray, batch_size: int = 1024):
+        """
+        Compute the coefficients of every grid point in advance, up to the cache's memory limit.
+        """
+        self.set_layout(speaker_positions, speaker_orientations)
+        num_points = self.max_entries
+        logger.info("Precomputing driving functions for %d grid points..." % num_points)
+        for start in range(0, num_points, batch_size):
+            self.get_entries(np.arange(start, min(start + batch_size, num_points)))
+
+    def lookup(self,
+               source_positions: np.ndarray,
+               speaker_positions: np.ndarray,
+               speaker_orientations: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Interpolate the driving functions of every source from the cached grid.
+
+        Args:
+            source_positions: Array of shape [num_sources, 3].
+            speaker_positions: Array of shape [num_speakers, 3].
+            speaker_orientations: Array of shape [num_speakers].
+
+        Returns:
+            A tuple of (gains, delays), each of shape [num_sources, num_speakers], as returned by
+            compute_driving_functions().
+        """
+        self.set_layout(speaker_positions, speaker_orientations)
+        source_positions = np.atleast_2d(np.asarray(source_positions, dtype=float))
+        gains = np.zeros((len(source_positions), len(self.speaker_positions)))
+        delays = np.zeros_like(gains)
+
+        inside = np.all((source_positions >= self.bounds[:, 0]) & (source_positions <= self.bounds[:, 1]), axis=1)
+        if not np.all(inside):
+            gains[~inside], delays[~inside] = compute_driving_functions(source_positions[~inside],
+                                                                        self.speaker_positions,
+                                                                        self.speaker_orientations,
+                                                                        speaker_spacing=self.speaker_spacing)
+        if not np.any(inside):
+            return gains, delays
+
+        # Find the lower corner of each source's grid cell, and its fractional offset within the cell
+        grid_positions = (source_positions[inside] - self.bounds[:, 0]) / self.resolution
+        lower = np.clip(np.floor(grid_positions).astype(int), 0, self.grid_shape - 2)
+        fractions = grid_positions - lower
+
+        # Corner offsets and trilinear weights, of shape [num_inside, 8]
+        offsets = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)])
+        corners = lower[:, np.newaxis, :] + offsets[np.newaxis, :, :]
+        weights = np.prod(np.where(offsets[np.newaxis, :, :], fractions[:, np.newaxis, :], 1 - fractions[:, np.newaxis, :]), axis=2)
+        keys = np.ravel_multi_index((corners[..., 0], corners[..., 1], corners[..., 2]), self.grid_shape)
+
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        if len(unique_keys) > self.max_entries:
+            gains[inside], delays[inside] = compute_driving_functions(source_positions[inside],
+                                                                      self.speaker_positions,
+                                                                      self.speaker_orientations,
+                                                                      speaker_spacing=self.speaker_spacing)
+            return gains, delays
+        corner_gains, corner_delays = self.get_entries(unique_keys)
+        inverse = inverse.reshape(keys.shape)
+        gains[inside] = np.einsum("sc,scn->sn", weights, corner_gains[inverse])
+        delays[inside] = np.einsum("sc,scn->sn", weights, corner_delays[inverse])
+        return gains, delays
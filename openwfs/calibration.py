@@ -0,0 +1,277 @@
+import json
+import logging
+import numpy as np
+from dataclasses import dataclass
+from .audiofile import WavFile
+from .constants import speed_of_sound, calibration_sweep_duration, calibration_sweep_offset
+from .constants import calibration_frequency_range, calibration_ir_length, calibration_level
+from .constants import calibration_input_channel
+
+logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# Driver calibration by the multiple exponential sweep method.
+#
+# The same exponential sine sweep is played through every driver, with each
+# driver starting calibration_sweep_offset seconds after the previous one, so
+# that the sweeps overlap and the whole array is measured in little more than
+# (num_drivers * offset + sweep duration) seconds. The recording of a single
+# measurement microphone is deconvolved by the sweep in one FFT, which yields
+# the impulse response of each driver at its own offset along a common time
+# axis. The offset must be longer than the impulse response window.
+#
+# Harmonic distortion products of each sweep appear before its linear impulse
+# response, at T ln(k) / ln(f2 / f1) seconds for the k-th harmonic, and so fall
+# into the windows of earlier drivers, but at a much lower level than their
+# direct sound, which is all that the analysis uses.
+#--------------------------------------------------------------------------------
+
+
+def exponential_sweep(sample_rate: float,
+                      duration: float = calibration_sweep_duration,
+                      frequency_range: tuple[float, float] = calibration_frequency_range) -> np.ndarray:
+    """
+    Generate an exponential sine sweep, with short fades at each end.
+
+    Args:
+        sample_rate: The sample rate, in Hz.
+        duration: The duration of the sweep, in seconds.
+        frequency_range: The start and end frequency of the sweep, in Hz.
+
+    Returns:
+        The sweep, of shape [num_frames].
+    """
+    start_frequency, end_frequency = frequency_range
+    num_frames = int(round(duration * sample_rate))
+    t = np.arange(num_frames) / sample_rate
+    rate = np.log(end_frequency / start_frequency)
+    sweep = np.sin(2 * np.pi * start_frequency * duration / rate * (np.exp(t * rate / duration) - 1))
+    fade_length = min(num_frames // 2, int(0.01 * sample_rate))
+    fade = np.hanning(2 * fade_length)
+    sweep[:fade_length] *= fade[:fade_length]
+    sweep[num_frames - fade_length:] *= fade[fade_length:]
+    return sweep
+
+
+def get_sweep_start_frames(num_drivers: int, sample_rate: float, offset: float = calibration_sweep_offset) -> np.ndarray:
+    """
+    Returns:
+        The frame at which each driver's sweep starts, relative to the first.
+    """
+    return np.arange(num_drivers) * int(round(offset * sample_rate))
+
+
+def create_excitation(num_drivers: int,
+                      sample_rate: float,
+                      duration: float = calibration_sweep_duration,
+                      offset: float = calibration_sweep_offset,
+                      frequency_range: tuple[float, float] = calibration_frequency_range,
+                      level: float = calibration_level) -> np.ndarray:
+    """
+    Create the full excitation signal for every driver, for offline use and testing.
+    The live calibration generates the same signal with one delay line per driver.
+
+    Returns:
+        The excitation, of shape [num_drivers, num_frames].
+    """
+    sweep = exponential_sweep(sample_rate, duration, frequency_range) * level
+    starts = get_sweep_start_frames(num_drivers, sample_rate, offset)
+    excitation = np.zeros((num_drivers, starts[-1] + len(sweep)), dtype=np.float32)
+    for driver_index, start in enumerate(starts):
+        excitation[driver_index, start:start + len(sweep)] = sweep
+    return excitation
+
+
+def deconvolve(recordings: np.ndarray, sweep: np.ndarray, regularisation: float = 1e-6) -> np.ndarray:
+    """
+    Deconvolve one or more recordings by the sweep, in one batched FFT pass, by regularised
+    spectral division.
+
+    Args:
+        recordings: The recordings, of shape [num_recordings, num_frames].
+        sweep: The sweep that was played, of shape [sweep_length].
+        regularisation: The level below the sweep's peak power at which frequencies are attenuated
+                        rather than amplified, to avoid amplifying noise outside the sweep's range.
+
+    Returns:
+        The deconvolved responses, of shape [num_recordings, num_frames], in which a response
+        played with a delay of n frames begins at frame n.
+    """
+    recordings = np.atleast_2d(recordings)
+    fft_size = 1 << int(np.ceil(np.log2(recordings.shape[1] + len(sweep))))
+    sweep_spectrum = np.fft.rfft(sweep, fft_size)
+    power = np.abs(sweep_spectrum) ** 2
+    inverse = np.conj(sweep_spectrum) / (power + regularisation * np.max(power))
+    responses = np.fft.irfft(np.fft.rfft(recordings, fft_size, axis=1) * inverse, fft_size, axis=1)
+    return responses[:, :recordings.shape[1]]
+
+
+def extract_impulse_responses(responses: np.ndarray,
+                              start_frames: np.ndarray,
+                              ir_length: int,
+                              pre_frames: int = 0) -> np.ndarray:
+    """
+    Cut the impulse response of each driver out of deconvolved responses.
+
+    Args:
+        responses: The deconvolved responses, of shape [num_recordings, num_frames].
+        start_frames: The frame at which each driver's sweep started.
+        ir_length: The length of each impulse response, in frames.
+        pre_frames: The number of frames to include before each driver's start frame.
+
+    Returns:
+        The impulse responses, of shape [num_recordings, num_drivers, ir_length].
+    """
+    responses = np.atleast_2d(responses)
+    padded = np.pad(responses, ((0, 0), (pre_frames, ir_length)))
+    indices = np.asarray(start_frames)[:, np.newaxis] + np.arange(ir_length)
+    return padded[:, indices]
+
+
+@dataclass
+class Calibration:
+    """
+    Per-driver corrections measured by calibration, to be applied by the panner to each driver's output:
+    delays (in seconds, all non-negative) to align every driver's arrival, and gains and polarities
+    (+1 or -1) to equalise their levels and correct reversed wiring.
+    """
+    delays: np.ndarray
+    gains: np.ndarray
+    polarities: np.ndarray
+    arrival_times: np.ndarray
+    levels: np.ndarray
+
+    @property
+    def num_drivers(self) -> int:
+        return len(self.delays)
+
+    def save(self, path: str):
+        with open(path, "w") as fd:
+            json.dump({key: np.asarray(value).tolist() for key, value in self.__dict__.items()}, fd, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "Calibration":
+        with open(path) as fd:
+            data = json.load(fd)
+        return cls(**{key: np.asarray(value, dtype=float) for key, value in data.items()})
+
+
+def analyse_impulse_responses(impulse_responses: np.ndarray,
+                              sample_rate: float,
+                              pre_frames: int = 0,
+                              speaker_positions: np.ndarray = None,
+                              mic_position: np.ndarray = None,
+                              max_gain: float = 4.0) -> Calibration:
+    """
+    Compute per-driver corrections from the impulse response of each driver, measured at a single
+    microphone.
+
+    The arrival time of each driver is taken from the peak of its impulse response, interpolated
+    to a fraction of a sample, and its level from the energy of its direct sound. If the speaker
+    and microphone positions are given, the expected propagation delay and 1/r attenuation are
+    removed first, so that only differences in the drivers and their signal paths are corrected. Corrections are relative to the median driver,
+    so the latency of the audio interface does not affect them.
+
+    Args:
+        impulse_responses: The impulse responses, of shape [num_drivers, ir_length].
+        sample_rate: The sample rate, in Hz.
+        pre_frames: The number of frames in each impulse response before the driver's sweep started.
+        speaker_positions: The [x, y, z] position of each driver, of shape [num_drivers, 3].
+        mic_position: The [x, y, z] position of the microphone.
+        max_gain: The largest gain correction to apply, to avoid boosting failed drivers.
+
+    Returns:
+        The calibration.
+    """
+    impulse_responses = np.asarray(impulse_responses, dtype=float)
+    num_drivers, ir_length = impulse_responses.shape
+    magnitudes = np.abs(impulse_responses)
+    peaks = np.argmax(magnitudes, axis=1)
+    driver_indices = np.arange(num_drivers)
+    peak_values = impulse_responses[driver_indices, peaks]
+
+    # Parabolic interpolation of the peak, for sub-sample arrival times
+    before = magnitudes[driver_indices, np.maximum(peaks - 1, 0)]
+    peak = magnitudes[driver_indices, peaks]
+    after = magnitudes[driver_indices, np.minimum(peaks + 1, ir_length - 1)]
+    curvature = before - 2 * peak + after
+    fractions = np.divide(0.5 * (before - after), curvature, out=np.zeros(num_drivers), where=curvature < 0)
+    arrival_times = (peaks + np.clip(fractions, -0.5, 0.5) - pre_frames) / sample_rate
+
+    # The level of the direct sound is its RMS within 0.5ms of the peak, which, unlike the peak
+    # itself, does not depend on where the arrival falls between samples
+    half_width = max(1, int(0.0005 * sample_rate))
+    offsets = np.arange(-half_width, half_width + 1)
+    window = np.clip(peaks[:, np.newaxis] + offsets, 0, ir_length - 1)
+    levels = np.sqrt(np.sum(impulse_responses[driver_indices[:, np.newaxis], window] ** 2, axis=1))
+
+    residual_times = arrival_times.copy()
+    residual_levels = levels.copy()
+    if speaker_positions is not None and mic_position is not None:
+        distances = np.linalg.norm(np.asarray(speaker_positions, dtype=float) - np.asarray(mic_position, dtype=float), axis=1)
+        residual_times -= distances / speed_of_sound
+        residual_levels *= np.maximum(distances, 0.01)
+
+    # Drivers whose direct sound is inverted relative to the majority have reversed polarity
+    majority = 1.0 if np.sum(peak_values > 0) >= num_drivers / 2 else -1.0
+    polarities = np.where(np.sign(peak_values) == majority, 1.0, -1.0)
+
+    delays = np.max(residual_times) - residual_times
+    gains = np.divide(np.median(residual_levels), residual_levels,
+                      out=np.full(num_drivers, max_gain), where=residual_levels > 0)
+    gains = np.clip(gains, 1.0 / max_gain, max_gain)
+
+    logger.info("Calibrated %d drivers: arrival spread %.2fms, level spread %.1fdB, %d reversed" %
+                (num_drivers, 1000 * np.ptp(residual_times),
+                 20 * np.log10(max(np.max(residual_levels), 1e-12) / max(np.min(residual_levels), 1e-12)),
+                 np.sum(polarities < 0)))
+    return Calibration(delays, gains, polarities, arrival_times, levels)
+
+
+def analyse_recording(recording: np.ndarray,
+                      sample_rate: float,
+                      num_drivers: int,
+                      speaker_positions: np.ndarray = None,
+                      mic_position: np.ndarray = None,
+                      duration: float = calibration_sweep_duration,
+                      offset: float = calibration_sweep_offset,
+                      frequency_range: tuple[float, float] = calibration_frequency_range,
+                      ir_length: float = calibration_ir_length) -> Calibration:
+    """
+    Compute per-driver corrections from a recording of the calibration sweeps, live or from a file.
+
+    Args:
+        recording: The microphone recording, of shape [num_frames], beginning when the first sweep began.
+        sample_rate: The sample rate, in Hz.
+        num_drivers: The number of drivers that were measured.
+        speaker_positions: The [x, y, z] position of each driver, of shape [num_drivers, 3].
+        mic_position: The [x, y, z] position of the microphone.
+        duration: The duration of each sweep, in seconds.
+        offset: The interval between the start of each driver's sweep, in seconds.
+        frequency_range: The start and end frequency of the sweep, in Hz.
+        ir_length: The length of the impulse response window of each driver, in seconds.
+
+    Returns:
+        The calibration.
+    """
+    sweep = exponential_sweep(sample_rate, duration, frequency_range)
+    responses = deconvolve(np.asarray(recording, dtype=float).reshape(1, -1), sweep)
+    start_frames = get_sweep_start_frames(num_drivers, sample_rate, offset)
+    ir_frames = min(int(round(ir_length * sample_rate)), int(round(offset * sample_rate)))
+    pre_frames = int(0.001 * sample_rate)
+    impulse_responses = extract_impulse_responses(responses, start_frames, ir_frames, pre_frames)[0]
+    return analyse_impulse_responses(impulse_responses, sample_rate, pre_frames, speaker_positions, mic_position)
+
+
+def analyse_recording_file(path: str,
+                           num_drivers: int,
+                           speaker_positions: np.ndarray = None,
+                           mic_position: np.ndarray = None,
+                           channel: int = calibration_input_channel) -> Calibration:
+    """
+    Compute per-driver corrections from a WAV file recording of the calibration sweeps, such as one
+    saved by a live calibration, beginning when the first sweep began.
+    """
+    reader = WavFile(path)
+    recording = reader.read(0, reader.num_frames)[channel]
+    return analyse_recording(recording, reader.sample_rate, num_drivers, speaker_positions, mic_position)
@@ -1,5 +1,6 @@
 from .module import Module
 import numpy as np
+import os
 
 #--------------------------------------------------------------------------------
 # The names of the audio input and output devices to use.
@@ -16,6 +17,12 @@ midi_input_device_name = "IAC Driver Bus 1"
 #--------------------------------------------------------------------------------
 osc_port = 9130
 
+#--------------------------------------------------------------------------------
+# The rate at which OSC position updates are applied, in Hz. Updates received
+# between control ticks are coalesced, keeping the latest position per source.
+#--------------------------------------------------------------------------------
+osc_control_rate = 100
+
 #--------------------------------------------------------------------------------
 # The input and output audio buffer size, in samples.
 #--------------------------------------------------------------------------------
@@ -33,6 +40,52 @@ num_speakers_per_module = 32
 #--------------------------------------------------------------------------------
 num_sources = 8
 
+#--------------------------------------------------------------------------------
+# The audio engine used to render sources.
+#  - shared: a single audio process hosts the panners for every source, sharing
+#            one AudioGraph, one audio input and one speaker environment, and
+#            summing all panners into a single output bus
+#  - per_source: spawn a separate audio process (and AudioGraph) per source
+#  - distributed: send source positions to remote render nodes, each of which
+#                 renders the speakers of a subset of modules
+#--------------------------------------------------------------------------------
+audio_engine = "shared"
+
+#--------------------------------------------------------------------------------
+# The audio backend used by the shared and per_source audio engines.
+#  - device: render to the audio devices above, in real time
+#  - null: render silence to a null output device, as fast as possible, for
+#          headless testing and throughput measurement
+# Array and file backends, which render from and capture to NumPy arrays or
+# WAV files, can be passed to the Spatialiser directly (see openwfs/backend.py).
+#--------------------------------------------------------------------------------
+audio_backend = "device"
+
+#--------------------------------------------------------------------------------
+# The gain applied to each source's audio input, and the level at which the
+# rendered output of every speaker is clipped, by every audio engine.
+#--------------------------------------------------------------------------------
+input_gain = 0.15
+output_clip_level = 0.25
+
+#--------------------------------------------------------------------------------
+# Distributed rendering, used when audio_engine is "distributed".
+# Source positions are sent to each render node (bin/run-render-node.py), as
+# "host:port", and applied by every node on the same block, render_latency
+# seconds after they are sent. Render nodes run at render_sample_rate.
+#
+# Each node plays its rendered blocks on the output device through a ring
+# buffer of render_output_blocks blocks, each written half the ring ahead of
+# the device, which adds render_output_blocks / 2 blocks of output latency.
+# The coordinator resends every position at least every render_resend_interval
+# seconds, so that a node which misses a packet, or starts late, catches up.
+#--------------------------------------------------------------------------------
+render_nodes = ["127.0.0.1:9140", "127.0.0.1:9141"]
+render_latency = 0.02
+render_sample_rate = 48000
+render_output_blocks = 8
+render_resend_interval = 0.5
+
 #--------------------------------------------------------------------------------
 # The centre coordinates of each OpenWFS module, in metres.
 # For the Y-axis, positive values are in front of the listener.
@@ -58,11 +111,22 @@ num_speakers = num_speakers_per_module * len(module_layout)
 
 #--------------------------------------------------------------------------------
 # If the LFE channel is enabled, a low-passed mono mixdown of the output
-# content is sent to this channel index.
+# content is sent to each of lfe_channel_indices. The slopes of the LFE filters
+# are in dB/octave, in multiples of 12. If lfe_frequency_hpf is set, the LFE
+# is also high-passed at that frequency, to protect the subs; this is separate
+# from crossover_frequency_hpf, the array-side high-pass. Each sub output can
+# be delayed by the corresponding entry of lfe_delays, in seconds, to time-align
+# it with the array.
 #--------------------------------------------------------------------------------
 lfe_channel_index = num_speakers - 1
+lfe_channel_indices = [lfe_channel_index]
+lfe_delays = None
+lfe_gain = 40.0
+lfe_frequency_hpf = None
+lfe_slope_hpf = 12
 crossover_frequency_lpf = 180
 crossover_frequency_hpf = 30
+crossover_slope_lpf = 12
 
 #--------------------------------------------------------------------------------
 # Activate/deactivate various features.
@@ -70,11 +134,66 @@ crossover_frequency_hpf = 30
 #  - midi: receive real-time MIDI controls to set the source locations
 #  - audio: enable/disable audio
 #  - randomise_lfos: add random positional oscillations to each source
+#  - visualiser: send speaker and source positions to the 3D visualiser
 #--------------------------------------------------------------------------------
 disable_lfe = True
 disable_midi = False
 disable_audio = False
 randomise_lfos = False
+enable_visualiser = True
+
+#--------------------------------------------------------------------------------
+# How the render process moves each source to a new position.
+#  - linear: ramp linearly to the new position, arriving at the time given by
+#            the timetag of the OSC bundle that contained it, or after
+#            position_ramp_time if it has no timetag
+#  - spline: as linear, but with a cubic ramp that arrives at each position with
+#            the velocity implied by the previous position, so that trajectories
+#            sent as sparse, timestamped updates are followed smoothly
+#  - smooth: apply each new position immediately, with one-pole smoothing, in
+#            the live panner. Timetags are then only used by distributed render
+#            nodes and the NumPy render engine, which ramp linearly.
+#--------------------------------------------------------------------------------
+position_interpolation = "smooth"
+position_ramp_time = 0.02
+
+#--------------------------------------------------------------------------------
+# The rate at which source LFOs are animated and sent to the panner, in Hz.
+#--------------------------------------------------------------------------------
+animation_rate = 50
+
+#--------------------------------------------------------------------------------
+# Server-side trajectories (see openwfs/trajectory.py), evaluated on each
+# animation tick. Splines can pass through at most max_trajectory_points
+# points, including the source's starting position. Wandering sources change
+# direction smoothly, over around wander_smoothing_time seconds.
+#--------------------------------------------------------------------------------
+max_trajectory_points = 32
+wander_smoothing_time = 2.0
+
+#--------------------------------------------------------------------------------
+# Compiled speaker layouts are cached in this directory, keyed by a hash of the
+# module layout and driver layout, so that they are only computed once.
+#--------------------------------------------------------------------------------
+layout_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "openwfs")
+
+#--------------------------------------------------------------------------------
+# Driver calibration (bin/run-spatialiser.py --calibrate).
+# An exponential sweep over calibration_frequency_range is played through every
+# driver, each starting calibration_sweep_offset seconds after the previous one,
+# and recorded on calibration_input_channel by a microphone placed at
+# calibration_mic_position. The offset must exceed calibration_ir_length, the
+# window within which each driver's direct sound is found. If calibration_file
+# is set, the measured per-driver corrections are applied by the panner.
+#--------------------------------------------------------------------------------
+calibration_sweep_duration = 2.0
+calibration_sweep_offset = 0.05
+calibration_frequency_range = (100.0, 16000.0)
+calibration_ir_length = 0.04
+calibration_level = 0.1
+calibration_input_channel = 0
+calibration_mic_position = [0.0, 0.0, 0.0]
+calibration_file = None
 
 #--------------------------------------------------------------------------------
 # Environment size, in metres
@@ -83,6 +202,78 @@ environment_radius_x = 2.0
 environment_radius_y = 1.0
 environment_radius_z = 0.5
 
+#--------------------------------------------------------------------------------
+# Speed of sound, in metres per second, used to compute WFS driving delays.
+#--------------------------------------------------------------------------------
+speed_of_sound = 343.0
+
+#--------------------------------------------------------------------------------
+# WFS pre-equalisation filter (the sqrt(jk) correction), applied to each source
+# once, before it is distributed to the speakers. The response rises at
+# 3dB/octave from prefilter_low_frequency to prefilter_high_frequency (around
+# the spatial aliasing frequency of the array), and is flat outside this range.
+# The NumPy render engine applies it by overlap-save FFT convolution with
+# prefilter_length taps; the live renderer applies it as a spectral filter with
+# an FFT of prefilter_length samples, which must be at least twice the output
+# buffer size, and adds prefilter_length - output_buffer_size samples of latency.
+# The filter attenuates everything below prefilter_high_frequency (by about
+# 16dB at 50Hz and 7dB at 1kHz), so it is off by default to keep the default
+# output level; make up the gain downstream when enabling it.
+#--------------------------------------------------------------------------------
+enable_prefilter = False
+prefilter_length = 512
+prefilter_low_frequency = 100
+prefilter_high_frequency = 5000
+
+#--------------------------------------------------------------------------------
+# Delay interpolation in the NumPy render engine. With enable_delay_ramp, each
+# speaker's delay is ramped continuously across every block, so that moving
+# sources are rendered with a Doppler shift rather than a step in delay at each
+# block boundary. Fractional delays are read with delay_interpolation:
+#  - linear: cheapest, with some high-frequency loss at fractional delays
+#  - lagrange: third-order Lagrange, flatter at high frequencies
+#  - thiran: first-order allpass, with a flat magnitude response; recursive,
+#            so the slowest of the three
+# Lagrange and Thiran interpolation add one sample of latency.
+#--------------------------------------------------------------------------------
+enable_delay_ramp = True
+delay_interpolation = "linear"
+
+#--------------------------------------------------------------------------------
+# The maximum delay applied by the NumPy render engine, in seconds.
+# Longer driving delays (for very distant sources) are clipped to this value.
+#--------------------------------------------------------------------------------
+max_delay_time = 0.05
+
+#--------------------------------------------------------------------------------
+# Speakers whose gain for a source is below this fraction of the source's
+# loudest speaker are not rendered for that source by the NumPy render engine.
+#--------------------------------------------------------------------------------
+active_speaker_threshold = 0.001
+
+#--------------------------------------------------------------------------------
+# Driving function cache for the NumPy render engine.
+# If enabled, per-speaker gains and delays are precomputed on a grid with the
+# given resolution (in metres) across the environment, and interpolated at
+# runtime. Least-recently-used grid points are evicted beyond the size limit.
+#--------------------------------------------------------------------------------
+enable_driving_function_cache = False
+driving_function_cache_resolution = 0.05
+driving_function_cache_size_mb = 256
+
+#--------------------------------------------------------------------------------
+# 3D visualiser output. Source positions are sent at most visualiser_rate times
+# per second, in one OSC bundle per frame, and only for sources that have moved
+# more than visualiser_threshold metres since they were last sent. The full
+# configuration is resent when a viewer sends /visualiser/connect to osc_port,
+# and every position is resent every visualiser_snapshot_interval seconds.
+#--------------------------------------------------------------------------------
+visualiser_host = "127.0.0.1"
+visualiser_port = 9129
+visualiser_rate = 30
+visualiser_threshold = 0.001
+visualiser_snapshot_interval = 5.0
+
 #--------------------------------------------------------------------------------
 # Source colours for 3D visualiser
 #--------------------------------------------------------------------------------
@@ -0,0 +1,236 @@
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, num_channels: int, length: int, max_read_length: int, dtype=np.float32):
+        """
+        A multichannel ring buffer holding the most recent `length` frames of each channel.
+
+        The first `max_read_length` frames of the buffer are mirrored past its end, so that any read
+        of up to max_read_length frames is a contiguous slice of memory, regardless of where it falls
+        relative to the write position. Writes cost one copy of each frame, plus a second copy for
+        frames within the mirrored region.
+
+        Args:
+            num_channels: The number of channels.
+            length: The number of frames held per channel.
+            max_read_length: The maximum number of frames read at once.
+            dtype: The sample type.
+        """
+        if max_read_length > length:
+            raise ValueError("max_read_length cannot exceed the length of the buffer")
+        self.num_channels = num_channels
+        self.length = length
+        self.max_read_length = max_read_length
+        self.buffer = np.zeros((num_channels, length + max_read_length), dtype=dtype)
+        self.write_position = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.buffer.nbytes
+
+    def _write_span(self, start: int, frames: np.ndarray):
+        end = start + frames.shape[1]
+        self.buffer[:, start:end] = frames
+        if start < self.max_read_length:
+            mirror_end = min(end, self.max_read_length)
+            self.buffer[:, self.length + start:self.length + mirror_end] = frames[:, :mirror_end - start]
+
+    def write(self, frames: np.ndarray):
+        """
+        Append a block of frames to every channel, overwriting the oldest frames.
+
+        Args:
+            frames: An array of shape [num_channels, num_frames], where num_frames <= length.
+        """
+        num_frames = frames.shape[1]
+        first = min(num_frames, self.length - self.write_position)
+        self._write_span(self.write_position, frames[:, :first])
+        if first < num_frames:
+            self._write_span(0, frames[:, first:])
+        self.write_position = (self.write_position + num_frames) % self.length
+
+    def windows(self, window_length: int) -> np.ndarray:
+        """
+        Returns:
+            A read-only view of shape [num_channels, length, window_length], in which [channel, index]
+            is the window of frames beginning at ring index `index`. The view reflects later writes.
+        """
+        if window_length > self.max_read_length:
+            raise ValueError("window_length cannot exceed max_read_length")
+        windows = np.lib.stride_tricks.sliding_window_view(self.buffer, window_length, axis=1)
+        return windows[:, :self.length]
+
+
+#--------------------------------------------------------------------------------
+# Fractional delay interpolators.
+#  - linear: 2-point linear interpolation
+#  - lagrange: 4-point (third-order) Lagrange interpolation, with a flatter
+#              high-frequency response than linear interpolation
+#  - thiran: first-order Thiran allpass, with a flat magnitude response, which
+#            is recursive and so is evaluated one sample at a time
+# Lagrange and Thiran interpolation need one sample of lookahead, so they add
+# one sample of latency to every tap.
+#--------------------------------------------------------------------------------
+interpolation_latency = {"linear": 0, "lagrange": 1, "thiran": 1}
+
+
+def lagrange_coefficients(fractions: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        The third-order Lagrange interpolation coefficients for samples [i - 1, i, i + 1, i + 2], to
+        interpolate at i + fraction, of shape fractions.shape + (4,).
+    """
+    f = fractions
+    return np.stack([-f * (f - 1) * (f - 2) / 6,
+                     (f + 1) * (f - 1) * (f - 2) / 2,
+                     -(f + 1) * f * (f - 2) / 2,
+                     (f + 1) * f * (f - 1) / 6], axis=-1)
+
+
+class DelayLineBank:
+    def __init__(self,
+                 num_channels: int,
+                 max_delay: int,
+                 block_size: int,
+                 interpolation: str = "linear",
+                 num_taps: int = None):
+        """
+        A bank of fractional delay lines, with one shared ring buffer per input channel. Each block of
+        input is written once, and any number of outputs (taps) can read each channel at their own
+        delay, so delay memory scales with channels x max delay, rather than with the number of taps.
+
+        Each tap's delay is either constant across a block, or ramped linearly from a start delay to an
+        end delay, so that the delay of a moving source changes continuously, producing a Doppler shift
+        rather than a discontinuity at each block boundary. All taps of a channel are read in one
+        vectorised pass.
+
+        Args:
+            num_channels: The number of input channels.
+            max_delay: The maximum delay, in samples.
+            block_size: The number of frames written and read per block.
+            interpolation: The fractional delay interpolator: "linear", "lagrange" or "thiran".
+            num_taps: The number of distinct taps per channel. Required for Thiran interpolation, which
+                      keeps the state of each tap's allpass filter between blocks.
+        """
+        if interpolation not in interpolation_latency:
+            raise ValueError("Invalid delay interpolation: %s" % interpolation)
+        if interpolation == "thiran" and num_taps is None:
+            raise ValueError("num_taps must be specified for Thiran interpolation")
+        self.num_channels = num_channels
+        self.max_delay = max_delay
+        self.block_size = block_size
+        self.interpolation = interpolation
+        self.latency = interpolation_latency[interpolation]
+        # Each read spans block_size + 1 frames, to interpolate the final frame of the block, and may
+        # begin up to max_delay + latency + 2 frames before the start of the block.
+        self.ring = RingBuffer(num_channels, max_delay + self.latency + block_size + 4, block_size + 1)
+        self.windows = self.ring.windows(block_size + 1)
+        self.num_blocks_written = 0
+        self.allpass_state = None
+        if interpolation == "thiran":
+            self.allpass_state = np.zeros((num_channels, num_taps), dtype=np.float32)
+            # The block in which each tap was last read, to detect taps that become active again
+            self.tap_read_blocks = np.full((num_channels, num_taps), -1)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ring.nbytes
+
+    def write(self, block: np.ndarray):
+        """
+        Args:
+            block: The next block of input, of shape [num_channels, block_size].
+        """
+        self.ring.write(block)
+        self.num_blocks_written += 1
+
+    def read(self,
+             channel: int,
+             delays: np.ndarray,
+             end_delays: np.ndarray = None,
+             taps: np.ndarray = None) -> np.ndarray:
+        """
+        Read the most recently written block of a channel at several delays.
+
+        Args:
+            channel: The input channel.
+            delays: The delay of each tap at the start of the block, in samples, between 0 and max_delay.
+            end_delays: The delay of each tap at the end of the block. If specified, each tap's delay is
+                        ramped linearly across the block. Defaults to a constant delay.
+            taps: The index of each tap, between 0 and num_taps, for Thiran interpolation.
+
+        Returns:
+            An array of shape [len(delays), block_size].
+        """
+        if end_delays is not None and np.array_equal(end_delays, delays):
+            end_delays = None
+        delays = np.asarray(delays) + self.latency
+        block_start = self.ring.write_position - self.block_size
+        if self.interpolation == "linear" and end_delays is None:
+            # With a constant delay, each tap reads a contiguous window of the delay line
+            read_positions = block_start - delays
+            read_indices = np.floor(read_positions).astype(int)
+            fractions = (read_positions - read_indices).astype(self.ring.buffer.dtype)[:, np.newaxis]
+            windows = self.windows[channel][read_indices % self.ring.length]
+            return windows[:, :-1] + (windows[:, 1:] - windows[:, :-1]) * fractions
+
+        frames = np.arange(self.block_size)
+        if end_delays is None:
+            delays = np.repeat(delays[:, np.newaxis], self.block_size, axis=1)
+        else:
+            end_delays = np.asarray(end_delays) + self.latency
+            delays = delays[:, np.newaxis] + (end_delays - delays)[:, np.newaxis] * frames / self.block_size
+        buffer = self.ring.buffer[channel]
+
+        if self.interpolation == "thiran":
+            return self.read_allpass(buffer, block_start + frames - delays, delays, channel, taps)
+
+        read_positions = block_start + frames - delays
+        read_indices = np.floor(read_positions).astype(int)
+        fractions = (read_positions - read_indices).astype(self.ring.buffer.dtype)
+        if self.interpolation == "linear":
+            samples = buffer[read_indices % self.ring.length]
+            following = buffer[(read_indices + 1) % self.ring.length]
+            return samples + (following - samples) * fractions
+        offsets = np.arange(-1, 3)
+        samples = buffer[(read_indices[:, :, np.newaxis] + offsets) % self.ring.length]
+        return np.sum(samples * lagrange_coefficients(fractions), axis=-1)
+
+    def read_allpass(self,
+                     buffer: np.ndarray,
+                     read_positions: np.ndarray,
+                     delays: np.ndarray,
+                     channel: int,
+                     taps: np.ndarray) -> np.ndarray:
+        """
+        Read with first-order Thiran allpass interpolation. Each tap's delay is split into a whole number
+        of samples, read directly, and a fractional delay of between 0.5 and 1.5 samples, applied by
+        an allpass filter, which is evaluated for every tap at once, one frame at a time.
+
+        A tap that was not read in the previous block holds the state it had when it was last active,
+        which would click when it becomes active again. Its state is instead initialised to the
+        delayed input at the previous frame, interpolated linearly.
+        """
+        whole_delays = np.floor(delays - 0.5)
+        fractions = delays - whole_delays
+        coefficients = ((1 - fractions) / (1 + fractions)).astype(self.ring.buffer.dtype)
+        read_indices = np.rint(read_positions + fractions).astype(int)
+        inputs = buffer[read_indices % self.ring.length]
+        previous_inputs = buffer[(read_indices - 1) % self.ring.length]
+        output = np.empty_like(inputs)
+        state = self.allpass_state[channel, taps]
+        resumed = self.tap_read_blocks[channel, taps] != self.num_blocks_written - 1
+        if np.any(resumed):
+            previous_positions = read_indices[resumed, 0] - 1 - fractions[resumed, 0]
+            previous_indices = np.floor(previous_positions).astype(int)
+            previous_fractions = (previous_positions - previous_indices).astype(self.ring.buffer.dtype)
+            samples = buffer[previous_indices % self.ring.length]
+            following = buffer[(previous_indices + 1) % self.ring.length]
+            state[resumed] = samples + (following - samples) * previous_fractions
+        self.tap_read_blocks[channel, taps] = self.num_blocks_written
+        for frame in range(self.block_size):
+            state = coefficients[:, frame] * (inputs[:, frame] - state) + previous_inputs[:, frame]
+            output[:, frame] = state
+        self.allpass_state[channel, taps] = state
+        return output
@@ -0,0 +1,428 @@
+import time
+import socket
+import threading
+import logging
+import numpy as np
+from typing import Callable
+from signalflow import AudioGraph, AudioGraphConfig, Buffer, BufferPlayer
+from .module import Module
+from .engine import RenderEngine
+from .layout import get_speaker_layout
+from .stats import Histogram
+from .audiofile import create_wav
+from .constants import module_layout, num_speakers_per_module, output_buffer_size, render_latency, render_sample_rate
+from .constants import output_device_name, render_output_blocks, render_resend_interval, input_gain, output_clip_level
+
+logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# Distributed rendering.
+#
+# A coordinator broadcasts the position of every source to a set of render
+# nodes over UDP. Each node renders only the speakers of its assigned modules.
+#
+# All nodes count audio blocks from a common epoch, which is sent in every
+# packet, and each position packet is stamped with the block on which it
+# should be applied, a fixed latency after it is sent. As long as the packet
+# arrives within the latency, every node applies it on the same block. Nodes
+# on separate hosts must have their clocks synchronised (for example, by PTP
+# or NTP).
+#
+# Each source's position is sent with its target time, from the timetag of
+# the OSC bundle it arrived in (or NaN). Each node ramps the source to arrive
+# at its target at that time, on the node's block clock, so every node
+# renders the same ramp.
+#--------------------------------------------------------------------------------
+
+packet_magic = b"OWFS"
+
+header_dtype = np.dtype([("magic", "S4"),
+                         ("num_sources", "<u4"),
+                         ("sequence", "<u8"),
+                         ("epoch", "<f8"),
+                         ("block", "<i8")])
+
+
+def encode_positions_packet(sequence: int,
+                            epoch: float,
+                            block: int,
+                            positions: np.ndarray,
+                            target_times: np.ndarray = None) -> bytes:
+    header = np.zeros(1, dtype=header_dtype)
+    header["magic"] = packet_magic
+    header["num_sources"] = len(positions)
+    header["sequence"] = sequence
+    header["epoch"] = epoch
+    header["block"] = block
+    if target_times is None:
+        target_times = np.full(len(positions), np.nan)
+    return header.tobytes() + np.asarray(positions, dtype="<f4").tobytes() + np.asarray(target_times, dtype="<f8").tobytes()
+
+
+def decode_positions_packet(data: bytes) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns:
+        A tuple of (header, positions, target_times), or None if the packet is invalid.
+    """
+    if len(data) < header_dtype.itemsize:
+        return None
+    header = np.frombuffer(data, dtype=header_dtype, count=1)[0]
+    num_sources = int(header["num_sources"])
+    if header["magic"] != packet_magic or len(data) != header_dtype.itemsize + num_sources * (12 + 8):
+        return None
+    positions = np.frombuffer(data, dtype="<f4", count=num_sources * 3, offset=header_dtype.itemsize)
+    target_times = np.frombuffer(data, dtype="<f8", count=num_sources, offset=header_dtype.itemsize + num_sources * 12)
+    return header, positions.reshape(num_sources, 3).astype(float), target_times.copy()
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class RenderCoordinator:
+    def __init__(self,
+                 node_addresses: list[tuple[str, int]],
+                 num_sources: int,
+                 sample_rate: int = render_sample_rate,
+                 block_size: int = output_buffer_size,
+                 latency: float = render_latency,
+                 resend_interval: float = render_resend_interval):
+        """
+        Sends source positions to a set of render nodes, each stamped with the block on which
+        every node should apply it.
+
+        The full position table is sent in every packet, so a lost packet is corrected by the next.
+        When sources are static, resend() sends the table again every `resend_interval` seconds,
+        so that a lost packet, or a node started after the last update, is still corrected.
+        Positions may be sent from several control threads.
+
+        Args:
+            node_addresses: The (host, port) of each render node.
+            num_sources: The number of sources.
+            sample_rate: The sample rate of the render nodes, in Hz.
+            block_size: The block size of the render nodes, in samples.
+            latency: The time from sending a position to it being applied, in seconds. This must
+                     exceed the network latency to the furthest node.
+            resend_interval: The maximum interval between packets, in seconds, when resend() is called regularly.
+        """
+        self.node_addresses = node_addresses
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.latency = latency
+        self.resend_interval = resend_interval
+        self.last_send_time = None
+        self.positions = np.zeros((num_sources, 3))
+        self.target_times = np.full(num_sources, np.nan)
+        self.epoch = time.time()
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send_positions(self,
+                       source_indices: np.ndarray,
+                       positions: np.ndarray,
+                       target_times: np.ndarray = None) -> int:
+        """
+        Update the positions of the given sources, and send the full position table to every node.
+
+        Args:
+            source_indices: The 0-indexed source indices.
+            positions: The [x, y, z] position of each source, of shape [len(source_indices), 3].
+            target_times: The time.time() at which each source should arrive at its position, which
+                          nodes ramp towards. Defaults to NaN, applying each position on the stamped block.
+
+        Returns:
+            The block on which the nodes will apply the positions.
+        """
+        with self.lock:
+            self.positions[source_indices] = positions
+            self.target_times[source_indices] = np.nan if target_times is None else target_times
+            stream_time = time.time() - self.epoch + self.latency
+            block = int(np.ceil(stream_time * self.sample_rate / self.block_size))
+            self.sequence += 1
+            packet = encode_positions_packet(self.sequence, self.epoch, block, self.positions, self.target_times)
+            for address in self.node_addresses:
+                self.socket.sendto(packet, address)
+            self.last_send_time = time.monotonic()
+        return block
+
+    def resend(self):
+        """
+        Send the full position table again if nothing has been sent for resend_interval seconds.
+        Called regularly by the control process.
+        """
+        if self.last_send_time is None or time.monotonic() - self.last_send_time >= self.resend_interval:
+            self.send_positions(np.arange(0), np.zeros((0, 3)))
+
+    def close(self):
+        self.socket.close()
+
+
+class DeviceOutput:
+    def __init__(self,
+                 num_channels: int,
+                 sample_rate: int = render_sample_rate,
+                 block_size: int = output_buffer_size,
+                 num_blocks: int = render_output_blocks,
+                 graph: AudioGraph = None):
+        """
+        Plays the blocks rendered by a RenderNode on an audio output device. Blocks are written into a
+        looping ring buffer of `num_blocks` blocks, half the ring ahead of the block being played, so
+        rendering may run up to num_blocks / 2 blocks early or late before the device plays a stale block.
+
+        Playback begins with the first block written. From then on, the node's render loop and the device
+        are both paced in real time, so their clocks must not drift apart by more than half the ring.
+
+        Args:
+            num_channels: The number of output channels, one per rendered speaker.
+            sample_rate: The sample rate, in Hz.
+            block_size: The number of frames per block.
+            num_blocks: The number of blocks in the ring buffer.
+            graph: The AudioGraph to play through. Defaults to a graph on the configured output device.
+        """
+        self.num_channels = num_channels
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.num_blocks = num_blocks
+        self.graph = graph
+        self.buffer = Buffer(num_channels, num_blocks * block_size)
+        self.samples = self.buffer.data
+        self.samples[:] = 0
+        self.player = None
+        self.first_block = None
+
+    def start(self, first_block: int):
+        if self.graph is None:
+            config = AudioGraphConfig()
+            config.output_device_name = output_device_name
+            config.output_buffer_size = self.block_size
+            config.sample_rate = self.sample_rate
+            self.graph = AudioGraph(config=config, start=True)
+        self.first_block = first_block
+        self.player = BufferPlayer(self.buffer, loop=True)
+        self.player.play()
+        logger.info("Playing %d channels on the output device, from block %d" % (self.num_channels, first_block))
+
+    def __call__(self, block: int, output: np.ndarray):
+        if self.player is None:
+            self.start(block)
+        slot = (block - self.first_block + self.num_blocks // 2) % self.num_blocks
+        self.samples[:, slot * self.block_size:(slot + 1) * self.block_size] = output
+
+    def close(self):
+        if self.player is not None:
+            self.player.stop()
+            self.player = None
+
+
+class FileOutput:
+    def __init__(self,
+                 path: str,
+                 num_channels: int,
+                 duration: float,
+                 sample_rate: int = render_sample_rate):
+        """
+        Writes the blocks rendered by a RenderNode to a 32-bit float WAV file, one channel per rendered
+        speaker, starting from the first block rendered. Blocks beyond `duration` are discarded.
+
+        Args:
+            path: The path to write to.
+            num_channels: The number of output channels.
+            duration: The duration of the file, in seconds.
+            sample_rate: The sample rate, in Hz.
+        """
+        self.path = path
+        self.num_frames = int(duration * sample_rate)
+        self.output = create_wav(path, num_channels, self.num_frames, sample_rate)
+        self.first_block = None
+
+    def __call__(self, block: int, output: np.ndarray):
+        if self.first_block is None:
+            self.first_block = block
+        start = (block - self.first_block) * output.shape[1]
+        num_frames = min(output.shape[1], self.num_frames - start)
+        if num_frames > 0:
+            self.output[start:start + num_frames] = output[:, :num_frames].T
+
+    def close(self):
+        self.output.flush()
+        logger.info("Wrote %d frames to %s" % (self.num_frames, self.path))
+
+
+class RenderNode:
+    def __init__(self,
+                 port: int,
+                 module_indices: list[int],
+                 num_sources: int,
+                 sample_rate: int = render_sample_rate,
+                 block_size: int = output_buffer_size,
+                 modules: list[Module] = module_layout,
+                 input_callback: Callable[[int], np.ndarray] = None,
+                 output_callback: Callable[[int, np.ndarray], None] = None,
+                 host: str = "0.0.0.0",
+                 log_applied_blocks: bool = False):
+        """
+        Renders the speakers of a subset of modules, applying source positions received from a
+        RenderCoordinator on the block with which they are stamped. Blocks are rendered in real time,
+        paced by the wall clock from the coordinator's epoch, and rendering begins when the first
+        packet is received.
+
+        Positions with a target time are ramped to arrive at that time, measured by the node's block
+        clock (the epoch plus the number of blocks elapsed), so that ramps are block-accurate and
+        identical on every node.
+
+        Driving functions are computed against the full speaker array, so that secondary source
+        selection and speaker spacing match on every node, but only the assigned speakers are rendered.
+
+        Args:
+            port: The UDP port to receive positions on.
+            module_indices: The indices of the modules to render, within `modules`.
+            num_sources: The number of sources.
+            sample_rate: The sample rate, in Hz.
+            block_size: The block size, in samples. Must match the coordinator.
+            modules: The layout of every module in the array.
+            input_callback: Called with a block index, returning the audio of each source, of shape
+                            [num_sources, block_size]. Defaults to silence. As with the live audio engines,
+                            the input is scaled by input_gain.
+            output_callback: Called with a block index and the rendered audio of each assigned speaker,
+                             of shape [num_speakers, block_size], clipped to output_clip_level. See
+                             DeviceOutput and FileOutput.
+            host: The address to listen on.
+            log_applied_blocks: If True, record the block on which each packet's positions were applied,
+                                in applied_blocks, keyed by sequence number. Used to verify synchronisation.
+        """
+        self.module_indices = list(module_indices)
+        self.num_sources = num_sources
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.input_callback = input_callback
+        self.output_callback = output_callback
+        self.log_applied_blocks = log_applied_blocks
+
+        speaker_positions, speaker_orientations = get_speaker_layout(modules)
+        speaker_indices = np.concatenate([np.arange(module_index * num_speakers_per_module,
+                                                    (module_index + 1) * num_speakers_per_module)
+                                          for module_index in self.module_indices])
+        self.speaker_indices = speaker_indices
+        self.engine = RenderEngine(speaker_positions,
+                                   speaker_orientations,
+                                   num_sources,
+                                   sample_rate,
+                                   block_size,
+                                   speaker_indices=speaker_indices)
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.port = self.socket.getsockname()[1]
+
+        self.positions = np.zeros((num_sources, 3))
+        self.target_times = np.full(num_sources, np.nan)
+        self.has_positions = False
+        self.pending = []
+        self.epoch = None
+        self.block = None
+        self.is_running = False
+        self.num_blocks = 0
+        self.num_late_updates = 0
+        self.applied_blocks = {}
+        self.render_time = Histogram()
+
+    def receive(self, timeout: float = 0.0):
+        """
+        Receive any pending position packets, waiting up to `timeout` seconds for the first.
+        By default, returns immediately if no packet is pending.
+        """
+        self.socket.settimeout(timeout)
+        while True:
+            try:
+                data = self.socket.recv(65536)
+            except (BlockingIOError, socket.timeout):
+                return
+            self.socket.settimeout(0)
+            packet = decode_positions_packet(data)
+            if packet is None:
+                logger.warning("Ignoring invalid packet")
+                continue
+            header, positions, target_times = packet
+            if self.epoch is None:
+                self.epoch = float(header["epoch"])
+            self.pending.append((int(header["block"]), int(header["sequence"]), positions, target_times))
+
+    def apply_pending(self):
+        """
+        Apply the most recent pending positions due on or before the current block.
+        """
+        if not self.pending:
+            return
+        due = [update for update in self.pending if update[0] <= self.block]
+        if not due:
+            return
+        self.pending = [update for update in self.pending if update[0] > self.block]
+        block, sequence, positions, target_times = max(due, key=lambda update: update[1])
+        num_sources = min(len(positions), self.num_sources)
+        positions, target_times = positions[:num_sources], target_times[:num_sources]
+        # Packets carry every source, so only ramp the sources whose position or target has changed
+        changed = np.flatnonzero(np.any(positions != self.positions[:num_sources], axis=1) |
+                                 ~((target_times == self.target_times[:num_sources]) |
+                                   (np.isnan(target_times) & np.isnan(self.target_times[:num_sources]))))
+        if len(changed):
+            # The first positions received are applied immediately, rather than ramping from the origin
+            ramp_times = target_times[changed] if self.has_positions else np.full(len(changed), np.nan)
+            self.engine.set_targets(changed, positions[changed], ramp_times, self.block_time)
+        self.has_positions = True
+        self.positions[:num_sources] = positions
+        self.target_times[:num_sources] = target_times
+        self.num_late_updates += sum(1 for update in due if update[0] < self.block)
+        if self.log_applied_blocks:
+            for update in due:
+                self.applied_blocks[update[1]] = self.block
+
+    @property
+    def block_time(self) -> float:
+        """
+        The time at the start of the current block, on the same clock as time.time().
+        """
+        return self.epoch + self.block * self.block_size / self.sample_rate
+
+    def process_block(self) -> np.ndarray:
+        self.apply_pending()
+        if self.input_callback is not None:
+            input_block = self.input_callback(self.block) * input_gain
+        else:
+            input_block = np.zeros((self.num_sources, self.block_size), dtype=np.float32)
+        t0 = time.perf_counter()
+        output = self.engine.process(input_block, time=self.block_time)
+        np.clip(output, -output_clip_level, output_clip_level, out=output)
+        self.render_time.record(time.perf_counter() - t0)
+        if self.output_callback is not None:
+            self.output_callback(self.block, output)
+        self.num_blocks += 1
+        return output
+
+    def run(self, duration: float = None):
+        """
+        Render blocks in real time until stop() is called, or for the given duration once rendering has started.
+        """
+        self.is_running = True
+        while self.is_running and self.epoch is None:
+            self.receive(timeout=0.1)
+        if not self.is_running:
+            return
+        block_duration = self.block_size / self.sample_rate
+        self.block = int((time.time() - self.epoch) / block_duration)
+        end_block = None if duration is None else self.block + int(duration / block_duration)
+        logger.info("Rendering %d speakers from block %d" % (len(self.speaker_indices), self.block))
+
+        while self.is_running and (end_block is None or self.block < end_block):
+            self.receive()
+            self.process_block()
+            self.block += 1
+            time.sleep(max(0.0, self.epoch + self.block * block_duration - time.time()))
+        self.is_running = False
+
+    def stop(self):
+        self.is_running = False
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,159 @@
+import numpy as np
+from .constants import speed_of_sound, prefilter_high_frequency
+
+#--------------------------------------------------------------------------------
+# Vectorised WFS driving functions.
+#
+# Computes the gain and delay applied by every speaker (secondary source) to
+# every sound source (virtual source) in a single batched NumPy evaluation,
+# returning [num_sources, num_speakers] matrices.
+#--------------------------------------------------------------------------------
+
+#--------------------------------------------------------------------------------
+# Distances are clamped to this minimum, in metres, to avoid a singularity
+# when a source is placed directly on top of a speaker.
+#--------------------------------------------------------------------------------
+minimum_distance = 0.1
+
+
+def speaker_normals(orientations: np.ndarray) -> np.ndarray:
+    """
+    Compute the unit normal vector of each speaker from the rotation of its module.
+    The normal points away from the front face of the speaker, into the listening area,
+    and matches the direction vectors exported by layout.format_spat_layout.
+
+    Args:
+        orientations: The rotation of each speaker's module around the Z axis, in radians.
+
+    Returns:
+        An array of shape [num_speakers, 3].
+    """
+    orientations = np.asarray(orientations, dtype=float)
+    return np.stack([np.sin(orientations),
+                     -np.cos(orientations),
+                     np.zeros_like(orientations)], axis=-1)
+
+
+def get_speaker_spacing(speaker_positions: np.ndarray) -> float:
+    """
+    Estimate the spacing of the secondary sources, as the median distance from each speaker
+    to its nearest neighbour.
+
+    Args:
+        speaker_positions: Array of shape [num_speakers, 3].
+
+    Returns:
+        The speaker spacing, in metres.
+    """
+    speaker_positions = np.atleast_2d(np.asarray(speaker_positions, dtype=float))
+    if len(speaker_positions) < 2:
+        return 1.0
+    distances = np.linalg.norm(speaker_positions[:, np.newaxis, :] - speaker_positions[np.newaxis, :, :], axis=-1)
+    np.fill_diagonal(distances, np.inf)
+    return float(np.median(np.min(distances, axis=1)))
+
+
+def select_secondary_sources(source_positions: np.ndarray,
+                             speaker_positions: np.ndarray,
+                             normals: np.ndarray,
+                             reference_position: np.ndarray = (0.0, 0.0, 0.0)) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Determine which speakers contribute to each source.
+
+    A speaker is active for a source if the source lies behind it, so that the wavefront
+    radiated from the source's position propagates through the front face of the speaker.
+
+    A source that is in front of every speaker (within the listening area) is rendered as
+    a focused source. The wavefront of a focused source converges on the source and then
+    diverges towards the listener, so a speaker is active if it faces the source and the
+    source lies between the speaker and the reference (listening) position. If no speaker
+    satisfies this, for example when the source is at the reference position, every speaker
+    facing the source is active.
+
+    Args:
+        source_positions: Array of shape [num_sources, 3].
+        speaker_positions: Array of shape [num_speakers, 3].
+        normals: Array of shape [num_speakers, 3], as returned by speaker_normals().
+        reference_position: The [x, y, z] position of the listener.
+
+    Returns:
+        A tuple of (active, focused, distances, cosines):
+          - active: boolean array of shape [num_sources, num_speakers]
+          - focused: boolean array of shape [num_sources]
+          - distances: source-to-speaker distances, of shape [num_sources, num_speakers]
+          - cosines: cosine of the angle between the direction of propagation and each speaker's
+                     normal, of shape [num_sources, num_speakers]. For focused sources, the sign is
+                     inverted so that contributing speakers have positive cosines.
+    """
+    vectors = speaker_positions[np.newaxis, :, :] - source_positions[:, np.newaxis, :]
+    distances = np.maximum(np.linalg.norm(vectors, axis=-1), minimum_distance)
+    cosines = np.einsum("snk,nk->sn", vectors, normals) / distances
+
+    active = cosines > 0
+    focused = ~np.any(active, axis=1)
+    if np.any(focused):
+        cosines[focused] = -cosines[focused]
+        facing = cosines[focused] > 0
+        to_reference = np.asarray(reference_position, dtype=float) - source_positions[focused]
+        towards_reference = np.einsum("snk,sk->sn", -vectors[focused], to_reference) > 0
+        focused_active = facing & towards_reference
+        no_active = ~np.any(focused_active, axis=1)
+        focused_active[no_active] = facing[no_active]
+        active[focused] = focused_active
+
+    return active, focused, distances, cosines
+
+
+def compute_driving_functions(source_positions: np.ndarray,
+                              speaker_positions: np.ndarray,
+                              speaker_orientations: np.ndarray,
+                              reference_distance: float = 1.0,
+                              speaker_spacing: float = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the 2.5D point-source WFS driving function of every speaker for every source.
+
+    The gain of each active speaker is
+
+        dx * sqrt(k / 2pi) * sqrt(reference_distance / r) * cos(phi)
+
+    where r is the distance from the source to the speaker, phi is the angle between the
+    direction of propagation and the speaker's normal, and dx is the speaker spacing.
+    Amplitudes are correct at reference_distance from the array, and fall with the source's
+    distance from it. Inactive speakers have a gain of zero.
+    The sqrt(jk) pre-equalisation filter is frequency-dependent and is applied separately
+    (see openwfs.prefilter), so k is taken at prefilter_high_frequency, where that filter has
+    unity gain.
+
+    Delays are r / c for sources behind the array. For focused sources, the delays are
+    time-reversed, offset so that the speaker furthest from the source has zero delay.
+
+    Args:
+        source_positions: The [x, y, z] position of each source, of shape [num_sources, 3].
+        speaker_positions: The [x, y, z] position of each speaker, of shape [num_speakers, 3].
+        speaker_orientations: The rotation of each speaker's module, in radians, of shape [num_speakers].
+        reference_distance: The distance from the array, in metres, at which amplitudes are correct.
+        speaker_spacing: The spacing of the speakers, in metres. If not specified, it is estimated
+                         with get_speaker_spacing().
+
+    Returns:
+        A tuple of (gains, delays), each of shape [num_sources, num_speakers]. Delays are in seconds.
+    """
+    source_positions = np.atleast_2d(np.asarray(source_positions, dtype=float))
+    speaker_positions = np.atleast_2d(np.asarray(speaker_positions, dtype=float))
+    normals = speaker_normals(speaker_orientations)
+    if speaker_spacing is None:
+        speaker_spacing = get_speaker_spacing(speaker_positions)
+
+    active, focused, distances, cosines = select_secondary_sources(source_positions, speaker_positions, normals)
+
+    wavenumber = 2 * np.pi * prefilter_high_frequency / speed_of_sound
+    scale = speaker_spacing * np.sqrt(wavenumber / (2 * np.pi))
+    gains = np.where(active, scale * cosines * np.sqrt(reference_distance / distances), 0.0)
+
+    delays = distances / speed_of_sound
+    if np.any(focused):
+        max_delays = np.max(np.where(active[focused], delays[focused], 0.0), axis=1, keepdims=True)
+        delays[focused] = max_delays - delays[focused]
+    delays = np.where(active, delays, 0.0)
+
+    return gains, delays
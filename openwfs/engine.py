@@ -0,0 +1,198 @@
+import numpy as np
+from .cache import DrivingFunctionCache
+from .calibration import Calibration
+from .delay import DelayLineBank
+from .driving import compute_driving_functions, get_speaker_spacing
+from .prefilter import OverlapSaveFilter, design_prefilter
+from .ramps import PositionRamps
+from .constants import output_buffer_size, max_delay_time, enable_driving_function_cache, active_speaker_threshold
+from .constants import enable_prefilter, enable_delay_ramp, delay_interpolation, position_interpolation
+
+
+class RenderEngine:
+    def __init__(self,
+                 speaker_positions: np.ndarray,
+                 speaker_orientations: np.ndarray,
+                 num_sources: int,
+                 sample_rate: int,
+                 block_size: int = output_buffer_size,
+                 speaker_indices: np.ndarray = None,
+                 cache: DrivingFunctionCache = None,
+                 prefilter: bool = enable_prefilter,
+                 calibration: Calibration = None,
+                 delay_ramp: bool = enable_delay_ramp,
+                 interpolation: str = delay_interpolation):
+        """
+        A block-based NumPy WFS renderer, which applies the driving functions of every source
+        to a block of input audio by delay-and-sum.
+
+        If enabled, each source's input is first filtered by the WFS pre-equalisation filter, once
+        per source rather than once per speaker.
+
+        Each source's input is written once per block to a shared ring buffer (a DelayLineBank),
+        from which every speaker reads at its own fractional delay, so delay memory scales with
+        sources x max delay, independent of the number of speakers. With delay ramping, each
+        speaker's delay is ramped across the block from its value in the previous block, so that
+        moving sources are Doppler shifted rather than stepping in delay at each block boundary.
+
+        Each source only renders its active speakers: those selected as secondary sources for the
+        source, with a gain above active_speaker_threshold relative to its loudest speaker. Inactive
+        speakers are skipped entirely, rather than being delayed and summed with a gain of zero.
+
+        Driving functions are always computed against the full speaker array, so that secondary
+        source selection and speaker spacing are consistent, but only the speakers listed in
+        `speaker_indices` are rendered. This allows rendering to be split across processes.
+
+        Source positions are either given for each block, or ramped towards timestamped targets set
+        by set_targets(). Ramps are evaluated at the end of each block, and gains and delays are
+        interpolated across the block, so that ramps are block-accurate.
+
+        Args:
+            speaker_positions: The [x, y, z] position of every speaker, of shape [num_speakers, 3].
+            speaker_orientations: The module rotation of every speaker, in radians.
+            num_sources: The number of sources.
+            sample_rate: The sample rate, in Hz.
+            block_size: The number of frames processed per block.
+            speaker_indices: The indices of the speakers to render. Defaults to all speakers.
+            cache: A DrivingFunctionCache to interpolate driving functions from. If not specified, a
+                   cache is created if enable_driving_function_cache is set.
+            prefilter: If True, apply the WFS pre-equalisation filter to each source.
+            calibration: If specified, each speaker's measured delay, gain and polarity corrections
+                         are applied to its driving functions. Covers every speaker, not only those rendered.
+            delay_ramp: If True, ramp each speaker's delay across each block. Otherwise, delays are
+                        constant within each block.
+            interpolation: The fractional delay interpolator: "linear", "lagrange" or "thiran".
+        """
+        self.speaker_positions = np.asarray(speaker_positions, dtype=float)
+        self.speaker_orientations = np.asarray(speaker_orientations, dtype=float)
+        self.speaker_spacing = get_speaker_spacing(self.speaker_positions)
+        if speaker_indices is None:
+            speaker_indices = np.arange(len(self.speaker_positions))
+        self.speaker_indices = np.asarray(speaker_indices)
+        self.num_sources = num_sources
+        self.num_outputs = len(self.speaker_indices)
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+
+        self.max_delay_samples = int(np.ceil(max_delay_time * sample_rate))
+        self.delay_ramp = delay_ramp
+        self.delay_lines = DelayLineBank(num_sources, self.max_delay_samples, block_size, interpolation, self.num_outputs)
+        self.prefilter = None
+        if prefilter:
+            self.prefilter = OverlapSaveFilter(num_sources, design_prefilter(sample_rate), block_size)
+        self.calibration = calibration
+        self.ramp = np.arange(block_size, dtype=np.float32) / block_size
+        self.gains = None
+        self.delays = None
+        self.active = np.zeros((num_sources, self.num_outputs), dtype=bool)
+
+        # The NumPy engine has no one-pole smoothing, so ramps linearly unless splines are selected
+        self.ramps = PositionRamps(num_sources,
+                                   interpolation="spline" if position_interpolation == "spline" else "linear",
+                                   ramp_time=0.0)
+
+        if cache is None and enable_driving_function_cache:
+            cache = DrivingFunctionCache()
+        self.cache = cache
+
+    def compute_driving_functions(self, source_positions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            A tuple of (gains, delays) for the rendered speakers, each of shape [num_sources, num_outputs].
+            Delays are in samples, limited to the maximum delay time. Gains below the active speaker
+            threshold are set to zero. Gains are negative for speakers with reversed polarity.
+        """
+        if self.cache is not None:
+            gains, delays = self.cache.lookup(source_positions, self.speaker_positions, self.speaker_orientations)
+        else:
+            gains, delays = compute_driving_functions(source_positions, self.speaker_positions, self.speaker_orientations,
+                                                      speaker_spacing=self.speaker_spacing)
+        gains = np.where(gains >= active_speaker_threshold * np.max(gains, axis=1, keepdims=True), gains, 0.0)
+        gains = gains[:, self.speaker_indices]
+        delays = delays[:, self.speaker_indices]
+        if self.calibration is not None:
+            gains = gains * (self.calibration.gains * self.calibration.polarities)[self.speaker_indices]
+            delays = delays + self.calibration.delays[self.speaker_indices]
+        delays = np.minimum(delays * self.sample_rate, self.max_delay_samples)
+        return gains, delays
+
+    def set_targets(self, source_indices: np.ndarray, positions: np.ndarray, target_times: np.ndarray, time: float):
+        """
+        Ramp the given sources towards new positions, for blocks rendered by process() without
+        explicit source positions. See PositionRamps.set_targets.
+
+        Args:
+            source_indices: The 0-indexed source indices.
+            positions: The target [x, y, z] position of each source, of shape [len(source_indices), 3].
+            target_times: The time at which each source should arrive at its target, on the same clock
+                          as `time`. NaN, or a time that is not after `time`, applies the position on
+                          the next block rendered.
+            time: The current time, usually the time at the start of the next block.
+        """
+        self.ramps.set_targets(source_indices, positions, target_times, time)
+
+    @property
+    def active_ratio(self) -> float:
+        """
+        The proportion of source-speaker pairs rendered in the most recent block.
+        """
+        return np.count_nonzero(self.active) / self.active.size
+
+    def process(self, input_block: np.ndarray, source_positions: np.ndarray = None, time: float = None) -> np.ndarray:
+        """
+        Render a block of audio.
+
+        Gains, and with delay ramping, delays, are ramped linearly across the block from their values
+        in the previous block.
+
+        Args:
+            input_block: The audio of each source, of shape [num_sources, block_size].
+            source_positions: The position of each source for this block, of shape [num_sources, 3].
+                              If not given, each source's position is evaluated from its ramp (see
+                              set_targets) at the end of the block.
+            time: The time at the start of the block, on the clock of set_targets(). Required if
+                  source_positions is not given.
+
+        Returns:
+            The audio of each rendered speaker, of shape [num_outputs, block_size].
+        """
+        if source_positions is None:
+            source_positions = self.ramps.positions_at(time + self.block_size / self.sample_rate)
+        gains, delays = self.compute_driving_functions(source_positions)
+        if self.gains is None:
+            self.gains, self.delays = gains, delays
+
+        if self.prefilter is not None:
+            input_block = self.prefilter.process(input_block)
+        self.delay_lines.write(input_block)
+
+        output = np.zeros((self.num_outputs, self.block_size), dtype=np.float32)
+        # A speaker remains active for the block in which its gain ramps down to zero
+        self.active = (gains != 0) | (self.gains != 0)
+        for source_index in range(self.num_sources):
+            outputs = np.flatnonzero(self.active[source_index])
+            if not len(outputs):
+                continue
+
+            if self.delay_ramp:
+                # A speaker that is fading in or out has no meaningful delay at the silent end of
+                # its ramp, so holds its delay at the other end rather than sweeping from zero.
+                start_delays = self.delays[source_index, outputs]
+                end_delays = delays[source_index, outputs]
+                start_delays = np.where(self.gains[source_index, outputs] != 0, start_delays, end_delays)
+                end_delays = np.where(gains[source_index, outputs] != 0, end_delays, start_delays)
+                samples = self.delay_lines.read(source_index, start_delays, end_delays, taps=outputs)
+            else:
+                # A speaker fading out has no delay of its own in this block, so keeps its previous
+                # delay for the fade, rather than fading out its undelayed input
+                block_delays = np.where(gains[source_index, outputs] != 0,
+                                        delays[source_index, outputs],
+                                        self.delays[source_index, outputs])
+                samples = self.delay_lines.read(source_index, block_delays, taps=outputs)
+
+            previous_gains = self.gains[source_index, outputs][:, np.newaxis]
+            block_gains = previous_gains + (gains[source_index, outputs][:, np.newaxis] - previous_gains) * self.ramp
+            output[outputs] += samples * block_gains
+        self.gains, self.delays = gains, delays
+
+        return output
@@ -0,0 +1,214 @@
+import os
+import json
+import logging
+import hashlib
+import tempfile
+import numpy as np
+from dataclasses import dataclass
+from functools import lru_cache
+from .module import Module
+from .driving import speaker_normals
+from .constants import module_layout, num_speakers_per_module, layout_cache_dir
+
+logger = logging.getLogger(__name__)
+
+driver_layout_file = os.path.join(os.path.dirname(__file__), "data", "openwfs_driver_layout_v2.csv")
+
+
+@lru_cache()
+def get_driver_layout() -> np.ndarray:
+    """
+    Read the driver layout of a single module, centred on the module's centre, in metres.
+
+    Returns:
+        An array of shape [num_drivers, 2], containing the horizontal and vertical offset of each driver.
+    """
+    driver_layout = np.loadtxt(driver_layout_file, delimiter=",", skiprows=1, usecols=(1, 2), ndmin=2)
+
+    # flip the Z axis (design is upside down, with tight-spaced speakers on top)
+    driver_layout[:, 1] = -driver_layout[:, 1]
+    driver_layout = driver_layout - (driver_layout.max(axis=0) + driver_layout.min(axis=0)) / 2
+    driver_layout = driver_layout * 0.001
+    driver_layout.flags.writeable = False
+    return driver_layout
+
+
+def get_speaker_layout(modules: list[Module] = module_layout,
+                       num_speakers_per_module: int = num_speakers_per_module) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the position and orientation of every driver of an array of OpenWFS modules,
+    from the driver layout of a single module.
+
+    Args:
+        modules: The position and rotation of each module.
+        num_speakers_per_module: The number of drivers to use per module.
+
+    Returns:
+        A tuple of (positions, orientations): the [x, y, z] position in metres of each speaker,
+        of shape [num_speakers, 3], and the rotation of each speaker in radians, of shape [num_speakers].
+    """
+    drivers = get_driver_layout()[:num_speakers_per_module]
+    module_positions = np.array([module.position for module in modules], dtype=float).reshape(-1, 3)
+    module_rotations = np.array([module.rotation for module in modules], dtype=float)
+
+    # Drivers are offset horizontally along the face of the module, and vertically in Z
+    positions = np.empty((len(modules), len(drivers), 3))
+    positions[:, :, 0] = module_positions[:, np.newaxis, 0] + np.cos(module_rotations)[:, np.newaxis] * drivers[:, 0]
+    positions[:, :, 1] = module_positions[:, np.newaxis, 1] + np.sin(module_rotations)[:, np.newaxis] * drivers[:, 0]
+    positions[:, :, 2] = module_positions[:, np.newaxis, 2] + drivers[:, 1]
+    orientations = np.repeat(module_rotations, len(drivers))
+    return positions.reshape(-1, 3), orientations
+
+
+def create_module_ring(num_modules: int, radius: float = 2.0) -> list[Module]:
+    """
+    Create a ring of modules around the origin, each facing inwards. Used to simulate large arrays.
+    """
+    modules = []
+    for module_index in range(num_modules):
+        angle = 2 * np.pi * module_index / num_modules
+        modules.append(Module([radius * np.sin(angle), radius * np.cos(angle), 0.0], -angle))
+    return modules
+
+
+#--------------------------------------------------------------------------------
+# Compiled layouts.
+#
+# A compiled layout holds the position, orientation and direction of every
+# speaker in an array. It is saved as a NumPy structured array (.npy), with one
+# record per speaker, which can be loaded (or memory-mapped) without
+# recomputing the layout. Compiled layouts are cached by a hash of everything
+# they are computed from: the module layout, the number of drivers per module,
+# and the driver layout file.
+#--------------------------------------------------------------------------------
+
+layout_version = 1
+
+speaker_dtype = np.dtype([("position", "<f8", 3),
+                          ("orientation", "<f8"),
+                          ("direction", "<f8", 3)])
+
+
+@dataclass
+class CompiledLayout:
+    positions: np.ndarray
+    orientations: np.ndarray
+    directions: np.ndarray
+    key: str
+
+    @property
+    def num_speakers(self) -> int:
+        return len(self.positions)
+
+
+def get_layout_key(modules: list[Module] = module_layout,
+                   num_speakers_per_module: int = num_speakers_per_module) -> str:
+    """
+    Returns:
+        A hash of the inputs to a compiled layout, which changes whenever the layout would change.
+    """
+    digest = hashlib.sha1()
+    digest.update(np.array([layout_version, num_speakers_per_module], dtype="<i8").tobytes())
+    for module in modules:
+        digest.update(np.array([*module.position, module.rotation], dtype="<f8").tobytes())
+    with open(driver_layout_file, "rb") as fd:
+        digest.update(fd.read())
+    return digest.hexdigest()[:16]
+
+
+def compile_layout(modules: list[Module] = module_layout,
+                   num_speakers_per_module: int = num_speakers_per_module,
+                   cache_dir: str = layout_cache_dir) -> CompiledLayout:
+    """
+    Compile the speaker layout of an array of modules, loading it from the cache if it has
+    already been compiled.
+
+    Args:
+        modules: The position and rotation of each module.
+        num_speakers_per_module: The number of drivers to use per module.
+        cache_dir: The directory of cached layouts, or None to disable caching.
+
+    Returns:
+        The compiled layout.
+    """
+    key = get_layout_key(modules, num_speakers_per_module)
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, "layout-%s.npy" % key)
+        if os.path.exists(cache_path):
+            try:
+                return load_layout(cache_path, key)
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring invalid cached layout %s: %s" % (cache_path, e))
+
+    positions, orientations = get_speaker_layout(modules, num_speakers_per_module)
+    layout = CompiledLayout(positions, orientations, speaker_normals(orientations), key)
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            save_layout(layout, cache_path)
+        except OSError as e:
+            logger.warning("Could not cache layout to %s: %s" % (cache_path, e))
+    return layout
+
+
+def save_layout(layout: CompiledLayout, path: str):
+    """
+    Save a compiled layout in binary form. The file is written atomically, so that a layout being
+    loaded by another process is never incomplete.
+    """
+    records = np.zeros(layout.num_speakers, dtype=speaker_dtype)
+    records["position"] = layout.positions
+    records["orientation"] = layout.orientations
+    records["direction"] = layout.directions
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".npy")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            np.save(temp_file, records)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_layout(path: str, key: str = None) -> CompiledLayout:
+    """
+    Load a compiled layout saved by save_layout.
+    """
+    records = np.load(path, mmap_mode="r")
+    if records.dtype != speaker_dtype:
+        raise ValueError("Not a compiled layout: %s" % path)
+    return CompiledLayout(np.array(records["position"]),
+                          np.array(records["orientation"]),
+                          np.array(records["direction"]),
+                          key)
+
+
+def format_spat_layout(layout: CompiledLayout, speaker_mask: np.ndarray = None) -> str:
+    """
+    Returns:
+        The layout as OSC messages for Max/MSP Spat: the position of every speaker that is enabled
+        in speaker_mask (defaulting to all speakers), followed by the direction of every speaker.
+    """
+    positions = layout.positions
+    if speaker_mask is not None:
+        if len(speaker_mask) != layout.num_speakers:
+            raise ValueError("speaker_mask must be a binary array with the same length as the number of speakers")
+        positions = positions[np.asarray(speaker_mask, dtype=bool)]
+    lines = ["/speakers/xyz " + " ".join("%.3f %.3f %.3f" % tuple(position) for position in positions)]
+    lines += ["/speaker/%d/direction/xy %.3f %.3f" % (index + 1, direction[0], direction[1])
+              for index, direction in enumerate(layout.directions)]
+    return "\n".join(lines) + "\n"
+
+
+def format_json_layout(layout: CompiledLayout) -> str:
+    """
+    Returns:
+        The layout as a JSON document, listing the position, orientation and direction of each speaker.
+    """
+    return json.dumps({"key": layout.key,
+                       "speakers": [{"position": position, "orientation": orientation, "direction": direction}
+                                    for position, orientation, direction in zip(layout.positions.tolist(),
+                                                                                layout.orientations.tolist(),
+                                                                                layout.directions.tolist())]},
+                      indent=2)
@@ -0,0 +1,86 @@
+import logging
+from signalflow import *
+from .constants import crossover_frequency_lpf, crossover_slope_lpf, lfe_frequency_hpf, lfe_slope_hpf
+from .constants import lfe_channel_indices, lfe_delays, lfe_gain, num_speakers
+
+logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# Bass management.
+#
+# The LFE feed is a mono mixdown of every source's input. It is computed once
+# per input set, however many sources there are: one mixdown, one crossover
+# and one set of sub outputs, hosted by a single render process.
+#--------------------------------------------------------------------------------
+
+
+def get_num_filter_sections(slope: float) -> int:
+    """
+    Returns:
+        The number of cascaded second-order (12dB/octave) filter sections for a slope in dB/octave.
+    """
+    if slope <= 0 or slope % 12:
+        raise ValueError("Crossover slope must be a positive multiple of 12dB/octave: %s" % slope)
+    return int(slope // 12)
+
+
+def create_crossover(input: Node,
+                     filter_type: str,
+                     cutoff: float,
+                     slope: float) -> Node:
+    """
+    Filter a signal with a cascade of second-order state-variable filters.
+
+    Args:
+        input: The input signal.
+        filter_type: "low_pass" or "high_pass".
+        cutoff: The cutoff frequency, in Hz.
+        slope: The slope of the filter, in dB/octave, which must be a multiple of 12.
+    """
+    output = input
+    for section in range(get_num_filter_sections(slope)):
+        output = SVFilter(input=output,
+                          filter_type=filter_type,
+                          resonance=0.0,
+                          cutoff=cutoff)
+    return output
+
+
+def create_lfe_bus(input: Node,
+                   num_outputs: int = num_speakers,
+                   channel_indices: list[int] = lfe_channel_indices,
+                   delays: list[float] = lfe_delays,
+                   gain: float = lfe_gain) -> Node:
+    """
+    Create the bass management bus: a mono mixdown of every channel of the input, low-passed at
+    crossover_frequency_lpf, and sent to one or more sub outputs. If lfe_frequency_hpf is set,
+    the mixdown is also high-passed at that frequency.
+
+    Args:
+        input: The input of every source, with one channel per source.
+        num_outputs: The number of channels of the output.
+        channel_indices: The output channel of each sub.
+        delays: The delay of each sub, in seconds, to time-align it with the array. Defaults to no delay.
+        gain: The gain of the LFE feed.
+
+    Returns:
+        A node with num_outputs channels, which is silent except for the sub outputs.
+    """
+    if delays is None:
+        delays = [0.0] * len(channel_indices)
+    if len(delays) != len(channel_indices):
+        raise ValueError("One delay must be given per LFE channel")
+
+    mono_mixdown = ChannelMixer(num_channels=1, input=input)
+    lfe = mono_mixdown
+    if lfe_frequency_hpf is not None:
+        lfe = create_crossover(lfe, "high_pass", lfe_frequency_hpf, lfe_slope_hpf)
+    lfe = create_crossover(lfe, "low_pass", crossover_frequency_lpf, crossover_slope_lpf) * gain
+
+    sub_outputs = []
+    for channel_index, delay in zip(channel_indices, delays):
+        # The maximum delay must exceed the delay, which otherwise wraps around to zero
+        sub = OneTapDelay(lfe, float(delay), 2 * float(delay)) if delay > 0 else lfe
+        sub_outputs.append(ChannelPanner(num_channels=num_outputs, input=sub, pan=channel_index))
+    logger.info("Created LFE bus with %d sub outputs: %s" % (len(sub_outputs), list(channel_indices)))
+    return Sum(sub_outputs) if len(sub_outputs) > 1 else sub_outputs[0]
@@ -0,0 +1,157 @@
+import time
+import logging
+import numpy as np
+import multiprocessing
+from typing import Union
+from .engine import RenderEngine
+from .calibration import Calibration
+from .automation import AutomationPlayer, is_automation_recording
+from .layout import compile_layout
+from .audiofile import WavFile, create_wav, open_wav_for_writing
+from .constants import num_speakers_per_module, max_delay_time, calibration_file
+
+logger = logging.getLogger(__name__)
+
+
+class Automation:
+    def __init__(self,
+                 times: np.ndarray,
+                 source_indices: np.ndarray,
+                 positions: np.ndarray,
+                 num_sources: int):
+        """
+        Position automation for a set of sources, interpolated linearly between keyframes.
+        Sources without any keyframes remain at the origin; before its first keyframe and after
+        its last, a source holds its first and last position respectively.
+
+        Args:
+            times: The time of each keyframe, in seconds.
+            source_indices: The 0-indexed source of each keyframe.
+            positions: The [x, y, z] position of each keyframe, of shape [num_keyframes, 3].
+            num_sources: The number of sources.
+        """
+        times = np.asarray(times, dtype=float)
+        source_indices = np.asarray(source_indices, dtype=int)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        self.num_sources = num_sources
+        self.keyframes = []
+        for source_index in range(num_sources):
+            mask = source_indices == source_index
+            order = np.argsort(times[mask], kind="stable")
+            self.keyframes.append((times[mask][order], positions[mask][order]))
+
+    @classmethod
+    def load(cls, path: str, num_sources: int) -> "Automation":
+        """
+        Load automation from a CSV file with a header row and the columns:
+
+            time,source,x,y,z
+
+        where time is in seconds and source is numbered from 1 upwards, as in the OSC protocol.
+        """
+        rows = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+        return cls(rows[:, 0], rows[:, 1].astype(int) - 1, rows[:, 2:5], num_sources)
+
+    def positions_at(self, time: float) -> np.ndarray:
+        """
+        Returns:
+            The position of every source at the given time, of shape [num_sources, 3].
+        """
+        positions = np.zeros((self.num_sources, 3))
+        for source_index, (times, keyframes) in enumerate(self.keyframes):
+            if len(times):
+                for axis in range(3):
+                    positions[source_index, axis] = np.interp(time, times, keyframes[:, axis])
+        return positions
+
+
+def load_automation(path: str, num_sources: int) -> Union[Automation, AutomationPlayer]:
+    """
+    Load position automation from either a CSV file (see Automation.load) or a binary
+    automation recording (see AutomationRecorder), which is played back via memory-mapped I/O.
+    """
+    if is_automation_recording(path):
+        return AutomationPlayer(path, num_sources)
+    return Automation.load(path, num_sources)
+
+
+def render_speakers(input_path: str,
+                    automation: Union[Automation, AutomationPlayer],
+                    output_path: str,
+                    num_output_frames: int,
+                    speaker_positions: np.ndarray,
+                    speaker_orientations: np.ndarray,
+                    speaker_indices: np.ndarray,
+                    block_size: int,
+                    calibration: Calibration = None):
+    """
+    Render a contiguous range of speakers into an output file created by create_wav().
+    Runs within a worker process of render_offline().
+    """
+    reader = WavFile(input_path)
+    output = open_wav_for_writing(output_path, len(speaker_positions), num_output_frames)
+    engine = RenderEngine(speaker_positions,
+                          speaker_orientations,
+                          num_sources=reader.num_channels,
+                          sample_rate=reader.sample_rate,
+                          block_size=block_size,
+                          speaker_indices=speaker_indices,
+                          calibration=calibration)
+    channels = slice(speaker_indices[0], speaker_indices[-1] + 1)
+    for block_start in range(0, num_output_frames, block_size):
+        positions = automation.positions_at(block_start / reader.sample_rate)
+        block = engine.process(reader.read(block_start, block_size), positions)
+        num_frames = min(block_size, num_output_frames - block_start)
+        output[block_start:block_start + num_frames, channels] = block[:, :num_frames].T
+    output.flush()
+
+
+def render_offline(input_path: str,
+                   automation_path: str,
+                   output_path: str,
+                   num_processes: int = None,
+                   block_size: int = 1024,
+                   calibration_path: str = calibration_file):
+    """
+    Render a multichannel audio file to a file containing one channel per speaker, faster than
+    realtime and without opening any audio devices. Each channel of the input file corresponds
+    to a source, numbered in the same order as the inputs of the live spatialiser.
+
+    Rendering is split across a pool of processes, each of which renders the speakers of one
+    module, writing directly into the memory-mapped output file.
+
+    Args:
+        input_path: The path to a multichannel WAV file.
+        automation_path: The path to a CSV position automation file or a binary automation recording
+                         (see load_automation).
+        output_path: The path to write the rendered WAV file to.
+        num_processes: The number of worker processes. Defaults to the number of CPUs.
+        block_size: The number of frames rendered per block. Driving functions are updated once per block.
+        calibration_path: The path to a driver calibration (see openwfs.calibration) to apply, if any.
+    """
+    layout = compile_layout()
+    calibration = Calibration.load(calibration_path) if calibration_path else None
+    speaker_positions, speaker_orientations = layout.positions, layout.orientations
+    num_speakers = len(speaker_positions)
+    reader = WavFile(input_path)
+    automation = load_automation(automation_path, reader.num_channels)
+
+    # Extend the output so that the tail of the longest delay is not truncated
+    num_output_frames = reader.num_frames + int(np.ceil(max_delay_time * reader.sample_rate))
+    create_wav(output_path, num_speakers, num_output_frames, reader.sample_rate)
+
+    speaker_chunks = np.array_split(np.arange(num_speakers), num_speakers // num_speakers_per_module)
+    if num_processes is None:
+        num_processes = multiprocessing.cpu_count()
+    num_processes = min(num_processes, len(speaker_chunks))
+
+    logger.info("Rendering %d sources to %d speakers (%.1fs of audio, %d processes)..." %
+                (reader.num_channels, num_speakers, reader.duration, num_processes))
+    t0 = time.time()
+    tasks = [(input_path, automation, output_path, num_output_frames,
+              speaker_positions, speaker_orientations, speaker_indices, block_size, calibration)
+             for speaker_indices in speaker_chunks]
+    with multiprocessing.Pool(num_processes) as pool:
+        pool.starmap(render_speakers, tasks)
+    duration = time.time() - t0
+    logger.info("Rendered to %s in %.1fs (%.1fx realtime)" % (output_path, duration, reader.duration / duration))
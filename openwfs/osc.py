@@ -0,0 +1,218 @@
+import time
+import asyncio
+import logging
+import numpy as np
+from typing import Callable, Optional
+from pythonosc import osc_packet, osc_bundle
+from pythonosc.dispatcher import Dispatcher
+from pythonosc.osc_server import AsyncIOOSCUDPServer
+
+logger = logging.getLogger(__name__)
+
+
+def parse_source_positions(address: str, args: tuple) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """
+    Parse a source position message.
+
+      /source/<n>/xyz x y z: sets the position of source <n> (1-indexed)
+      /sources/xyz x1 y1 z1 x2 y2 z2 ...: sets the positions of sources 1, 2, ... in one message
+
+    Args:
+        address: The OSC address.
+        args: The OSC arguments.
+
+    Returns:
+        A tuple of (source_indices, positions), with 0-indexed source indices, or None if the
+        message is not a position message.
+    """
+    if address == "/sources/xyz":
+        if len(args) % 3:
+            raise ValueError("/sources/xyz requires a multiple of 3 arguments (got %d)" % len(args))
+        positions = np.asarray(args, dtype=float).reshape(-1, 3)
+        return np.arange(len(positions)), positions
+    address_parts = address.split("/")
+    if len(address_parts) == 4 and address_parts[1] == "source" and address_parts[3] == "xyz":
+        return np.array([int(address_parts[2]) - 1]), np.asarray(args, dtype=float).reshape(1, 3)
+    return None
+
+
+class SpatialDispatcher(Dispatcher):
+    def __init__(self, set_source_positions: Callable[[np.ndarray, np.ndarray], None]):
+        """
+        A Dispatcher that applies every source position message within an OSC bundle as a single
+        atomic update, so that sources which should move together are never torn between updates.
+        Other messages, and messages that are not within a bundle, are dispatched as normal. Message
+        order is kept: positions that precede another message in a bundle are applied before it is
+        handled, in a separate update from any positions that follow it.
+
+        If the bundle has a timetag in the future, each source is given a target time, at which it
+        should arrive at its new position, as a time.time() timestamp. Otherwise, the target time is NaN.
+
+        Args:
+            set_source_positions: Called with (source_indices, positions, receive_time, target_times)
+                                  for each bundle.
+        """
+        super().__init__()
+        self.set_source_positions = set_source_positions
+
+    def call_handlers_for_packet(self, data: bytes, client_address: tuple[str, int]) -> list:
+        if not osc_bundle.OscBundle.dgram_is_bundle(data):
+            return super().call_handlers_for_packet(data, client_address)
+
+        receive_time = time.monotonic()
+        try:
+            packet = osc_packet.OscPacket(data)
+        except osc_packet.ParseError:
+            return []
+        # Messages that are due immediately are given the time at which the packet was parsed
+        now = time.time()
+
+        # Later messages take precedence over earlier ones for the same source
+        positions = {}
+        target_times = {}
+
+        def push_positions():
+            if positions:
+                self.set_source_positions(np.array(list(positions.keys())),
+                                          np.array(list(positions.values())),
+                                          receive_time,
+                                          np.array([target_times[source_index] for source_index in positions]))
+                positions.clear()
+                target_times.clear()
+
+        results = []
+        for timed_message in packet.messages:
+            message = timed_message.message
+            try:
+                parsed = parse_source_positions(message.address, message.params)
+            except ValueError as e:
+                logger.warning("Invalid position message in bundle: %s" % e)
+                continue
+            if parsed is not None:
+                positions.update(zip(*parsed))
+                target_time = timed_message.time if timed_message.time > now else np.nan
+                target_times.update((source_index, target_time) for source_index in parsed[0])
+                continue
+            # Keep message order: positions earlier in the bundle are pushed before any other
+            # message is handled, so that, for example, a trajectory starts from them
+            push_positions()
+            for handler in self.handlers_for_address(message.address):
+                result = handler.invoke(client_address, message)
+                if result is not None:
+                    results.append(result)
+
+        push_positions()
+        return results
+
+
+class PositionCoalescer:
+    def __init__(self, set_source_positions: Callable[[np.ndarray, np.ndarray], None]):
+        """
+        Accumulates source position updates between control ticks, keeping only the most recent
+        position of each source, and applies them all in a single update per tick.
+
+        Each update is timestamped with the time.monotonic() at which it was received, which is
+        passed on with the update so that control latency can be measured downstream, along with
+        its target time (see SpatialDispatcher).
+
+        Args:
+            set_source_positions: Called with (source_indices, positions, receive_times, target_times)
+                                  on each tick with pending updates.
+        """
+        self.set_source_positions = set_source_positions
+        self.pending = {}
+        self.num_received = 0
+        self.num_applied = 0
+        self.num_dropped = 0
+        self.source_message_counts = {}
+
+    def push(self,
+             source_indices: np.ndarray,
+             positions: np.ndarray,
+             receive_time: float = None,
+             target_times: np.ndarray = None):
+        if receive_time is None:
+            receive_time = time.monotonic()
+        if target_times is None:
+            target_times = np.full(len(source_indices), np.nan)
+        for source_index, position, target_time in zip(source_indices.tolist(), positions, target_times):
+            if source_index in self.pending:
+                self.num_dropped += 1
+            self.pending[source_index] = (position, receive_time, target_time)
+            self.num_received += 1
+            self.source_message_counts[source_index] = self.source_message_counts.get(source_index, 0) + 1
+
+    def flush(self, source_indices: list[int] = None):
+        """
+        Apply pending updates in a single update.
+
+        Args:
+            source_indices: If specified, apply only the pending updates of these sources, leaving
+                            the rest until the next tick. Defaults to every pending update.
+        """
+        if source_indices is None:
+            pending = self.pending
+            self.pending = {}
+        else:
+            pending = {source_index: self.pending.pop(source_index)
+                       for source_index in source_indices if source_index in self.pending}
+        if not pending:
+            return
+        self.num_applied += len(pending)
+        positions, receive_times, target_times = zip(*pending.values())
+        self.set_source_positions(np.array(list(pending.keys())),
+                                  np.array(positions),
+                                  np.array(receive_times),
+                                  np.array(target_times))
+
+    @property
+    def stats(self) -> dict:
+        return {"received": self.num_received,
+                "applied": self.num_applied,
+                "dropped": self.num_dropped}
+
+
+class OSCControlServer:
+    def __init__(self,
+                 server_address: tuple[str, int],
+                 dispatcher: Dispatcher,
+                 coalescer: PositionCoalescer,
+                 control_interval: float):
+        """
+        An asyncio OSC server, which handles every datagram on a single event loop thread, and
+        flushes coalesced position updates once per control tick.
+
+        Args:
+            server_address: The (host, port) to listen on.
+            dispatcher: The dispatcher to handle incoming messages.
+            coalescer: The PositionCoalescer to flush on each tick.
+            control_interval: The duration of a control tick, in seconds.
+        """
+        self.server_address = server_address
+        self.dispatcher = dispatcher
+        self.coalescer = coalescer
+        self.control_interval = control_interval
+        self.loop = None
+        self.stop_event = None
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        server = AsyncIOOSCUDPServer(self.server_address, self.dispatcher, self.loop)
+        transport, protocol = await server.create_serve_endpoint()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), self.control_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.coalescer.flush()
+        finally:
+            transport.close()
+
+    def shutdown(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
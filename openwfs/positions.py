@@ -0,0 +1,161 @@
+import ctypes
+import threading
+import numpy as np
+from multiprocessing.sharedctypes import RawArray
+
+
+class PositionTable:
+    def __init__(self, num_sources: int, positions: list[list[float]] = None):
+        """
+        A table of source positions held in shared memory, written by the control process and
+        read by the audio process(es) once per audio block, without pickling or system calls.
+
+        Positions are stored as a struct of arrays, with one contiguous array per axis, so that
+        positions[0] is the x coordinate of every source. Consistency is maintained by a
+        sequence lock: the writer increments the table's sequence counter before and after each
+        write, so a reader that sees an odd or changed sequence number simply retries. Readers
+        never block the writer. Each source additionally has its own sequence counter, which
+        readers use to determine which sources have moved since their last read.
+
+        Writes from multiple control threads (OSC, MIDI and animation) are serialised by a lock
+        that is local to the control process.
+
+        Each source also records the time.monotonic() at which its most recent timestamped update
+        was received, so that readers can measure control latency, and the time.time() at which the
+        source should arrive at its new position (its target time), or NaN to arrive immediately.
+
+        Args:
+            num_sources: The number of sources.
+            positions: The initial [x, y, z] position of each source.
+        """
+        self.num_sources = num_sources
+        self._positions_buffer = RawArray(ctypes.c_double, 3 * num_sources)
+        self._sequence_buffer = RawArray(ctypes.c_uint64, 1 + num_sources)
+        self._update_times_buffer = RawArray(ctypes.c_double, num_sources)
+        self._target_times_buffer = RawArray(ctypes.c_double, num_sources)
+        self._write_lock = threading.Lock()
+        self._create_views()
+        self.update_times[:] = np.nan
+        self.target_times[:] = np.nan
+        if positions is not None:
+            self.positions[:] = np.asarray(positions, dtype=float).T
+
+    def _create_views(self):
+        self.positions = np.frombuffer(self._positions_buffer, dtype=np.float64).reshape(3, self.num_sources)
+        sequences = np.frombuffer(self._sequence_buffer, dtype=np.uint64)
+        self._table_sequence = sequences[0:1]
+        self.source_sequences = sequences[1:]
+        self.update_times = np.frombuffer(self._update_times_buffer, dtype=np.float64)
+        self.target_times = np.frombuffer(self._target_times_buffer, dtype=np.float64)
+
+    def __getstate__(self):
+        # Shared buffers are passed to child processes by multiprocessing; the lock and
+        # NumPy views are local to each process.
+        return {"num_sources": self.num_sources,
+                "_positions_buffer": self._positions_buffer,
+                "_sequence_buffer": self._sequence_buffer,
+                "_update_times_buffer": self._update_times_buffer,
+                "_target_times_buffer": self._target_times_buffer}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._write_lock = threading.Lock()
+        self._create_views()
+
+    @property
+    def sequence(self) -> int:
+        """
+        The table's sequence number, which changes every time a position is written.
+        """
+        return int(self._table_sequence[0])
+
+    def write(self, source_index: int, position: list[float], update_time: float = None, target_time: float = np.nan):
+        """
+        Set the position of a single source.
+
+        Args:
+            source_index: The 0-indexed source index.
+            position: The [x, y, z] position, in metres.
+            update_time: The time.monotonic() at which the update was received, if known.
+            target_time: The time.time() at which the source should arrive at the position, or NaN.
+        """
+        with self._write_lock:
+            self._table_sequence[0] += 1
+            self.positions[:, source_index] = position
+            self.target_times[source_index] = target_time
+            if update_time is not None:
+                self.update_times[source_index] = update_time
+            self.source_sequences[source_index] += 1
+            self._table_sequence[0] += 1
+
+    def write_many(self,
+                   source_indices: np.ndarray,
+                   positions: np.ndarray,
+                   update_times: np.ndarray = None,
+                   target_times: np.ndarray = None):
+        """
+        Set the positions of several sources as a single atomic update, so that readers see
+        either all or none of the new positions.
+
+        Args:
+            source_indices: The 0-indexed source indices.
+            positions: The [x, y, z] position of each source, of shape [len(source_indices), 3].
+            update_times: The time.monotonic() at which each update was received, if known.
+            target_times: The time.time() at which each source should arrive at its position. Defaults to NaN.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        if target_times is None:
+            target_times = np.nan
+        with self._write_lock:
+            self._table_sequence[0] += 1
+            self.positions[:, source_indices] = positions.T
+            self.target_times[source_indices] = target_times
+            if update_times is not None:
+                self.update_times[source_indices] = update_times
+            self.source_sequences[source_indices] += 1
+            self._table_sequence[0] += 1
+
+    def read(self) -> tuple[np.ndarray, np.ndarray, int]:
+        """
+        Take a consistent snapshot of the table.
+
+        Returns:
+            A tuple of (positions, source_sequences, sequence), where positions is a copy of
+            shape [num_sources, 3] and source_sequences is a copy of each source's sequence counter.
+        """
+        positions, target_times, source_sequences, sequence = self.read_targets()
+        return positions, source_sequences, sequence
+
+    def read_targets(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        """
+        Take a consistent snapshot of the table, including target times.
+
+        Returns:
+            A tuple of (positions, target_times, source_sequences, sequence).
+        """
+        while True:
+            sequence = int(self._table_sequence[0])
+            if sequence % 2:
+                continue
+            positions = self.positions.T.copy()
+            target_times = self.target_times.copy()
+            source_sequences = self.source_sequences.copy()
+            if int(self._table_sequence[0]) == sequence:
+                return positions, target_times, source_sequences, sequence
+
+    def read_source_target(self, source_index: int) -> tuple[np.ndarray, float, int]:
+        """
+        Take a consistent snapshot of a single source's position and target time.
+
+        Returns:
+            A tuple of (position, target_time, source_sequence).
+        """
+        while True:
+            sequence = int(self._table_sequence[0])
+            if sequence % 2:
+                continue
+            position = self.positions[:, source_index].copy()
+            target_time = float(self.target_times[source_index])
+            source_sequence = int(self.source_sequences[source_index])
+            if int(self._table_sequence[0]) == sequence:
+                return position, target_time, source_sequence
@@ -0,0 +1,102 @@
+import numpy as np
+from .constants import prefilter_length, prefilter_low_frequency, prefilter_high_frequency
+
+#--------------------------------------------------------------------------------
+# WFS pre-equalisation.
+#
+# The 2.5D WFS driving function includes a sqrt(jk) term, a 3dB/octave rise with
+# a 45 degree phase shift, which is common to every speaker. It is therefore
+# applied once per source, before the source is distributed to the speakers, so
+# that its cost is independent of the number of speakers.
+#
+# The correction is band-limited: below prefilter_low_frequency the array is
+# too short for the correction to hold, and above prefilter_high_frequency
+# (typically the spatial aliasing frequency) the array no longer synthesises a
+# wavefront, so the response is flat outside this range. The filter has unity
+# gain at high frequencies.
+#--------------------------------------------------------------------------------
+
+
+def prefilter_response(frequencies: np.ndarray,
+                       low_frequency: float = prefilter_low_frequency,
+                       high_frequency: float = prefilter_high_frequency) -> np.ndarray:
+    """
+    Returns:
+        The complex frequency response of the pre-equalisation filter at the given frequencies, in Hz.
+        This is the square root of a first-order shelf, which is minimum-phase, and approximates
+        sqrt(jf / high_frequency) between the two corner frequencies.
+    """
+    frequencies = np.asarray(frequencies, dtype=float)
+    return np.sqrt((low_frequency + 1j * frequencies) / (high_frequency + 1j * frequencies))
+
+
+def design_prefilter(sample_rate: float,
+                     length: int = prefilter_length,
+                     low_frequency: float = prefilter_low_frequency,
+                     high_frequency: float = prefilter_high_frequency) -> np.ndarray:
+    """
+    Design the pre-equalisation filter as a causal FIR filter, by frequency sampling.
+
+    Args:
+        sample_rate: The sample rate, in Hz.
+        length: The number of taps.
+        low_frequency: The frequency below which the response is flat, in Hz.
+        high_frequency: The frequency above which the response is flat, in Hz.
+
+    Returns:
+        The filter taps, of shape [length].
+    """
+    frequencies = np.fft.rfftfreq(length, 1.0 / sample_rate)
+    taps = np.fft.irfft(prefilter_response(frequencies, low_frequency, high_frequency), length)
+    # Fade out the tail of the impulse response, to suppress time-aliasing from frequency sampling
+    fade_length = length // 4
+    taps[length - fade_length:] *= np.hanning(2 * fade_length)[fade_length:]
+    return taps
+
+
+def prefilter_magnitudes(sample_rate: float,
+                         fft_size: int = prefilter_length,
+                         low_frequency: float = prefilter_low_frequency,
+                         high_frequency: float = prefilter_high_frequency) -> list[float]:
+    """
+    Returns:
+        The magnitude of the pre-equalisation filter at each of the fft_size // 2 + 1 bins of an FFT,
+        for spectral (STFT) filtering.
+    """
+    frequencies = np.fft.rfftfreq(fft_size, 1.0 / sample_rate)
+    return np.abs(prefilter_response(frequencies, low_frequency, high_frequency)).tolist()
+
+
+class OverlapSaveFilter:
+    def __init__(self, num_channels: int, taps: np.ndarray, block_size: int):
+        """
+        Filters a block of multichannel audio with an FIR filter by overlap-save FFT convolution.
+        All channels are transformed together, with one forward and one inverse FFT per block.
+
+        Args:
+            num_channels: The number of channels.
+            taps: The filter taps, of shape [num_taps] to apply the same filter to every channel,
+                  or [num_channels, num_taps].
+            block_size: The number of frames per block.
+        """
+        taps = np.asarray(taps, dtype=float)
+        self.num_channels = num_channels
+        self.block_size = block_size
+        self.fft_size = 1 << int(np.ceil(np.log2(block_size + taps.shape[-1] - 1)))
+        self.overlap = self.fft_size - block_size
+        self.spectrum = np.fft.rfft(taps, self.fft_size, axis=-1)
+        self.buffer = np.zeros((num_channels, self.fft_size), dtype=np.float32)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            block: The next block of input, of shape [num_channels, block_size].
+
+        Returns:
+            The filtered block, of shape [num_channels, block_size].
+        """
+        self.buffer[:, :self.overlap] = self.buffer[:, self.block_size:]
+        self.buffer[:, self.overlap:] = block
+        spectra = np.fft.rfft(self.buffer, axis=1) * self.spectrum
+        # Only the final block_size frames are free of circular wrap-around
+        return np.fft.irfft(spectra, self.fft_size, axis=1)[:, self.overlap:].astype(np.float32)
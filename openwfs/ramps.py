@@ -0,0 +1,120 @@
+import numpy as np
+from .constants import position_interpolation, position_ramp_time
+
+
+class PositionRamps:
+    def __init__(self,
+                 num_sources: int,
+                 positions: np.ndarray = None,
+                 interpolation: str = position_interpolation,
+                 ramp_time: float = position_ramp_time):
+        """
+        Ramps each source from its current position to a target position, arriving at a given time.
+        Used by render processes to move sources smoothly between sparse, timestamped position updates,
+        evaluated once per block or once per sample.
+
+        Each ramp starts from the source's position (and velocity) at the time the target is set, so
+        a new target can be set at any time without a discontinuity.
+
+        Args:
+            num_sources: The number of sources.
+            positions: The initial [x, y, z] position of each source, of shape [num_sources, 3].
+            interpolation: "linear" for a linear ramp, or "spline" for a cubic Hermite ramp, which
+                           arrives at each target with the velocity implied by the previous target, so
+                           that a trajectory sampled by successive targets is followed smoothly.
+            ramp_time: The duration of the ramp to a target without a time (or with a time in the
+                       past), in seconds.
+        """
+        if interpolation not in ("linear", "spline"):
+            raise ValueError("Invalid interpolation: %s" % interpolation)
+        self.num_sources = num_sources
+        self.interpolation = interpolation
+        self.ramp_time = ramp_time
+        if positions is None:
+            positions = np.zeros((num_sources, 3))
+        self.start_positions = np.array(positions, dtype=float).reshape(num_sources, 3)
+        self.end_positions = self.start_positions.copy()
+        self.start_velocities = np.zeros((num_sources, 3))
+        self.end_velocities = np.zeros((num_sources, 3))
+        self.start_times = np.zeros(num_sources)
+        self.end_times = np.zeros(num_sources)
+
+    def set_targets(self, source_indices: np.ndarray, positions: np.ndarray, target_times: np.ndarray, now: float):
+        """
+        Begin ramping the given sources towards new positions.
+
+        Args:
+            source_indices: The 0-indexed source indices.
+            positions: The target [x, y, z] position of each source, of shape [len(source_indices), 3].
+            target_times: The time at which each source should arrive at its target, on the same
+                          clock as `now`. NaN, or a time that is not after `now`, ramps over ramp_time.
+            now: The current time.
+        """
+        source_indices = np.atleast_1d(np.asarray(source_indices, dtype=int))
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        target_times = np.asarray(target_times, dtype=float).reshape(-1)
+        target_times = np.where(np.isfinite(target_times) & (target_times > now), target_times, now + self.ramp_time)
+
+        current_positions, current_velocities = self.evaluate(now, source_indices)
+        if self.interpolation == "spline":
+            # Arrive with the average velocity between the previous target and the new one
+            previous_positions = self.end_positions[source_indices]
+            durations = target_times - self.end_times[source_indices]
+            self.end_velocities[source_indices] = np.divide(positions - previous_positions, durations[:, np.newaxis],
+                                                            out=np.zeros_like(positions),
+                                                            where=durations[:, np.newaxis] > 0)
+        self.start_positions[source_indices] = current_positions
+        self.start_velocities[source_indices] = current_velocities
+        self.start_times[source_indices] = now
+        self.end_positions[source_indices] = positions
+        self.end_times[source_indices] = target_times
+
+    def evaluate(self, times, source_indices: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluate the given sources at one time, or at an array of times.
+
+        Returns:
+            A tuple of (positions, velocities), each of shape [num_sources, 3] for a single time, or
+            [len(times), num_sources, 3] for an array of times. Velocities are in metres per second.
+        """
+        if source_indices is None:
+            source_indices = slice(None)
+        start_times = self.start_times[source_indices]
+        durations = np.maximum(self.end_times[source_indices] - start_times, 1e-9)[:, np.newaxis]
+        times = np.asarray(times, dtype=float)[..., np.newaxis, np.newaxis]
+        t = (times - start_times[:, np.newaxis]) / durations
+        # A source reaching its target at exactly this time still has its arrival velocity
+        ramping = t <= 1.0
+        t = np.clip(t, 0.0, 1.0)
+        p0 = self.start_positions[source_indices]
+        p1 = self.end_positions[source_indices]
+        if self.interpolation == "linear":
+            velocities = np.where(ramping, (p1 - p0) / durations, 0.0)
+            return p0 + (p1 - p0) * t, velocities
+
+        # Cubic Hermite basis, with tangents scaled by the duration of the ramp
+        m0 = self.start_velocities[source_indices] * durations
+        m1 = self.end_velocities[source_indices] * durations
+        t2 = t * t
+        t3 = t2 * t
+        positions = (2 * t3 - 3 * t2 + 1) * p0 + (t3 - 2 * t2 + t) * m0 + (-2 * t3 + 3 * t2) * p1 + (t3 - t2) * m1
+        derivatives = (6 * t2 - 6 * t) * p0 + (3 * t2 - 4 * t + 1) * m0 + (-6 * t2 + 6 * t) * p1 + (3 * t2 - 2 * t) * m1
+        velocities = np.where(ramping, derivatives / durations, 0.0)
+        return positions, velocities
+
+    def positions_at(self, times) -> np.ndarray:
+        """
+        Evaluate the position of every source at one time (block-accurate), or at an array of times
+        (sample-accurate).
+
+        Returns:
+            An array of shape [num_sources, 3] for a single time, or [len(times), num_sources, 3].
+        """
+        return self.evaluate(times)[0]
+
+    def is_ramping(self, time: float) -> np.ndarray:
+        """
+        Returns:
+            A boolean array indicating which sources have not yet reached their target at the given time.
+        """
+        return self.end_times > time
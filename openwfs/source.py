@@ -2,38 +2,256 @@ import random
 import logging
 import numpy as np
 from signalflow import *
-from pythonosc.udp_client import SimpleUDPClient
-from .constants import input_device_name, output_device_name, input_buffer_size, output_buffer_size
-from .constants import crossover_frequency_hpf, crossover_frequency_lpf, lfe_channel_index, num_speakers
-from .constants import disable_audio, disable_lfe, randomise_lfos
-from multiprocessing import Process, Pipe
+from .positions import PositionTable
+from .state import SourceState
+from .stats import RenderStats
+from .ramps import PositionRamps
+from .prefilter import prefilter_magnitudes
+from .backend import DeviceBackend
+from .calibration import Calibration
+from .lfe import create_lfe_bus
+from .constants import output_buffer_size, input_gain, output_clip_level
+from .constants import disable_audio, disable_lfe, randomise_lfos, position_interpolation
+from .constants import enable_prefilter, prefilter_length
+from multiprocessing import Process
 
 
 logger = logging.getLogger(__name__)
 
 
-def create_audio_graph() -> AudioGraph:
-    config = AudioGraphConfig()
-    config.input_device_name = input_device_name
-    config.output_device_name = output_device_name
-    config.input_buffer_size = input_buffer_size
-    config.output_buffer_size = output_buffer_size
-    return AudioGraph(config=config, start=True)
+def create_audio_graph(backend: DeviceBackend = None) -> AudioGraph:
+    """
+    Create an AudioGraph with the given backend (see openwfs.backend). Defaults to the audio devices.
+    """
+    if backend is None:
+        backend = DeviceBackend()
+    return backend.create_graph()
+
+
+def check_prefilter_length():
+    """
+    Check that the live pre-equalisation filter's FFT spans at least two output buffers, which
+    the STFT needs to overlap its windows.
+    """
+    if enable_prefilter and prefilter_length < 2 * output_buffer_size:
+        raise ValueError("prefilter_length (%d) must be at least twice output_buffer_size (%d)" %
+                         (prefilter_length, output_buffer_size))
+
+
+def create_prefilter(input: Node, sample_rate: float) -> Node:
+    """
+    Apply the WFS pre-equalisation filter to a source's input, before it is distributed to the
+    speakers. SignalFlow has no convolution node, so the filter's magnitude response is applied
+    by STFT, hopping once per output buffer, which adds prefilter_length - output_buffer_size
+    samples of latency.
+    """
+    fft = FFT(input, fft_size=prefilter_length, hop_size=output_buffer_size)
+    filtered = FFTScaleMagnitudes(fft, scale=prefilter_magnitudes(sample_rate, prefilter_length))
+    # Overlapping Hann analysis windows sum to fft_size / (2 * hop_size)
+    return IFFT(filtered) * (2 * output_buffer_size / prefilter_length)
+
+
+def apply_calibration(output: Node, calibration: Calibration) -> Node:
+    """
+    Apply each driver's measured delay, gain and polarity corrections to a multichannel output,
+    with one channel per driver.
+    """
+    channels = []
+    # The maximum delay must exceed every delay, which otherwise wraps around to zero
+    max_delay = 2 * max(float(np.max(calibration.delays)), 0.001)
+    for channel_index in range(calibration.num_drivers):
+        channel = output[channel_index]
+        if calibration.delays[channel_index] > 0:
+            channel = OneTapDelay(channel, float(calibration.delays[channel_index]), max_delay)
+        channels.append(channel * float(calibration.gains[channel_index] * calibration.polarities[channel_index]))
+    return ChannelArray(channels)
+
+
+def get_position_smoothing() -> float:
+    """
+    Returns:
+        The coefficient of the one-pole smoothing applied to source coordinates. When positions are
+        ramped by the render process, this only needs to remove the steps between blocks.
+    """
+    return 0.999 if position_interpolation == "smooth" else 0.99
+
+
+def record_control_latency(stats: RenderStats,
+                           process_index: int,
+                           position_table: PositionTable,
+                           source_indices: np.ndarray,
+                           last_update_times: np.ndarray) -> np.ndarray:
+    """
+    Record the control latency of any timestamped updates to the given sources that have been
+    applied since the last call, and return the updated record of applied update times.
+    """
+    update_times = position_table.update_times.copy()
+    source_indices = np.asarray(source_indices, dtype=int)
+    new_updates = source_indices[update_times[source_indices] != last_update_times[source_indices]]
+    stats.record_control_latency(process_index, update_times[new_updates])
+    return update_times
+
+
+class SpatialRenderer:
+    def __init__(self,
+                 position_table: PositionTable,
+                 stats: RenderStats = None,
+                 backend: DeviceBackend = None,
+                 calibration: Calibration = None):
+        """
+        Renders every source within a single audio process. All sources share one AudioGraph,
+        one audio input and one SpatialEnvironment, and each source's SpatialPanner is summed
+        into a single output bus.
+
+        Args:
+            position_table: The shared table of source positions, which is read once per audio block.
+            stats: If specified, the render process records its CPU usage and control latency in
+                   row 0 of this RenderStats.
+            backend: The audio backend (see openwfs.backend). Defaults to the audio devices.
+            calibration: If specified, each speaker's measured corrections are applied to the output bus.
+        """
+        self.position_table = position_table
+        self.num_sources = position_table.num_sources
+        self.stats = stats
+        self.backend = backend if backend is not None else DeviceBackend()
+        self.calibration = calibration
+        self.audio_process = None
+        check_prefilter_length()
+
+    def start(self, speaker_positions: list[list[float]]):
+        logger.info("Starting audio process for %d sources..." % self.num_sources)
+        self.audio_process = Process(target=self.run_render_process,
+                                     args=(self.position_table, speaker_positions, self.stats))
+        self.audio_process.start()
+
+    def join(self):
+        """
+        Wait for the render process to finish. With a non-realtime backend, the render process
+        finishes when the backend's input has been rendered.
+        """
+        if self.audio_process is not None:
+            self.audio_process.join()
+            self.audio_process = None
+
+    def stop(self):
+        if self.audio_process is not None:
+            self.audio_process.terminate()
+            self.audio_process = None
+
+    def run_render_process(self,
+                           position_table: PositionTable,
+                           speaker_positions: list[list[float]],
+                           stats: RenderStats = None):
+        try:
+            backend = self.backend
+            self.graph = create_audio_graph(backend)
+            positions, target_times, last_source_sequences, last_sequence = position_table.read_targets()
+            last_update_times = position_table.update_times.copy()
+            ramps = None
+            if position_interpolation != "smooth":
+                ramps = PositionRamps(len(positions), positions, position_interpolation)
+            smoothing = get_position_smoothing()
+
+            raw_input_channels = backend.create_input(max(len(positions), 8)) * input_gain
+            input_channels = raw_input_channels
+
+            # Create the LFE bus, shared by every source
+            if not disable_lfe:
+                create_lfe_bus(raw_input_channels).play()
+
+            env = SpatialEnvironment()
+            for speaker_index, speaker_position in enumerate(speaker_positions):
+                env.add_speaker(speaker_index, *speaker_position)
+
+            coordinates = []
+            panners = []
+            for source_index, position in enumerate(positions):
+                source_input = input_channels[source_index]
+                if enable_prefilter:
+                    source_input = create_prefilter(source_input, self.graph.sample_rate)
+                x = Smooth(position[0], smoothing)
+                y = Smooth(position[1], smoothing)
+                z = Smooth(position[2], smoothing)
+                panner = SpatialPanner(env=env,
+                                       input=source_input,
+                                       x=x,
+                                       y=y,
+                                       z=z,
+                                       algorithm="beamformer",
+                                       radius=0.5,
+                                       use_delays=True)
+                coordinates.append((x, y, z))
+                panners.append(panner)
+
+            # TODO: Really want a soft limiter
+            bus = Sum(panners)
+            if self.calibration is not None:
+                bus = apply_calibration(bus, self.calibration)
+            limiter = Clip(bus, min=-output_clip_level, max=output_clip_level)
+            limiter.play()
+
+            # Poll the position table once per audio block. With the device backend, this loop is paced by
+            # the system clock rather than by rendered blocks, which SignalFlow does not expose, so ramps
+            # are evaluated once per block duration but are not block-accurate.
+            block_duration = output_buffer_size / self.graph.sample_rate
+            while True:
+                now = backend.time()
+                if position_table.sequence != last_sequence:
+                    positions, target_times, source_sequences, last_sequence = position_table.read_targets()
+                    changed = np.flatnonzero(source_sequences != last_source_sequences)
+                    if ramps is not None:
+                        ramps.set_targets(changed, positions[changed], target_times[changed], now)
+                    else:
+                        for source_index in changed:
+                            x, y, z = coordinates[source_index]
+                            x.input = positions[source_index][0]
+                            y.input = positions[source_index][1]
+                            z.input = positions[source_index][2]
+                    last_source_sequences = source_sequences
+                    if stats is not None:
+                        last_update_times = record_control_latency(stats, 0, position_table, changed, last_update_times)
+                if ramps is not None:
+                    # Advance each moving source to its position at the start of the next block
+                    ramping = np.flatnonzero(ramps.is_ramping(now))
+                    if len(ramping):
+                        ramp_positions = ramps.positions_at(now + block_duration)
+                        for source_index in ramping:
+                            x, y, z = coordinates[source_index]
+                            x.input = ramp_positions[source_index][0]
+                            y.input = ramp_positions[source_index][1]
+                            z.input = ramp_positions[source_index][2]
+                if stats is not None:
+                    stats.record_block(0, self.graph.cpu_usage)
+                if not backend.wait(self.graph, 0):
+                    break
+        except Exception as e:
+            print("Exception in render process: %s" % e)
+        print("Exiting render process")
+
 
 class SpatialSource:
     def __init__(self,
                  index: int,
                  position: list[float],
-                 visualiser: SimpleUDPClient):
+                 position_table: PositionTable = None,
+                 state: SourceState = None):
+        """
+        A sound source. The source's position and LFO parameters are a view onto row `index`
+        of a SourceState, which is shared between all sources so that they can be animated
+        together. If no state is given, the source creates its own.
+        """
         self.index = index
         self.index_1indexed = self.index + 1
         self.panner = None
         self.random_panner = None
-        self.index = index
-        self._position = position
-        self.visualiser = visualiser
+        self.audio_process = None
+        if state is None:
+            state = SourceState(index + 1)
+        self.state = state
+        self.position_table = position_table
 
         # LFO
+        self.base_position = position
         self.xsin_amp = 0
         self.xsin_freq = 0
         self.xphase = 0.0
@@ -46,25 +264,58 @@ class SpatialSource:
             self.ysin_amp = random.uniform(0.1, 0.25)
             self.ysin_freq = random.uniform(0.25, 1.0)
 
-    def start_audio(self, speaker_positions: list[list]):
+    def start_audio(self,
+                    speaker_positions: list[list],
+                    stats: RenderStats = None,
+                    backend: DeviceBackend = None,
+                    calibration: Calibration = None,
+                    enable_lfe: bool = False):
+        """
+        Start this source's audio process.
+
+        Args:
+            speaker_positions: The [x, y, z] position of each speaker.
+            stats: If specified, the audio process records its CPU usage and control latency in
+                   the row of this RenderStats corresponding to the source's index.
+            backend: The audio backend (see openwfs.backend), whose process index is the source's
+                     index. Defaults to the audio devices.
+            calibration: If specified, each speaker's measured corrections are applied to the output.
+            enable_lfe: If True, this source's audio process also renders the LFE bus for every source.
+                        This should be set for one source only.
+        """
+        check_prefilter_length()
         logger.info("Starting audio process %d..." % self.index)
-        self.parent_conn, self.child_conn = Pipe()
-        self.audio_process = Process(target=self.run_panner_process, args=(self.index, self.position, speaker_positions, self.child_conn))
+        self.audio_process = Process(target=self.run_panner_process,
+                                     args=(self.index, speaker_positions, self.position_table, stats, backend,
+                                           calibration, enable_lfe))
         self.audio_process.start()
 
     def stop(self):
-        self.audio_process.terminate()
+        if self.audio_process is not None:
+            self.audio_process.terminate()
+            self.audio_process = None
 
     def run_panner_process(self,
                            source_index: int,
-                           position: list,
                            speaker_positions: list[list[float]],
-                           child_conn):
+                           position_table: PositionTable,
+                           stats: RenderStats = None,
+                           backend: DeviceBackend = None,
+                           calibration: Calibration = None,
+                           enable_lfe: bool = False):
 
         try:
-            self.graph = create_audio_graph()
+            if backend is None:
+                backend = DeviceBackend()
+            self.graph = create_audio_graph(backend)
+            position, target_time, last_source_sequence = position_table.read_source_target(source_index)
+            last_update_times = position_table.update_times.copy()
+            ramps = None
+            if position_interpolation != "smooth":
+                ramps = PositionRamps(1, position, position_interpolation)
+            smoothing = get_position_smoothing()
 
-            raw_input_channels = AudioIn(8) * 0.15
+            raw_input_channels = backend.create_input(8) * input_gain
 
             # Disable HPF for now
             # TODO: Why does BiquadFilter not work here?
@@ -74,28 +325,22 @@ class SpatialSource:
             #                          cutoff=crossover_frequency_hpf)
             input_channels = raw_input_channels
             
-            # Create LFE channel
-            if not disable_lfe:
-                mono_mixdown = ChannelMixer(num_channels=1,
-                                            input=raw_input_channels)
-                lfe_channel = SVFilter(input=mono_mixdown,
-                                       filter_type="low_pass",
-                                       resonance=0.0,
-                                       cutoff=crossover_frequency_lpf) * 40
-                lfe_panner = ChannelPanner(num_channels=num_speakers,
-                                           input=lfe_channel,
-                                           pan=lfe_channel_index)
-                lfe_panner.play()
+            # The LFE bus is shared by every source, so is hosted by a single source's process
+            if enable_lfe:
+                create_lfe_bus(raw_input_channels).play()
 
             env = SpatialEnvironment()
-            for speaker_index, position in enumerate(speaker_positions):
-                env.add_speaker(speaker_index, *position)
+            for speaker_index, speaker_position in enumerate(speaker_positions):
+                env.add_speaker(speaker_index, *speaker_position)
 
-            x = Smooth(position[0], 0.999)
-            y = Smooth(position[1], 0.999)
-            z = Smooth(position[2], 0.999)
+            source_input = input_channels[source_index]
+            if enable_prefilter:
+                source_input = create_prefilter(source_input, self.graph.sample_rate)
+            x = Smooth(position[0], smoothing)
+            y = Smooth(position[1], smoothing)
+            z = Smooth(position[2], smoothing)
             panner = SpatialPanner(env=env,
-                                   input=input_channels[source_index],
+                                   input=source_input,
                                    x=x,
                                    y=y,
                                    z=z,
@@ -103,46 +348,84 @@ class SpatialSource:
                                    radius=0.5,
                                    use_delays=True)
 
+            output = panner
+            if calibration is not None:
+                output = apply_calibration(output, calibration)
+
             # TODO: Really want a soft limiter
-            limiter = Clip(panner, min=-0.25, max=0.25)
+            limiter = Clip(output, min=-output_clip_level, max=output_clip_level)
             limiter.play()
 
+            # Poll the position table once per audio block. With the device backend, this loop is paced by
+            # the system clock rather than by rendered blocks, which SignalFlow does not expose, so ramps
+            # are evaluated once per block duration but are not block-accurate.
+            block_duration = output_buffer_size / self.graph.sample_rate
             while True:
-                position = child_conn.recv()
-                x.input = position[0]
-                y.input = position[1]
-                z.input = position[2]
+                now = backend.time()
+                if position_table.source_sequences[source_index] != last_source_sequence:
+                    position, target_time, last_source_sequence = position_table.read_source_target(source_index)
+                    if ramps is not None:
+                        ramps.set_targets([0], [position], [target_time], now)
+                    else:
+                        x.input = position[0]
+                        y.input = position[1]
+                        z.input = position[2]
+                    if stats is not None:
+                        last_update_times = record_control_latency(stats, source_index, position_table,
+                                                                   [source_index], last_update_times)
+                if ramps is not None and ramps.is_ramping(now)[0]:
+                    position = ramps.positions_at(now + block_duration)[0]
+                    x.input = position[0]
+                    y.input = position[1]
+                    z.input = position[2]
+                if stats is not None:
+                    stats.record_block(source_index, self.graph.cpu_usage)
+                if not backend.wait(self.graph, source_index):
+                    break
         except Exception as e:
             print("Exception in source process: %s" % e)
         print("Exiting source process")
 
     def tick(self, delta_seconds: float):
-        self.xphase += self.xsin_freq * delta_seconds
-        while self.xphase > np.pi * 2:
-            self.xphase -= np.pi * 2
+        """
+        Advance this source's LFOs. To advance every source at once, use SourceState.tick.
+        """
+        phases = self.state.lfo_phases[self.index]
+        phases += self.state.lfo_frequencies[self.index] * delta_seconds
+        np.mod(phases, 1.0, out=phases)
+
+    def _state_property(array_name: str, column: int = None):
+        def getter(self):
+            if column is None:
+                return getattr(self.state, array_name)[self.index]
+            return getattr(self.state, array_name)[self.index, column]
+
+        def setter(self, value):
+            if column is None:
+                getattr(self.state, array_name)[self.index] = value
+            else:
+                getattr(self.state, array_name)[self.index, column] = value
 
-        self.yphase += self.ysin_freq * delta_seconds
-        while self.yphase > np.pi * 2:
-            self.yphase -= np.pi * 2
+        return property(getter, setter)
+
+    base_position = _state_property("base_positions")
+    xsin_amp = _state_property("lfo_amplitudes", 0)
+    ysin_amp = _state_property("lfo_amplitudes", 1)
+    xsin_freq = _state_property("lfo_frequencies", 0)
+    ysin_freq = _state_property("lfo_frequencies", 1)
+    xphase = _state_property("lfo_phases", 0)
+    yphase = _state_property("lfo_phases", 1)
 
     def get_position(self):
-        return [
-            self._position[0] + self.xsin_amp * np.sin(self.xphase * np.pi * 2),
-            self._position[1] + self.ysin_amp * np.cos(self.yphase * np.pi * 2),
-            self._position[2]
-        ]
+        return self.state.get_positions(self.index).tolist()
 
     def set_position(self, position):
-        self._position = position
+        self.base_position = position
 
     position = property(get_position, set_position)
 
-    def update_visualisation(self):
-        logger.debug("[Source %02d] Updating visualiser: %s" % (self.index_1indexed, self.position))
-        self.visualiser.send_message("/source/%d/xyz" % self.index_1indexed, self.position)
-
     def update_panner(self):
         if not disable_audio:
             position = self.position
             logger.debug("[Source %02d] Updating panner: %s" % (self.index_1indexed, position))
-            self.parent_conn.send(position)
+            self.position_table.write(self.index, position)
@@ -1,20 +1,31 @@
-import os
 import time
 import mido
 import random
 import logging
 import threading
 import numpy as np
-import pandas as pd
 from signalflow import *
-from pythonosc import osc_server
-from pythonosc.dispatcher import Dispatcher
 from pythonosc.udp_client import SimpleUDPClient
 from .constants import num_speakers
-from .constants import module_layout, num_sources, num_speakers_per_module
+from .constants import num_sources
 from .constants import environment_radius_x, environment_radius_y, environment_radius_z, source_colours, disable_midi
-from .constants import disable_audio, midi_input_device_name, osc_port
-from .source import SpatialSource, create_audio_graph
+from .constants import disable_audio, midi_input_device_name, osc_port, osc_control_rate, audio_engine, enable_visualiser
+from .constants import animation_rate, render_nodes, audio_backend, disable_lfe
+from .constants import calibration_file, calibration_level, calibration_ir_length
+from .constants import calibration_input_channel, calibration_mic_position
+from .source import SpatialSource, SpatialRenderer, create_audio_graph
+from .positions import PositionTable
+from .state import SourceState
+from .trajectory import TrajectoryEngine, trajectory_commands
+from .stats import Histogram, RenderStats
+from .automation import AutomationRecorder, AutomationPlayer
+from .distributed import RenderCoordinator, parse_address
+from .layout import compile_layout, format_spat_layout
+from .visualiser import VisualiserPublisher
+from .backend import create_backend
+from .audiofile import create_wav
+from .calibration import Calibration, exponential_sweep, get_sweep_start_frames, analyse_recording
+from .osc import SpatialDispatcher, PositionCoalescer, OSCControlServer, parse_source_positions
 from dataclasses import dataclass
 logger = logging.getLogger(__name__)
 
@@ -27,79 +38,112 @@ class SpatialSpeaker:
 class Spatialiser:
     def __init__(self,
                  osc_port: int = osc_port,
-                 show_cpu: bool = False):
+                 show_cpu: bool = False,
+                 audio_engine: str = audio_engine,
+                 enable_visualiser: bool = enable_visualiser,
+                 render_nodes: list[str] = render_nodes,
+                 audio_backend: str = audio_backend):
         """
         Args:
             osc_port: The port to listen for OSC messages on. Default is 9130, which is the port used by the
                        source-viewer node application.
-            show _cpu: If True, show CPU usage in the console.
+            show_cpu: If True, log performance statistics (audio CPU usage, xruns, control latency,
+                      animation jitter and message rates) each time tick() is called.
+            audio_engine: "shared" to render all sources in a single audio process, "per_source" to
+                          spawn one audio process per source, or "distributed" to send source positions
+                          to remote render nodes.
+            enable_visualiser: If True, send speaker and source positions to the 3D visualiser.
+                               Its configuration is sent on a background thread, so does not delay startup.
+            render_nodes: The "host:port" address of each render node, for the distributed audio engine.
+            audio_backend: The audio backend of the render processes: "device", "null", or a backend
+                           object (see openwfs.backend). For the per_source engine, a backend object must
+                           be created with one process per source.
         """
 
-        self.is_running = False
+        if audio_engine not in ("shared", "per_source", "distributed"):
+            raise ValueError("Invalid audio engine: %s" % audio_engine)
 
-        # --------------------------------------------------------------------------------
-        # Visualiser: General setup
-        # --------------------------------------------------------------------------------
-        self.visualiser = SimpleUDPClient("127.0.0.1", 9129)
-        self.visualiser.send_message("/grid/xy/on", [1])
-        time.sleep(0.1)
-        self.visualiser.send_message("/grid/size", [4])
-        self.visualiser.send_message("/grid/section/size", [1])
-        self.visualiser.send_message("/grid/subdiv/num", [10])
-        time.sleep(0.1)
-        self.visualiser.send_message("/source/size", [30.0])
-        self.visualiser.send_message("/source/fade", [0])
+        self.is_running = False
+        self.osc_port = osc_port
+        self.show_cpu = show_cpu
+        self.audio_engine = audio_engine
+        self.render_nodes = render_nodes
+        if isinstance(audio_backend, str):
+            audio_backend = create_backend(audio_backend, 1 if audio_engine == "shared" else num_sources)
+        self.audio_backend = audio_backend
+        self.calibration = None
+        if calibration_file:
+            self.calibration = Calibration.load(calibration_file)
+            logger.info("Loaded driver calibration from %s" % calibration_file)
+        self.renderer = None
+        self.coordinator = None
+        self.osc_coalescer = None
+        self.recorder = None
+        self.playback_thread = None
+        self.is_playing = False
 
         # --------------------------------------------------------------------------------
         # Audio: Add speakers
         # --------------------------------------------------------------------------------
+        self.visualiser = VisualiserPublisher(num_sources) if enable_visualiser else None
         self.speakers: list[SpatialSpeaker] = []
         self.num_speakers = num_speakers
 
-        self.visualiser.send_message("/speaker/number", [num_speakers])
-        time.sleep(0.2)
-        self.visualiser.send_message("/speaker/size", [30.0])
-        time.sleep(0.1)
-
-        speaker_layout_file = os.path.join(os.path.dirname(__file__), "data", "openwfs_driver_layout_v2.csv")
-        speaker_layout = pd.read_csv(speaker_layout_file)
-
-        # flip the Z axis (design is upside down, with tight-spaced speakers on top)
-        speaker_layout.y = -speaker_layout.y
-        mean_speaker_x = (speaker_layout.x.max() + speaker_layout.x.min()) / 2
-        mean_speaker_y = (speaker_layout.y.max() + speaker_layout.y.min()) / 2
-        speaker_layout.x = speaker_layout.x - mean_speaker_x
-        speaker_layout.y = speaker_layout.y - mean_speaker_y
-
-        for module in module_layout:
-            for row_index, speaker in list(speaker_layout.iterrows())[:num_speakers_per_module]:
-                module_speaker_x = module.position[0] + np.cos(module.rotation) * (speaker.x * 0.001)
-                module_speaker_y = module.position[1] + np.sin(module.rotation) * (speaker.x * 0.001)
-                module_speaker_z = module.position[2] + speaker.y * 0.001
-                self.add_speaker([module_speaker_x,
-                                  module_speaker_y,
-                                  module_speaker_z], module.rotation)
+        self.layout = compile_layout()
+        for position, orientation in zip(self.layout.positions.tolist(), self.layout.orientations.tolist()):
+            self.add_speaker(position, orientation)
 
         # --------------------------------------------------------------------------------
         # Audio: Add sources
         # --------------------------------------------------------------------------------
         self.sources: list[SpatialSource] = []
+        self.source_colours: list[list[float]] = []
+        self.source_state = SourceState(num_sources)
+        self.trajectories = TrajectoryEngine(self.source_state.base_positions)
+        self.position_table = PositionTable(num_sources)
         self.add_sources()
 
-        # this has to be called after sources have been created
-        time.sleep(0.1)
-        self.visualiser.send_message("/source/numDisplay", [1])
+        # --------------------------------------------------------------------------------
+        # Telemetry
+        # --------------------------------------------------------------------------------
+        self.render_stats = RenderStats(1 if audio_engine == "shared" else num_sources)
+        self.animation_jitter = Histogram()
+        self.stats_start_time = time.monotonic()
+        # The time and per-source message counts at each stats consumer's previous call
+        self.stats_baselines = {}
+
+        # --------------------------------------------------------------------------------
+        # Visualiser: General setup
+        # --------------------------------------------------------------------------------
+        if self.visualiser:
+            self.visualiser.configure(self.layout.positions, self.source_colours)
+            self.visualiser.set_source_positions(np.arange(num_sources), self.source_state.get_positions())
+            self.visualiser.start()
 
         # start_dust_process()
 
     def run_animation_thread(self):
+        delta = 1.0 / animation_rate
+        next_tick_time = time.monotonic()
         while self.is_running:
-            delta = 0.02
-            for source in self.sources:
-                source.tick(delta)
-                source.update_visualisation()
-                source.update_panner()
-            time.sleep(delta)
+            # Only sources with active LFOs or trajectories move between control updates. Other sources
+            # are left untouched, so that any timestamped ramp in progress is not interrupted.
+            self.source_state.tick(delta)
+            moving_sources = self.trajectories.tick(delta)
+            if self.recorder is not None and len(moving_sources):
+                self.recorder.record(moving_sources, self.source_state.base_positions[moving_sources])
+            animated_sources = np.union1d(self.source_state.get_animated_sources(), moving_sources)
+            if len(animated_sources):
+                self.update_sources(animated_sources)
+            coordinator = self.coordinator
+            if coordinator is not None:
+                coordinator.resend()
+
+            # Schedule ticks against an absolute clock, so that the time taken to update
+            # sources does not accumulate as drift
+            next_tick_time += delta
+            time.sleep(max(0.0, next_tick_time - time.monotonic()))
+            self.animation_jitter.record(max(0.0, time.monotonic() - next_tick_time))
 
     def run_osc_thread(self):
         self.osc_server.serve_forever()
@@ -109,12 +153,22 @@ class Spatialiser:
             return
         self.is_running = True
 
-        # create an OSC server
-        dispatcher = Dispatcher()
+        # create an OSC server, which coalesces position updates and applies them once per control tick
+        self.osc_coalescer = PositionCoalescer(self.set_source_positions)
+        dispatcher = SpatialDispatcher(self.osc_coalescer.push)
         dispatcher.map("/source/*/xyz", self.handle_osc_set_source_position)
+        dispatcher.map("/sources/xyz", self.handle_osc_set_source_position)
+        dispatcher.map("/stats", self.handle_osc_stats, needs_reply_address=True)
+        for command in trajectory_commands:
+            dispatcher.map("/source/*/%s" % command, self.handle_osc_trajectory)
+        dispatcher.map("/sources/stop", lambda address, *args: self.trajectories.stop(slice(None)))
+        if self.visualiser:
+            dispatcher.map("/visualiser/connect", lambda address, *args: self.visualiser.request_snapshot())
         dispatcher.set_default_handler(self.handle_osc)
-        self.osc_server = osc_server.ThreadingOSCUDPServer(("127.0.0.1", osc_port),
-                                                           dispatcher)
+        self.osc_server = OSCControlServer(("127.0.0.1", self.osc_port),
+                                           dispatcher,
+                                           self.osc_coalescer,
+                                           control_interval=1.0 / osc_control_rate)
 
         # Start listening for MIDI events
         if not disable_midi:
@@ -124,8 +178,20 @@ class Spatialiser:
         self.input_channels = None
         if not disable_audio:
             speaker_positions = [speaker.position for speaker in self.speakers]
-            for source in self.sources:
-                source.start_audio(speaker_positions)
+            if self.audio_engine == "shared":
+                self.renderer = SpatialRenderer(self.position_table, self.render_stats, self.audio_backend,
+                                                self.calibration)
+                self.renderer.start(speaker_positions)
+            elif self.audio_engine == "distributed":
+                logger.info("Sending source positions to %d render nodes..." % len(self.render_nodes))
+                self.coordinator = RenderCoordinator([parse_address(address) for address in self.render_nodes],
+                                                     len(self.sources))
+                # Seed the nodes with the initial positions, as static sources are never otherwise sent
+                self.coordinator.send_positions(np.arange(len(self.sources)), self.source_state.get_positions())
+            else:
+                for source in self.sources:
+                    source.start_audio(speaker_positions, self.render_stats, self.audio_backend, self.calibration,
+                                       enable_lfe=not disable_lfe and source.index == 0)
 
         self.thread = threading.Thread(target=self.run_osc_thread)
         self.thread.daemon = True
@@ -137,22 +203,17 @@ class Spatialiser:
 
     def add_speaker(self, position: list, orientation: float):
         index = len(self.speakers)
-        logger.info("Added speaker %d at position: %s" % (index, np.round(position, 3)))
-        self.visualiser.send_message("/speaker/%d/xyz" % (index + 1), position)
+        logger.debug("Added speaker %d at position: %s" % (index, np.round(position, 3)))
         speaker = SpatialSpeaker(position, orientation)
         self.speakers.append(speaker)
 
     def add_source(self, index: int, position: list, color: list):
         logger.info("Added source at position: %s" % np.round(position, 3))
-        index_1indexed = index + 1
-
-        self.visualiser.send_message("/source/number", [index_1indexed])
-        time.sleep(0.1)
-        self.visualiser.send_message("/source/%d/color" % index_1indexed, color)
-
-        source = SpatialSource(index, position, self.visualiser)
+        source = SpatialSource(index, position, self.position_table, self.source_state)
+        self.position_table.write(index, source.position)
 
         self.sources.append(source)
+        self.source_colours.append(color)
 
     def start_dust_process(self):
         num_dust_channels = 50
@@ -173,11 +234,81 @@ class Spatialiser:
     def stop(self):
         if not self.is_running:
             return
+        self.stop_playback()
+        self.stop_recording()
         for source in self.sources:
             source.stop()
+        if self.renderer is not None:
+            self.renderer.stop()
+        if self.coordinator is not None:
+            self.coordinator.close()
+            self.coordinator = None
         self.osc_server.shutdown()
+        if self.visualiser:
+            self.visualiser.stop()
         self.is_running = False
 
+    def start_recording(self, path: str):
+        """
+        Record every source position update received via OSC, MIDI or automation playback to a
+        binary automation file, which can be replayed with play_automation() or rendered offline.
+        If the file exists, the recording is appended to it.
+
+        Args:
+            path: The path of the recording.
+        """
+        self.stop_recording()
+        logger.info("Recording source positions to %s" % path)
+        recorder = AutomationRecorder(path, len(self.sources))
+        # Begin with a snapshot of every source, so that playback starts from the same positions
+        recorder.record(np.arange(len(self.sources)), self.source_state.base_positions)
+        self.recorder = recorder
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def play_automation(self, path: str, loop: bool = False):
+        """
+        Replay a binary automation recording on a background thread, applying positions at the
+        OSC control rate.
+
+        Args:
+            path: The path of the recording.
+            loop: If True, restart playback from the beginning at the end of the recording.
+        """
+        self.stop_playback()
+        player = AutomationPlayer(path, len(self.sources))
+        logger.info("Playing automation from %s (%.1fs)" % (path, player.duration))
+        self.is_playing = True
+        self.playback_thread = threading.Thread(target=self.run_playback_thread, args=(player, loop))
+        self.playback_thread.daemon = True
+        self.playback_thread.start()
+
+    def stop_playback(self):
+        self.is_playing = False
+        if self.playback_thread is not None:
+            self.playback_thread.join()
+            self.playback_thread = None
+
+    def run_playback_thread(self, player: AutomationPlayer, loop: bool):
+        delta = 1.0 / osc_control_rate
+        all_sources = np.arange(len(self.sources))
+        start_time = time.monotonic()
+        next_tick_time = start_time
+        while self.is_playing:
+            playback_time = time.monotonic() - start_time
+            if playback_time > player.duration:
+                if not loop:
+                    break
+                start_time += max(player.duration, delta)
+                playback_time = time.monotonic() - start_time
+            self.set_source_positions(all_sources, player.positions_at(playback_time))
+            next_tick_time += delta
+            time.sleep(max(0.0, next_tick_time - time.monotonic()))
+        self.is_playing = False
+
     def scale_normalised_x_to_position(self, value: float):
         """
         Scale a normalised [0..1] value to an X position in the environment.
@@ -237,15 +368,18 @@ class Spatialiser:
 
             source = self.sources[source_index]
             if control_index in [0, 1, 2]:
-                # TODO - rewrite this to not access private _position field
-                position = source._position
+                # As with OSC positions, setting a position stops the source's trajectory
+                self.trajectories.stop([source_index])
+                position = source.base_position
                 if control_index == 0:
                     position[0] = self.scale_normalised_x_to_position(value)
                 elif control_index == 1:
                     position[1] = self.scale_normalised_y_to_position(value)
                 elif control_index == 2:
                     position[2] = self.scale_normalised_z_to_position(value)
-                source._position = position
+                source.base_position = position
+                if self.recorder is not None:
+                    self.recorder.record([source_index], [position])
             elif control_index == 3:
                 source.xsin_amp = value
             elif control_index == 4:
@@ -255,18 +389,129 @@ class Spatialiser:
             elif control_index == 6:
                 source.ysin_freq = scale_lin_exp(value, 0, 1, 0.01, 10.0)
 
-            source.update_visualisation()
-            source.update_panner()
+            self.update_sources([source_index])
+
+    def set_source_positions(self,
+                             source_indices: np.ndarray,
+                             positions: np.ndarray,
+                             receive_times: np.ndarray = None,
+                             target_times: np.ndarray = None):
+        """
+        Set the positions of several sources, applied to the panner as a single atomic update.
+
+        Args:
+            source_indices: The 0-indexed source indices.
+            positions: The [x, y, z] position of each source, of shape [len(source_indices), 3].
+            receive_times: The time.monotonic() at which each update was received, used to measure
+                           control latency.
+            target_times: The time.time() at which each source should arrive at its new position,
+                          or NaN to arrive as soon as possible (see position_interpolation).
+        """
+        valid = (source_indices >= 0) & (source_indices < len(self.sources))
+        if not np.all(valid):
+            logger.warning("Ignoring positions for invalid source indices: %s" % (source_indices[~valid] + 1))
+            source_indices, positions = source_indices[valid], positions[valid]
+            if receive_times is not None:
+                receive_times = receive_times[valid]
+            if target_times is not None:
+                target_times = target_times[valid]
+        self.trajectories.stop(source_indices)
+        self.source_state.base_positions[source_indices] = positions
+        if self.recorder is not None:
+            self.recorder.record(source_indices, positions, receive_times)
+        self.update_sources(source_indices, receive_times, target_times)
+
+    def update_sources(self,
+                       source_indices: np.ndarray,
+                       receive_times: np.ndarray = None,
+                       target_times: np.ndarray = None):
+        """
+        Push the current positions of the given sources to the panner, in a single atomic
+        update, and to the visualiser.
+        """
+        source_indices = np.asarray(source_indices)
+        positions = self.source_state.get_positions(source_indices)
+        if not disable_audio:
+            self.position_table.write_many(source_indices, positions, receive_times, target_times)
+            if self.coordinator is not None:
+                self.coordinator.send_positions(source_indices, positions, target_times)
+        if self.visualiser:
+            self.visualiser.set_source_positions(source_indices, positions)
 
     def handle_osc_set_source_position(self, address, *args):
-        # address format: /source/*/xyz
-        address_parts = address.split("/")
-        source_index = int(address_parts[2]) - 1
-        x, y, z = args
-        logger.debug("Set source %d position: %s %s %s" % (source_index, x, y, z))
-        self.sources[source_index].position = [x, y, z]
-        self.sources[source_index].update_panner()
-        self.sources[source_index].update_visualisation()
+        # address format: /source/*/xyz or /sources/xyz
+        try:
+            source_indices, positions = parse_source_positions(address, args)
+        except ValueError as e:
+            logger.warning("Invalid position message: %s" % e)
+            return
+        logger.debug("Set source positions: %s %s" % (source_indices + 1, positions.tolist()))
+        self.osc_coalescer.push(source_indices, positions)
+
+    def handle_osc_trajectory(self, address, *args):
+        # address format: /source/*/<trajectory>
+        _, _, source_id, command = address.split("/")
+        try:
+            source_index = int(source_id) - 1
+            # Apply any position sent before this command now, rather than on the next control tick,
+            # so that the trajectory starts from it and is not then stopped by it
+            self.osc_coalescer.flush([source_index])
+            self.trajectories.command(source_index, command, list(args))
+        except ValueError as e:
+            logger.warning("Invalid trajectory message %s: %s" % (address, e))
+            return
+        logger.debug("Set source %s trajectory: %s %s" % (source_id, command, list(args)))
+
+    def handle_osc_stats(self, client_address: tuple[str, int], address: str, *args):
+        """
+        Reply to a /stats query with the current performance statistics. The reply is sent to the
+        address and port that the query was sent from, or to the port given as the first argument.
+        Latency and jitter values are in milliseconds.
+        """
+        host, port = client_address
+        if args:
+            port = int(args[0])
+        stats = self.get_stats("osc:%s:%d" % (host, port))
+        client = SimpleUDPClient(host, port)
+        client.send_message("/stats/cpu", stats["cpu_usage"])
+        client.send_message("/stats/cpu/peak", stats["peak_cpu_usage"])
+        client.send_message("/stats/xruns", stats["xruns"])
+        for name in ("control_latency", "animation_jitter"):
+            summary = stats[name]
+            client.send_message("/stats/%s" % name, [summary["count"]] + [1000 * summary[key] for key in ("mean", "median", "p99", "max")])
+        client.send_message("/stats/osc", [stats["osc"]["received"], stats["osc"]["applied"], stats["osc"]["dropped"]])
+        client.send_message("/stats/rates", stats["source_message_rates"])
+
+    def get_stats(self, consumer: str = "default") -> dict:
+        """
+        Gather the current performance statistics. Per-source message rates are measured over
+        the time since the previous call by the same consumer, so that consumers polling at
+        different rates (such as tick() and each /stats client) do not reset each other's window.
+
+        Args:
+            consumer: The name of the consumer.
+
+        Returns:
+            A dict of statistics. Latency and jitter values are in seconds.
+        """
+        now = time.monotonic()
+        source_message_counts = np.zeros(len(self.sources))
+        osc_stats = {"received": 0, "applied": 0, "dropped": 0}
+        if self.osc_coalescer is not None:
+            osc_stats = self.osc_coalescer.stats
+            for source_index, count in list(self.osc_coalescer.source_message_counts.items()):
+                if 0 <= source_index < len(self.sources):
+                    source_message_counts[source_index] = count
+        last_time, last_counts = self.stats_baselines.get(consumer, (self.stats_start_time, np.zeros(len(self.sources))))
+        interval = max(now - last_time, 1e-3)
+        source_message_rates = (source_message_counts - last_counts) / interval
+        self.stats_baselines[consumer] = (now, source_message_counts)
+
+        stats = self.render_stats.summary()
+        stats["animation_jitter"] = self.animation_jitter.summary()
+        stats["osc"] = osc_stats
+        stats["source_message_rates"] = source_message_rates.tolist()
+        return stats
 
     def handle_osc(self, address, *args):
         logger.warning("OSC address not handled: %s (%s)" % (address, args))
@@ -288,33 +533,82 @@ class Spatialiser:
         panner.play()
         graph.wait()
 
-    def dump_spat_layout(self, speaker_mask: np.ndarray = None):
-        if speaker_mask is not None:
-            if len(speaker_mask) != self.num_speakers:
-                raise ValueError("speaker_mask must be a binary array with the same length as the number of speakers")
-        else:
-            speaker_mask = np.ones(self.num_speakers)
-        output = "/speakers/xyz "
-        for index, speaker in enumerate(self.speakers):
-            if speaker_mask[index]:
-                output = output + "%.3f %.3f %.3f " % (speaker.position[0], speaker.position[1], speaker.position[2])
-        output = output.strip() + "\n"
-        # output = output + "/speaker/*/direction/xy %.3f %.3f" % (direction_x, direction_y)
-        # output = output + "/speakers/direction"
-        for index, speaker in enumerate(self.speakers):
-            direction_y = -np.cos(speaker.orientation)
-            direction_x = np.sin(speaker.orientation)
-            output = output + "/speaker/%d/direction/xy %.3f %.3f\n" % (index + 1, direction_x, direction_y)
-            # output = output + " %.3f %.3f" % (direction_x, direction_y)
-        return output
+    def run_calibration(self, output_path: str, recording_path: str = None) -> Calibration:
+        """
+        Measure every driver with overlapping exponential sweeps, recorded by a measurement
+        microphone on calibration_input_channel at calibration_mic_position, and save the resulting
+        per-driver corrections.
+
+        Each driver's sweep is the previous driver's sweep, delayed by calibration_sweep_offset, so
+        the excitation needs only one short delay line per driver. The audio interface's round-trip
+        latency plus the propagation delay to the microphone must be shorter than calibration_ir_length.
+
+        Args:
+            output_path: The path to save the calibration to (see Calibration.load).
+            recording_path: If specified, the microphone recording is also saved to this WAV file,
+                            so that it can be analysed again offline.
+
+        Returns:
+            The calibration.
+        """
+        backend = self.audio_backend
+        graph = create_audio_graph(backend)
+        sample_rate = graph.sample_rate
+        sweep = exponential_sweep(sample_rate) * calibration_level
+        start_frames = get_sweep_start_frames(self.num_speakers, sample_rate)
+        num_frames = int(start_frames[-1] + len(sweep) + calibration_ir_length * sample_rate)
+        logger.info("Calibrating %d drivers (%.1fs)..." % (self.num_speakers, num_frames / sample_rate))
+
+        offset = start_frames[1] / sample_rate if self.num_speakers > 1 else 0.0
+        channels = [BufferPlayer(Buffer(sweep.reshape(1, -1).astype(np.float32)))]
+        for driver_index in range(1, self.num_speakers):
+            channels.append(OneTapDelay(channels[-1], offset, 2 * offset))
+        excitation = ChannelArray(channels)
+        microphone = backend.create_input(calibration_input_channel + 1)[calibration_input_channel]
+        recording = Buffer(1, num_frames)
+        recorder = BufferRecorder(recording, microphone)
+        graph.add_node(recorder)
+        excitation.play()
+
+        start_time = backend.time()
+        while backend.time() - start_time < num_frames / sample_rate:
+            if not backend.wait(graph):
+                break
+        excitation.stop()
+        graph.remove_node(recorder)
+
+        samples = np.array(recording.data[0])
+        if recording_path:
+            output = create_wav(recording_path, 1, len(samples), int(sample_rate))
+            output[:, 0] = samples
+            output.flush()
+        calibration = analyse_recording(samples,
+                                        sample_rate,
+                                        self.num_speakers,
+                                        self.layout.positions,
+                                        calibration_mic_position)
+        calibration.save(output_path)
+        logger.info("Saved calibration to %s" % output_path)
+        return calibration
+
+    def dump_spat_layout(self, speaker_mask: np.ndarray = None) -> str:
+        return format_spat_layout(self.layout, speaker_mask)
 
     def tick(self):
-        pass
-        # if self.input_channels:
-        #     input_buffer = self.input_channels.output_buffer[0]
-        #     input_buffer_rms = np.sqrt(np.mean(np.square(input_buffer)))
-        #     if input_buffer_rms == 0:
-        #         logger.info("Input RMS: 0")
-        #     else:
-        #         input_buffer_rms_db = 20.0 * np.log10(input_buffer_rms)
-        #         logger.info("Input RMS: %.2fdB" % input_buffer_rms_db)
+        """
+        Called periodically from the main thread. If show_cpu is set, logs a line of performance statistics.
+        """
+        if not self.show_cpu:
+            return
+        stats = self.get_stats("tick")
+        latency = stats["control_latency"]
+        jitter = stats["animation_jitter"]
+        logger.info("CPU %s (peak %s), xruns %s, control latency %.1f/%.1f/%.1fms (median/p99/max), "
+                    "jitter %.1f/%.1fms (p99/max), OSC msg/s per source: %s, %d dropped" %
+                    (" ".join("%.0f%%" % (100 * cpu) for cpu in stats["cpu_usage"]),
+                     " ".join("%.0f%%" % (100 * cpu) for cpu in stats["peak_cpu_usage"]),
+                     sum(stats["xruns"]),
+                     1000 * latency["median"], 1000 * latency["p99"], 1000 * latency["max"],
+                     1000 * jitter["p99"], 1000 * jitter["max"],
+                     " ".join("%.0f" % rate for rate in stats["source_message_rates"]),
+                     stats["osc"]["dropped"]))
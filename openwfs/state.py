@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class SourceState:
+    def __init__(self, num_sources: int):
+        """
+        The position and LFO state of every source, held as a struct of arrays so that all
+        sources can be animated in a single vectorised step.
+
+        Each source's position is its base position plus a sinusoidal LFO on the X axis and a
+        cosinusoidal LFO on the Y axis. LFO phases are measured in cycles, in the range [0, 1).
+
+        Args:
+            num_sources: The number of sources.
+        """
+        self.num_sources = num_sources
+        self.base_positions = np.zeros((num_sources, 3))
+        self.lfo_amplitudes = np.zeros((num_sources, 2))
+        self.lfo_frequencies = np.zeros((num_sources, 2))
+        self.lfo_phases = np.zeros((num_sources, 2))
+
+    def tick(self, delta_seconds: float):
+        """
+        Advance the LFOs of every source.
+
+        Args:
+            delta_seconds: The time elapsed since the last tick.
+        """
+        self.lfo_phases += self.lfo_frequencies * delta_seconds
+        np.mod(self.lfo_phases, 1.0, out=self.lfo_phases)
+
+    def get_animated_sources(self) -> np.ndarray:
+        """
+        Returns:
+            The indices of the sources with at least one active LFO.
+        """
+        return np.flatnonzero(np.any((self.lfo_amplitudes != 0) & (self.lfo_frequencies != 0), axis=1))
+
+    def get_positions(self, source_indices: np.ndarray = None) -> np.ndarray:
+        """
+        Args:
+            source_indices: The sources to return. Defaults to all sources.
+
+        Returns:
+            The current position of each source, including LFO offsets, of shape [num_sources, 3].
+        """
+        if source_indices is None:
+            source_indices = slice(None)
+        positions = self.base_positions[source_indices].copy()
+        amplitudes = self.lfo_amplitudes[source_indices]
+        angles = self.lfo_phases[source_indices] * np.pi * 2
+        positions[..., 0] += amplitudes[..., 0] * np.sin(angles[..., 0])
+        positions[..., 1] += amplitudes[..., 1] * np.cos(angles[..., 1])
+        return positions
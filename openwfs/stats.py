@@ -0,0 +1,177 @@
+import time
+import ctypes
+import numpy as np
+from multiprocessing.sharedctypes import RawArray
+
+#--------------------------------------------------------------------------------
+# Runtime performance telemetry.
+#
+# Statistics that are written by audio processes are held in shared memory, with
+# one row per writing process, so that they can be read by the control process
+# without locks or pipes. Each row has exactly one writer.
+#--------------------------------------------------------------------------------
+
+#--------------------------------------------------------------------------------
+# Histogram bucket edges for latency and jitter measurements, in seconds:
+# logarithmically spaced from 0.1ms to 1s.
+#--------------------------------------------------------------------------------
+latency_bucket_edges = np.logspace(-4, 0, 41)
+
+
+class Histogram:
+    def __init__(self, bucket_edges: np.ndarray = latency_bucket_edges, num_rows: int = 1):
+        """
+        A histogram with fixed bucket edges, held in shared memory. Each row is written by a single
+        process (for example, one row per render process), and the summary statistics combine all rows.
+
+        Values below the first edge are counted in the first bucket, and values above the last edge
+        in an overflow bucket.
+
+        Args:
+            bucket_edges: The upper edge of each bucket, in ascending order.
+            num_rows: The number of independent writers.
+        """
+        self.bucket_edges = np.asarray(bucket_edges, dtype=float)
+        self.num_rows = num_rows
+        self._buffer = RawArray(ctypes.c_double, num_rows * (len(self.bucket_edges) + 3))
+        self._create_views()
+
+    def _create_views(self):
+        data = np.frombuffer(self._buffer, dtype=np.float64).reshape(self.num_rows, len(self.bucket_edges) + 3)
+        self.counts = data[:, :-2]
+        self.sums = data[:, -2]
+        self.maxima = data[:, -1]
+
+    def __getstate__(self):
+        return {"bucket_edges": self.bucket_edges,
+                "num_rows": self.num_rows,
+                "_buffer": self._buffer}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_views()
+
+    def record(self, values, row: int = 0):
+        """
+        Add one or more values to the histogram.
+
+        Args:
+            values: A value or array of values.
+            row: The row to write to.
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        if not len(values):
+            return
+        np.add.at(self.counts[row], np.searchsorted(self.bucket_edges, values), 1)
+        self.sums[row] += np.sum(values)
+        self.maxima[row] = max(self.maxima[row], np.max(values))
+
+    def reset(self):
+        self.counts[:] = 0
+        self.sums[:] = 0
+        self.maxima[:] = 0
+
+    @property
+    def count(self) -> int:
+        return int(np.sum(self.counts))
+
+    @property
+    def mean(self) -> float:
+        count = self.count
+        return float(np.sum(self.sums) / count) if count else 0.0
+
+    @property
+    def max(self) -> float:
+        return float(np.max(self.maxima))
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Estimate a percentile from the bucket counts, as the upper edge of the bucket that contains it.
+
+        Args:
+            percentile: The percentile, from 0 to 100.
+        """
+        counts = np.sum(self.counts, axis=0)
+        total = np.sum(counts)
+        if not total:
+            return 0.0
+        bucket = int(np.searchsorted(np.cumsum(counts), total * percentile / 100.0))
+        if bucket >= len(self.bucket_edges):
+            return self.max
+        return min(float(self.bucket_edges[bucket]), self.max)
+
+    def summary(self) -> dict:
+        return {"count": self.count,
+                "mean": self.mean,
+                "median": self.percentile(50),
+                "p99": self.percentile(99),
+                "max": self.max}
+
+
+class RenderStats:
+    def __init__(self, num_processes: int):
+        """
+        Audio statistics for each render process, held in shared memory:
+
+          - cpu_usage: the audio graph's most recent CPU usage, as a fraction of the audio block duration
+          - peak_cpu_usage: the highest CPU usage since the process started
+          - xruns: the estimated number of buffer underruns. The audio backend does not report
+                   underruns, so this counts the polled blocks in which CPU usage reached 100%.
+          - blocks: the number of blocks polled
+          - control_latency: a histogram of the time from a position update being received by
+                             the control process to being applied to the panner, in seconds
+
+        Args:
+            num_processes: The number of render processes.
+        """
+        self.num_processes = num_processes
+        self._buffer = RawArray(ctypes.c_double, num_processes * 4)
+        self.control_latency = Histogram(latency_bucket_edges, num_processes)
+        self._create_views()
+
+    def _create_views(self):
+        data = np.frombuffer(self._buffer, dtype=np.float64).reshape(self.num_processes, 4)
+        self.cpu_usage = data[:, 0]
+        self.peak_cpu_usage = data[:, 1]
+        self.xruns = data[:, 2]
+        self.blocks = data[:, 3]
+
+    def __getstate__(self):
+        return {"num_processes": self.num_processes,
+                "_buffer": self._buffer,
+                "control_latency": self.control_latency}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._create_views()
+
+    def record_block(self, process_index: int, cpu_usage: float):
+        """
+        Record the audio graph's CPU usage for one polled block. Called from the render process.
+        """
+        self.cpu_usage[process_index] = cpu_usage
+        self.peak_cpu_usage[process_index] = max(self.peak_cpu_usage[process_index], cpu_usage)
+        self.blocks[process_index] += 1
+        if cpu_usage >= 1.0:
+            self.xruns[process_index] += 1
+
+    def record_control_latency(self, process_index: int, update_times: np.ndarray):
+        """
+        Record the control latency of position updates that have just been applied.
+
+        Args:
+            process_index: The render process.
+            update_times: The time.monotonic() at which each update was received. Updates that
+                          were not timestamped (NaN) are ignored.
+        """
+        update_times = np.asarray(update_times, dtype=float)
+        update_times = update_times[np.isfinite(update_times)]
+        if len(update_times):
+            self.control_latency.record(time.monotonic() - update_times, process_index)
+
+    def summary(self) -> dict:
+        return {"cpu_usage": self.cpu_usage.tolist(),
+                "peak_cpu_usage": self.peak_cpu_usage.tolist(),
+                "xruns": self.xruns.astype(int).tolist(),
+                "blocks": self.blocks.astype(int).tolist(),
+                "control_latency": self.control_latency.summary()}
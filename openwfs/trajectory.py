@@ -0,0 +1,349 @@
+import logging
+import threading
+import numpy as np
+from .constants import environment_radius_x, environment_radius_y, environment_radius_z
+from .constants import max_trajectory_points, wander_smoothing_time
+
+logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# Server-side trajectories.
+#
+# A client sends one command to set a source moving along a trajectory, which
+# the spatialiser then evaluates on every animation tick, rather than streaming
+# a position per tick over the network. Trajectories are held as a struct of
+# arrays, like SourceState, and every source of each kind is evaluated in a
+# single vectorised step.
+#
+# Trajectories with a duration (lines, Bezier curves and splines) start from
+# the source's position when the command is received, and either stop at their
+# end point, loop, or ping-pong back and forth.
+#--------------------------------------------------------------------------------
+
+NONE, CIRCLE, LINE, BEZIER, SPLINE, WALK, WANDER = range(7)
+trajectory_commands = ["circle", "line", "bezier", "spline", "walk", "wander", "stop"]
+ONCE, LOOP, PINGPONG = range(3)
+trajectory_modes = {"once": ONCE, "loop": LOOP, "pingpong": PINGPONG}
+
+
+def parse_mode(mode) -> int:
+    """
+    Parse a trajectory's end mode, given as a name ("once", "loop" or "pingpong") or its index.
+    """
+    if isinstance(mode, str):
+        if mode not in trajectory_modes:
+            raise ValueError("Invalid trajectory mode: %s" % mode)
+        return trajectory_modes[mode]
+    if int(mode) not in trajectory_modes.values():
+        raise ValueError("Invalid trajectory mode: %s" % mode)
+    return int(mode)
+
+
+def get_progress(times: np.ndarray, modes: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        times: The time elapsed along each trajectory, as a proportion of its duration.
+        modes: The end mode of each trajectory.
+
+    Returns:
+        The position along each trajectory, from 0 to 1.
+    """
+    return np.select([modes == LOOP, modes == PINGPONG],
+                     [np.mod(times, 1.0), 1.0 - np.abs(np.mod(times, 2.0) - 1.0)],
+                     np.clip(times, 0.0, 1.0))
+
+
+def evaluate_bezier(points: np.ndarray, progress: np.ndarray) -> np.ndarray:
+    """
+    Evaluate cubic Bezier curves.
+
+    Args:
+        points: The four control points of each curve, of shape [num_curves, 4, 3].
+        progress: The position along each curve, from 0 to 1, of shape [num_curves].
+
+    Returns:
+        An array of shape [num_curves, 3].
+    """
+    t = progress[:, np.newaxis]
+    u = 1.0 - t
+    return (u ** 3 * points[:, 0] + 3 * u ** 2 * t * points[:, 1] +
+            3 * u * t ** 2 * points[:, 2] + t ** 3 * points[:, 3])
+
+
+def evaluate_catmull_rom(points: np.ndarray, num_points: np.ndarray, progress: np.ndarray) -> np.ndarray:
+    """
+    Evaluate uniform Catmull-Rom splines, which pass through each of their points in turn.
+    The first and last points are repeated, so that each spline starts and ends at rest.
+
+    Args:
+        points: The points of each spline, of shape [num_splines, max_points, 3].
+        num_points: The number of points of each spline, at least 2, of shape [num_splines].
+        progress: The position along each spline, from 0 to 1, of shape [num_splines].
+
+    Returns:
+        An array of shape [num_splines, 3].
+    """
+    num_segments = num_points - 1
+    position = progress * num_segments
+    segments = np.minimum(np.floor(position).astype(int), num_segments - 1)
+    t = (position - segments)[:, np.newaxis]
+    indices = np.clip(segments[:, np.newaxis] + np.arange(-1, 3), 0, (num_points - 1)[:, np.newaxis])
+    p0, p1, p2, p3 = np.moveaxis(np.take_along_axis(points, indices[:, :, np.newaxis], axis=1), 1, 0)
+    return 0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t ** 2 +
+                  (3 * p1 - p0 - 3 * p2 + p3) * t ** 3)
+
+
+class TrajectoryEngine:
+    def __init__(self,
+                 positions: np.ndarray,
+                 bounds: np.ndarray = None,
+                 seed: int = None):
+        """
+        Moves sources along trajectories, evaluated server-side on every animation tick.
+
+        Args:
+            positions: The base position of every source, of shape [num_sources, 3], such as
+                       SourceState.base_positions. Trajectories start from, and update, this array in place.
+            bounds: The [min, max] extent along each axis, of shape [3, 2], within which random walks
+                    and wandering sources are kept. Defaults to the environment size.
+            seed: The seed of the random number generator used by random walks and wandering.
+        """
+        if bounds is None:
+            bounds = [[-environment_radius_x, environment_radius_x],
+                      [-environment_radius_y, environment_radius_y],
+                      [-environment_radius_z, environment_radius_z]]
+        self.positions = positions
+        self.num_sources = len(positions)
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.time = 0.0
+
+        self.kinds = np.full(self.num_sources, NONE)
+        self.modes = np.full(self.num_sources, ONCE)
+        self.start_times = np.zeros(self.num_sources)
+        self.durations = np.ones(self.num_sources)
+        self.points = np.zeros((self.num_sources, max_trajectory_points, 3))
+        self.num_points = np.zeros(self.num_sources, dtype=int)
+        self.radii = np.zeros(self.num_sources)
+        self.frequencies = np.zeros(self.num_sources)
+        self.speeds = np.zeros(self.num_sources)
+        self.velocities = np.zeros((self.num_sources, 3))
+
+    def get_moving_sources(self) -> np.ndarray:
+        """
+        Returns:
+            The indices of the sources with an active trajectory.
+        """
+        return np.flatnonzero(self.kinds != NONE)
+
+    def stop(self, source_indices: np.ndarray):
+        """
+        Stop the trajectories of the given sources, leaving each source at its current position.
+        """
+        with self.lock:
+            self.kinds[source_indices] = NONE
+
+    def _start(self, source_index: int, kind: int, points: np.ndarray = (), duration: float = 1.0, mode: int = ONCE):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if len(points) > max_trajectory_points:
+            raise ValueError("Trajectories can have at most %d points" % max_trajectory_points)
+        if duration <= 0:
+            raise ValueError("Trajectory duration must be positive")
+        self.kinds[source_index] = kind
+        self.modes[source_index] = mode
+        self.start_times[source_index] = self.time
+        self.durations[source_index] = duration
+        self.points[source_index, :len(points)] = points
+        self.num_points[source_index] = len(points)
+
+    def set_circle(self, source_index: int, centre: list[float], radius: float, frequency: float):
+        """
+        Move a source around a horizontal circle, starting from the point of the circle nearest to it.
+
+        Args:
+            source_index: The 0-indexed source index.
+            centre: The [x, y, z] centre of the circle.
+            radius: The radius of the circle, in metres.
+            frequency: The number of revolutions per second. Negative frequencies move anticlockwise.
+        """
+        with self.lock:
+            offset = self.positions[source_index, :2] - np.asarray(centre[:2], dtype=float)
+            # Angles follow the LFOs: x = sin(angle), y = cos(angle)
+            start_angle = np.arctan2(offset[0], offset[1])
+            self._start(source_index, CIRCLE, [centre])
+            self.radii[source_index] = radius
+            self.frequencies[source_index] = frequency
+            self.start_times[source_index] = self.time - start_angle / (2 * np.pi * frequency) if frequency else self.time
+
+    def set_line(self, source_index: int, end: list[float], duration: float, mode: int = ONCE):
+        """
+        Move a source in a straight line from its current position to `end`, over `duration` seconds.
+        """
+        with self.lock:
+            self._start(source_index, LINE, [self.positions[source_index], end], duration, mode)
+
+    def set_bezier(self,
+                   source_index: int,
+                   control_points: list[list[float]],
+                   end: list[float],
+                   duration: float,
+                   mode: int = ONCE):
+        """
+        Move a source along a cubic Bezier curve from its current position to `end`, shaped by two
+        control points, over `duration` seconds.
+        """
+        with self.lock:
+            self._start(source_index, BEZIER, [self.positions[source_index], *control_points, end], duration, mode)
+
+    def set_spline(self, source_index: int, points: list[list[float]], duration: float, mode: int = ONCE):
+        """
+        Move a source along a Catmull-Rom spline from its current position through each of `points`,
+        over `duration` seconds, at a constant duration per point.
+        """
+        with self.lock:
+            points = np.asarray(points, dtype=float).reshape(-1, 3)
+            self._start(source_index, SPLINE, np.concatenate([self.positions[source_index][np.newaxis], points]),
+                        duration, mode)
+
+    def set_walk(self, source_index: int, speed: float):
+        """
+        Move a source in a horizontal random walk (Brownian motion), within the bounds.
+
+        Args:
+            speed: The root-mean-square distance moved in one second, in metres.
+        """
+        with self.lock:
+            self._start(source_index, WALK)
+            self.speeds[source_index] = speed
+
+    def set_wander(self, source_index: int, speed: float):
+        """
+        Move a source smoothly in random horizontal directions, reflecting off the bounds. The source's
+        velocity varies randomly, over around wander_smoothing_time seconds.
+
+        Args:
+            speed: The root-mean-square speed of the source, in metres per second.
+        """
+        with self.lock:
+            self._start(source_index, WANDER)
+            self.speeds[source_index] = speed
+            self.velocities[source_index] = 0.0
+
+    def command(self, source_index: int, name: str, args: list):
+        """
+        Start a trajectory from an OSC command (see README).
+
+        Args:
+            source_index: The 0-indexed source index.
+            name: The name of the trajectory.
+            args: The arguments of the command.
+        """
+        if not 0 <= source_index < self.num_sources:
+            raise ValueError("Invalid source index: %d" % (source_index + 1))
+        if name != "stop" and not args:
+            raise ValueError("%s requires arguments" % name)
+        if name == "stop":
+            self.stop([source_index])
+        elif name == "circle":
+            if len(args) != 5:
+                raise ValueError("circle requires x, y, z, radius and frequency")
+            self.set_circle(source_index, list(args[:3]), float(args[3]), float(args[4]))
+        elif name == "walk":
+            self.set_walk(source_index, float(args[0]))
+        elif name == "wander":
+            self.set_wander(source_index, float(args[0]))
+        elif name in ("line", "bezier", "spline"):
+            # Points are followed by a duration and an optional mode
+            has_mode = len(args) % 3 == 2
+            mode = parse_mode(args[-1]) if has_mode else ONCE
+            num_coordinates = len(args) - 2 if has_mode else len(args) - 1
+            if num_coordinates < 3 or num_coordinates % 3:
+                raise ValueError("%s requires x, y, z coordinates followed by a duration and optional mode" % name)
+            points = np.asarray(args[:num_coordinates], dtype=float).reshape(-1, 3)
+            duration = float(args[num_coordinates])
+            if name == "line":
+                if len(points) != 1:
+                    raise ValueError("line requires one end point")
+                self.set_line(source_index, points[0], duration, mode)
+            elif name == "bezier":
+                if len(points) != 3:
+                    raise ValueError("bezier requires two control points and an end point")
+                self.set_bezier(source_index, points[:2], points[2], duration, mode)
+            else:
+                self.set_spline(source_index, points, duration, mode)
+        else:
+            raise ValueError("Invalid trajectory: %s" % name)
+
+    def tick(self, delta_seconds: float) -> np.ndarray:
+        """
+        Advance every trajectory, updating the position of each moving source.
+
+        Args:
+            delta_seconds: The time elapsed since the last tick.
+
+        Returns:
+            The indices of the sources that moved.
+        """
+        with self.lock:
+            self.time += delta_seconds
+            moving = self.get_moving_sources()
+            if not len(moving):
+                return moving
+            kinds = self.kinds
+
+            sources = np.flatnonzero(kinds == CIRCLE)
+            if len(sources):
+                angles = 2 * np.pi * self.frequencies[sources] * (self.time - self.start_times[sources])
+                centres = self.points[sources, 0]
+                self.positions[sources, 0] = centres[:, 0] + self.radii[sources] * np.sin(angles)
+                self.positions[sources, 1] = centres[:, 1] + self.radii[sources] * np.cos(angles)
+                self.positions[sources, 2] = centres[:, 2]
+
+            sources = np.flatnonzero((kinds == LINE) | (kinds == BEZIER) | (kinds == SPLINE))
+            if len(sources):
+                times = (self.time - self.start_times[sources]) / self.durations[sources]
+                progress = get_progress(times, self.modes[sources])
+                lines = kinds[sources] == LINE
+                points = self.points[sources[lines]]
+                self.positions[sources[lines]] = points[:, 0] + (points[:, 1] - points[:, 0]) * progress[lines, np.newaxis]
+                curves = kinds[sources] == BEZIER
+                self.positions[sources[curves]] = evaluate_bezier(self.points[sources[curves], :4], progress[curves])
+                splines = kinds[sources] == SPLINE
+                self.positions[sources[splines]] = evaluate_catmull_rom(self.points[sources[splines]],
+                                                                        self.num_points[sources[splines]],
+                                                                        progress[splines])
+                # Trajectories that play once stop at their end point
+                self.kinds[sources[(self.modes[sources] == ONCE) & (times >= 1.0)]] = NONE
+
+            sources = np.flatnonzero(kinds == WALK)
+            if len(sources):
+                steps = self.rng.standard_normal((len(sources), 2))
+                self.positions[sources, :2] += steps * (self.speeds[sources] * np.sqrt(delta_seconds / 2))[:, np.newaxis]
+                self.reflect(sources)
+
+            sources = np.flatnonzero(kinds == WANDER)
+            if len(sources):
+                # An Ornstein-Uhlenbeck process on velocity, whose RMS speed is `speed`
+                decay = np.exp(-delta_seconds / wander_smoothing_time)
+                noise = self.rng.standard_normal((len(sources), 2)) * np.sqrt((1 - decay ** 2) / 2)
+                velocities = self.velocities[sources]
+                velocities[:, :2] = velocities[:, :2] * decay + noise * self.speeds[sources][:, np.newaxis]
+                self.velocities[sources] = velocities
+                self.positions[sources, :2] += velocities[:, :2] * delta_seconds
+                self.reflect(sources)
+
+            return moving
+
+    def reflect(self, source_indices: np.ndarray):
+        """
+        Reflect the given sources back inside the bounds, reversing their velocity along each axis
+        at which they were reflected.
+        """
+        positions = self.positions[source_indices]
+        lower, upper = self.bounds[:, 0], self.bounds[:, 1]
+        outside = (positions < lower) | (positions > upper)
+        positions = np.where(positions < lower, 2 * lower - positions, positions)
+        positions = np.where(positions > upper, 2 * upper - positions, positions)
+        self.positions[source_indices] = np.clip(positions, lower, upper)
+        self.velocities[source_indices] = np.where(outside, -self.velocities[source_indices], self.velocities[source_indices])
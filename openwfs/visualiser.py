@@ -0,0 +1,192 @@
+import time
+import logging
+import threading
+import numpy as np
+from pythonosc.udp_client import UDPClient
+from pythonosc.osc_bundle_builder import OscBundleBuilder, IMMEDIATELY
+from pythonosc.osc_message import OscMessage
+from pythonosc.osc_message_builder import OscMessageBuilder
+from .constants import visualiser_host, visualiser_port, visualiser_rate, visualiser_threshold
+from .constants import visualiser_snapshot_interval
+
+logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# The maximum number of messages per OSC bundle, so that each bundle fits
+# comfortably within a single UDP datagram.
+#--------------------------------------------------------------------------------
+max_bundle_messages = 128
+
+
+def create_message(address: str, args: list) -> OscMessage:
+    builder = OscMessageBuilder(address=address)
+    for arg in args:
+        builder.add_arg(float(arg) if isinstance(arg, (float, np.floating)) else arg)
+    return builder.build()
+
+
+class VisualiserPublisher:
+    def __init__(self,
+                 num_sources: int,
+                 host: str = visualiser_host,
+                 port: int = visualiser_port,
+                 rate: float = visualiser_rate,
+                 threshold: float = visualiser_threshold,
+                 snapshot_interval: float = visualiser_snapshot_interval):
+        """
+        Publishes speaker and source positions to the 3D visualiser.
+
+        Source positions may be set at any rate, from any thread, and are published on a background
+        thread at most `rate` times per second. Each frame sends only the sources that have moved by
+        more than `threshold` since they were last sent, in a single OSC bundle.
+
+        A full snapshot (the visualiser's configuration, and every speaker and source) is sent on
+        start() and whenever request_snapshot() is called, for example when a viewer (re)connects.
+        Every snapshot_interval seconds, every speaker and source position is resent, so that a
+        viewer which restarts without reconnecting recovers.
+
+        Args:
+            num_sources: The number of sources.
+            host: The host of the visualiser.
+            port: The port of the visualiser.
+            rate: The maximum number of frames sent per second.
+            threshold: The distance a source must move before its position is resent, in metres.
+            snapshot_interval: The interval between position refreshes, in seconds, or 0 to disable.
+        """
+        self.num_sources = num_sources
+        self.rate = rate
+        self.threshold = threshold
+        self.snapshot_interval = snapshot_interval
+        self.client = UDPClient(host, port)
+        self.lock = threading.Lock()
+        self.positions = np.zeros((num_sources, 3))
+        self.sent_positions = np.full((num_sources, 3), np.nan)
+        self.speaker_positions = np.zeros((0, 3))
+        self.source_colours = []
+        self.needs_snapshot = True
+        self.is_running = False
+        self.thread = None
+        self.num_messages_sent = 0
+        self.num_bundles_sent = 0
+
+    def configure(self, speaker_positions: np.ndarray, source_colours: list[list[float]]):
+        """
+        Set the speaker positions and source colours sent in each snapshot.
+        """
+        self.speaker_positions = np.asarray(speaker_positions, dtype=float).reshape(-1, 3)
+        self.source_colours = list(source_colours)
+        self.request_snapshot()
+
+    def set_source_positions(self, source_indices: np.ndarray, positions: np.ndarray):
+        """
+        Set the position of one or more sources, to be published in the next frame.
+
+        Args:
+            source_indices: The 0-indexed source indices.
+            positions: The [x, y, z] position of each source, of shape [len(source_indices), 3].
+        """
+        with self.lock:
+            self.positions[source_indices] = np.asarray(positions, dtype=float).reshape(-1, 3)
+
+    def request_snapshot(self):
+        """
+        Resend the visualiser's configuration and every position in the next frame.
+        """
+        self.needs_snapshot = True
+
+    def start(self):
+        self.is_running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.is_running = False
+
+    def run(self):
+        interval = 1.0 / self.rate
+        next_frame_time = time.monotonic()
+        last_refresh_time = next_frame_time
+        while self.is_running:
+            if self.needs_snapshot:
+                self.needs_snapshot = False
+                self.send_snapshot()
+                last_refresh_time = time.monotonic()
+            elif self.snapshot_interval and time.monotonic() - last_refresh_time >= self.snapshot_interval:
+                self.send_positions()
+                last_refresh_time = time.monotonic()
+            else:
+                self.publish()
+            next_frame_time = max(next_frame_time + interval, time.monotonic())
+            time.sleep(max(0.0, next_frame_time - time.monotonic()))
+
+    def publish(self) -> int:
+        """
+        Send the sources that have moved since they were last sent, in a single bundle.
+
+        Returns:
+            The number of sources sent.
+        """
+        with self.lock:
+            positions = self.positions.copy()
+        distances = np.max(np.abs(positions - self.sent_positions), axis=1)
+        # NaN distances (never sent) compare False, so are selected explicitly
+        changed = np.flatnonzero(~(distances <= self.threshold))
+        if len(changed):
+            self.send_messages([("/source/%d/xyz" % (source_index + 1), positions[source_index].tolist())
+                                for source_index in changed])
+            self.sent_positions[changed] = positions[changed]
+        return len(changed)
+
+    def send_positions(self):
+        """
+        Send the position of every speaker and source.
+        """
+        self.send_messages([("/speaker/%d/xyz" % (index + 1), position)
+                            for index, position in enumerate(self.speaker_positions.tolist())])
+        self.sent_positions[:] = np.nan
+        self.publish()
+
+    def send_snapshot(self):
+        """
+        Send the grid, speaker and source configuration, followed by every position.
+        The visualiser needs pauses between some of these messages.
+        """
+        logger.debug("Sending visualiser snapshot")
+        self.send_messages([("/grid/xy/on", [1])])
+        time.sleep(0.1)
+        self.send_messages([("/grid/size", [4]),
+                            ("/grid/section/size", [1]),
+                            ("/grid/subdiv/num", [10])])
+        time.sleep(0.1)
+        self.send_messages([("/source/size", [30.0]),
+                            ("/source/fade", [0]),
+                            ("/speaker/number", [len(self.speaker_positions)])])
+        time.sleep(0.2)
+        self.send_messages([("/speaker/size", [30.0])])
+        time.sleep(0.1)
+        for source_index, colour in enumerate(self.source_colours[:self.num_sources]):
+            self.send_messages([("/source/number", [source_index + 1])])
+            time.sleep(0.1)
+            self.send_messages([("/source/%d/color" % (source_index + 1), colour)])
+
+        # this has to be sent after sources have been created
+        time.sleep(0.1)
+        self.send_messages([("/source/numDisplay", [1])])
+        self.send_positions()
+
+    def send_messages(self, messages: list[tuple[str, list]]):
+        """
+        Send a list of (address, args) messages, in as few bundles as possible.
+        """
+        for start in range(0, len(messages), max_bundle_messages):
+            bundle = OscBundleBuilder(IMMEDIATELY)
+            for address, args in messages[start:start + max_bundle_messages]:
+                bundle.add_content(create_message(address, args))
+            try:
+                self.client.send(bundle.build())
+            except OSError as e:
+                logger.debug("Could not send to visualiser: %s" % e)
+                return
+            self.num_bundles_sent += 1
+        self.num_messages_sent += len(messages)
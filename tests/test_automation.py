@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from openwfs.automation import AutomationPlayer, AutomationRecorder, is_automation_recording, read_header
+
+
+def record(path: str, num_sources: int, events: list) -> AutomationRecorder:
+    """
+    Record a list of (time, source_indices, positions) events, with times relative to the start
+    of the recording.
+    """
+    with AutomationRecorder(path, num_sources) as recorder:
+        for time, source_indices, positions in events:
+            update_times = np.full(len(source_indices), recorder.start_time + time)
+            recorder.record(source_indices, positions, update_times)
+    return recorder
+
+
+def test_record_and_read_back(tmp_path):
+    path = str(tmp_path / "automation.bin")
+    record(path, 2, [(0.0, [0, 1], [[0, 0, 0], [1, 1, 1]]),
+                     (0.1, [0], [[1, 0, 0]]),
+                     (0.2, [1], [[2, 2, 2]])])
+
+    assert is_automation_recording(path)
+    assert read_header(path)["num_sources"] == 2
+    player = AutomationPlayer(path)
+    assert len(player) == 4
+    assert player.num_sources == 2
+    assert player.duration == pytest.approx(0.2)
+    assert np.allclose(player.records["source"], [0, 1, 0, 1])
+
+
+def test_positions_are_interpolated(tmp_path):
+    path = str(tmp_path / "automation.bin")
+    record(path, 2, [(0.0, [0, 1], [[0, 0, 0], [1, 1, 1]]),
+                     (0.2, [0], [[2, 0, 0]])])
+
+    player = AutomationPlayer(path)
+    assert np.allclose(player.positions_at(0.0), [[0, 0, 0], [1, 1, 1]])
+    assert np.allclose(player.positions_at(0.1), [[1, 0, 0], [1, 1, 1]])
+    assert np.allclose(player.positions_at(0.5), [[2, 0, 0], [1, 1, 1]])
+
+    # Block-rate and sample-rate playback agree
+    times = np.linspace(0.0, 0.3, 31)
+    positions = AutomationPlayer(path).positions_at(times)
+    assert positions.shape == (31, 2, 3)
+    assert np.allclose(positions[:, 0, 0], np.minimum(times * 10, 2.0))
+    for time, expected in zip(times, positions):
+        assert np.allclose(AutomationPlayer(path).positions_at(time), expected)
+
+
+def test_gaps_are_held(tmp_path):
+    path = str(tmp_path / "automation.bin")
+    record(path, 1, [(0.0, [0], [[0, 0, 0]]),
+                     (2.0, [0], [[4, 0, 0]])])
+
+    # Records further apart than max_interpolation_gap are not interpolated
+    player = AutomationPlayer(path, max_interpolation_gap=0.5)
+    assert np.allclose(player.positions_at(1.0), [[0, 0, 0]])
+    assert np.allclose(player.positions_at(2.0), [[4, 0, 0]])
+
+
+def test_seek_backwards(tmp_path):
+    path = str(tmp_path / "automation.bin")
+    record(path, 1, [(0.0, [0], [[0, 0, 0]]),
+                     (0.1, [0], [[1, 0, 0]]),
+                     (0.2, [0], [[2, 0, 0]])])
+
+    player = AutomationPlayer(path)
+    assert np.allclose(player.positions_at(0.2), [[2, 0, 0]])
+    assert np.allclose(player.positions_at(0.05), [[0.5, 0, 0]])
+
+
+def test_append_continues_times(tmp_path):
+    path = str(tmp_path / "automation.bin")
+    record(path, 1, [(0.0, [0], [[0, 0, 0]]),
+                     (1.0, [0], [[1, 0, 0]])])
+    record(path, 1, [(0.5, [0], [[2, 0, 0]])])
+
+    player = AutomationPlayer(path)
+    assert len(player) == 3
+    assert np.all(np.diff(player.times) >= 0)
+    assert player.duration == pytest.approx(1.5)
+
+    with pytest.raises(ValueError):
+        AutomationRecorder(path, 2)
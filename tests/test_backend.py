@@ -0,0 +1,45 @@
+import numpy as np
+from openwfs.backend import ArrayBackend, NullBackend
+from openwfs.layout import compile_layout
+from openwfs.positions import PositionTable
+from openwfs.source import SpatialRenderer
+from openwfs.stats import RenderStats
+
+block_size = 256
+layout = compile_layout()
+
+
+def test_array_backend_renders_input():
+    # An impulse on source 0, to the left of and behind the array, and silence on source 1
+    table = PositionTable(2, [[-1.0, 3.0, 0.0], [1.0, 3.0, 0.0]])
+    input_audio = np.zeros((2, 8000), dtype=np.float32)
+    input_audio[0, 1000] = 1.0
+    backend = ArrayBackend(input_audio, num_output_channels=layout.num_speakers, block_size=block_size)
+    stats = RenderStats(1)
+    renderer = SpatialRenderer(table, stats, backend)
+    renderer.start(layout.positions.tolist())
+    renderer.join()
+
+    # The input is rendered in whole blocks, and every block is captured
+    num_frames = 32 * block_size
+    output = backend.output
+    assert output.shape == (layout.num_speakers, num_frames)
+    assert backend.frames_rendered[0] == num_frames
+    assert stats.summary()["blocks"][0] == 32
+    assert backend.realtime_factor > 0
+
+    # Nothing is output before the impulse
+    levels = np.abs(output)
+    assert np.max(levels[:, :1000]) == 0
+    assert np.max(levels) > 0
+    # The loudest speaker is on the same side as the source
+    assert layout.positions[np.argmax(np.max(levels, axis=1))][0] < 0
+
+
+def test_null_backend_renders_silence():
+    table = PositionTable(1, [[0.0, 3.0, 0.0]])
+    backend = NullBackend(num_frames=4 * block_size, num_output_channels=layout.num_speakers, block_size=block_size)
+    renderer = SpatialRenderer(table, None, backend)
+    renderer.start(layout.positions.tolist())
+    renderer.join()
+    assert backend.frames_rendered[0] == 4 * block_size
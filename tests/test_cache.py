@@ -0,0 +1,73 @@
+import numpy as np
+from openwfs.cache import DrivingFunctionCache
+from openwfs.driving import compute_driving_functions
+
+num_speakers = 24
+speaker_positions = np.stack([(np.arange(num_speakers) - num_speakers / 2) * 0.1,
+                              np.ones(num_speakers),
+                              np.zeros(num_speakers)], axis=-1)
+speaker_orientations = np.zeros(num_speakers)
+bounds = [[-2.0, 2.0], [1.5, 4.0], [-0.5, 0.5]]
+
+
+def create_cache(**kwargs) -> DrivingFunctionCache:
+    return DrivingFunctionCache(resolution=0.05, bounds=bounds, **kwargs)
+
+
+def test_grid_points_match_direct_computation():
+    cache = create_cache()
+    sources = np.array([[0.0, 2.0, 0.0], [-1.0, 3.5, 0.0], [1.5, 1.5, 0.5]])
+    gains, delays = cache.lookup(sources, speaker_positions, speaker_orientations)
+    expected_gains, expected_delays = compute_driving_functions(sources, speaker_positions, speaker_orientations)
+    assert np.allclose(gains, expected_gains, rtol=1e-5, atol=1e-7)
+    assert np.allclose(delays, expected_delays, rtol=1e-5, atol=1e-9)
+
+
+def test_interpolation_between_grid_points():
+    cache = create_cache()
+    sources = np.array([[0.012, 2.031, 0.004], [-0.737, 3.118, -0.02]])
+    gains, delays = cache.lookup(sources, speaker_positions, speaker_orientations)
+    expected_gains, expected_delays = compute_driving_functions(sources, speaker_positions, speaker_orientations)
+    assert np.max(np.abs(gains - expected_gains)) < 0.01 * np.max(expected_gains)
+    # Delays vary smoothly, so interpolating them is accurate to well under a sample at 48kHz
+    assert np.max(np.abs(delays - expected_delays)) < 0.1 / 48000
+
+
+def test_sources_outside_grid_are_computed_directly():
+    cache = create_cache()
+    sources = np.array([[0.0, 8.0, 0.0]])
+    gains, delays = cache.lookup(sources, speaker_positions, speaker_orientations)
+    expected_gains, expected_delays = compute_driving_functions(sources, speaker_positions, speaker_orientations)
+    assert np.array_equal(gains, expected_gains)
+    assert np.array_equal(delays, expected_delays)
+    assert cache.hits == cache.misses == 0
+
+
+def test_hits_and_eviction():
+    # Room for the 8 grid points surrounding a single source
+    cache = create_cache(max_size_mb=8 * 2 * 4 * num_speakers / (1024 * 1024))
+    source = np.array([[0.0, 2.0, 0.0]])
+    cache.lookup(source, speaker_positions, speaker_orientations)
+    misses = cache.misses
+    cache.lookup(source, speaker_positions, speaker_orientations)
+    assert cache.misses == misses
+    assert cache.hits > 0
+
+    # Moving far away evicts the original grid points, which are then recomputed
+    cache.lookup(np.array([[1.5, 3.5, 0.0]]), speaker_positions, speaker_orientations)
+    misses = cache.misses
+    gains, _ = cache.lookup(source, speaker_positions, speaker_orientations)
+    assert cache.misses > misses
+    assert cache.num_entries <= cache.max_entries
+    expected_gains, _ = compute_driving_functions(source, speaker_positions, speaker_orientations)
+    assert np.allclose(gains, expected_gains, rtol=1e-5, atol=1e-7)
+
+
+def test_layout_change_clears_cache():
+    cache = create_cache()
+    source = np.array([[0.0, 2.0, 0.0]])
+    cache.lookup(source, speaker_positions, speaker_orientations)
+    moved_positions = speaker_positions + [0.0, 0.5, 0.0]
+    gains, _ = cache.lookup(source, moved_positions, speaker_orientations)
+    expected_gains, _ = compute_driving_functions(source, moved_positions, speaker_orientations)
+    assert np.allclose(gains, expected_gains, rtol=1e-5, atol=1e-7)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from openwfs.calibration import Calibration, analyse_recording, create_excitation, get_sweep_start_frames
+
+sample_rate = 16000
+duration = 0.5
+offset = 0.1
+frequency_range = (100, 6000)
+ir_length = 0.05
+
+
+def simulate_recording(excitation: np.ndarray, delays: np.ndarray, gains: np.ndarray) -> np.ndarray:
+    """
+    Simulate the microphone recording of the excitation, with each driver arriving after the given
+    number of frames, at the given gain.
+    """
+    max_delay = int(np.max(delays))
+    recording = np.zeros(excitation.shape[1] + max_delay)
+    for driver_index, (delay, gain) in enumerate(zip(delays, gains)):
+        recording[delay:delay + excitation.shape[1]] += gain * excitation[driver_index]
+    return recording
+
+
+def test_excitation():
+    excitation = create_excitation(4, sample_rate, duration, offset, frequency_range)
+    starts = get_sweep_start_frames(4, sample_rate, offset)
+    sweep_length = int(duration * sample_rate)
+    assert excitation.shape == (4, starts[-1] + sweep_length)
+    for driver_index, start in enumerate(starts):
+        # Each driver plays the same sweep, starting at its own offset
+        assert np.all(excitation[driver_index, :start] == 0)
+        assert np.array_equal(excitation[driver_index, start:start + sweep_length], excitation[0, :sweep_length])
+
+
+def test_analyse_recording():
+    num_drivers = 6
+    delays = np.array([20, 20, 24, 20, 18, 20])
+    gains = np.array([1.0, 1.0, 0.5, 1.0, 1.0, -1.0])
+    excitation = create_excitation(num_drivers, sample_rate, duration, offset, frequency_range)
+    recording = simulate_recording(excitation, delays, gains)
+    calibration = analyse_recording(recording, sample_rate, num_drivers, duration=duration, offset=offset,
+                                    frequency_range=frequency_range, ir_length=ir_length)
+
+    # Drivers that arrive early are delayed to match the latest driver
+    assert np.allclose(calibration.delays, (np.max(delays) - delays) / sample_rate, atol=0.1 / sample_rate)
+    # Quiet drivers are boosted to match the median level
+    assert calibration.gains[2] == pytest.approx(2.0, rel=0.05)
+    assert np.allclose(calibration.gains[[0, 1, 3, 4, 5]], 1.0, rtol=0.05)
+    assert np.array_equal(calibration.polarities, [1, 1, 1, 1, 1, -1])
+
+
+def test_save_and_load(tmp_path):
+    calibration = Calibration(np.array([0.0, 0.001]), np.array([1.0, 0.5]), np.array([1.0, -1.0]),
+                              np.array([0.01, 0.009]), np.array([1.0, 2.0]))
+    path = str(tmp_path / "calibration.json")
+    calibration.save(path)
+    loaded = Calibration.load(path)
+    assert np.array_equal(loaded.delays, calibration.delays)
+    assert np.array_equal(loaded.gains, calibration.gains)
+    assert np.array_equal(loaded.polarities, calibration.polarities)
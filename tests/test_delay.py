@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from openwfs.delay import DelayLineBank, RingBuffer
+
+block_size = 64
+num_blocks = 16
+# A low-frequency sine, at which every interpolator is accurate
+frequency = 0.01
+
+
+def sine(frames: np.ndarray) -> np.ndarray:
+    return np.sin(2 * np.pi * frequency * frames)
+
+
+def render(bank: DelayLineBank, delays, end_delays=None) -> np.ndarray:
+    """
+    Write num_blocks blocks of the sine to every channel of the bank, reading channel 0 at the given
+    delays, and return the final block, across which the delays are ramped to end_delays.
+    """
+    delays = np.asarray(delays, dtype=float)
+    taps = np.arange(len(delays))
+    for block_index in range(num_blocks):
+        frames = np.arange(block_index * block_size, (block_index + 1) * block_size)
+        bank.write(np.tile(sine(frames), (bank.num_channels, 1)).astype(np.float32))
+        if block_index < num_blocks - 1 or end_delays is None:
+            output = bank.read(0, delays, taps=taps)
+        else:
+            output = bank.read(0, delays, np.asarray(end_delays, dtype=float), taps=taps)
+    return output
+
+
+def test_ring_buffer_windows():
+    ring = RingBuffer(1, 16, 4)
+    windows = ring.windows(4)
+    for block_index in range(5):
+        ring.write(np.arange(block_index * 3, (block_index + 1) * 3, dtype=np.float32)[np.newaxis])
+    # Every window is a contiguous read of the last 16 frames, including across the wrap point
+    start = ring.write_position - 4
+    assert np.array_equal(windows[0][start % ring.length], np.arange(11, 15))
+
+
+def test_invalid_interpolation():
+    with pytest.raises(ValueError):
+        DelayLineBank(1, 100, block_size, interpolation="cubic")
+    with pytest.raises(ValueError):
+        DelayLineBank(1, 100, block_size, interpolation="thiran")
+
+
+def test_integer_delay_is_exact():
+    bank = DelayLineBank(2, 200, block_size)
+    output = render(bank, [0, 17, 150])
+    frames = np.arange((num_blocks - 1) * block_size, num_blocks * block_size)
+    for tap, delay in enumerate([0, 17, 150]):
+        assert np.allclose(output[tap], sine(frames - delay), atol=1e-6)
+
+
+@pytest.mark.parametrize("interpolation, tolerance", [("linear", 1e-3), ("lagrange", 1e-5), ("thiran", 1e-4)])
+def test_fractional_delay(interpolation, tolerance):
+    delays = np.array([0.25, 10.5, 33.7, 120.9])
+    bank = DelayLineBank(1, 200, block_size, interpolation, num_taps=len(delays))
+    output = render(bank, delays)
+    frames = np.arange((num_blocks - 1) * block_size, num_blocks * block_size)
+    expected = sine(frames[np.newaxis, :] - bank.latency - delays[:, np.newaxis])
+    assert np.max(np.abs(output - expected)) < tolerance
+
+
+@pytest.mark.parametrize("interpolation, tolerance", [("linear", 1e-3), ("lagrange", 1e-5), ("thiran", 1e-3)])
+def test_ramped_delay(interpolation, tolerance):
+    delays = np.array([10.0, 50.3])
+    end_delays = np.array([12.5, 49.9])
+    bank = DelayLineBank(1, 200, block_size, interpolation, num_taps=len(delays))
+    output = render(bank, delays, end_delays)
+
+    # The delay of each frame is interpolated linearly from the start delay to the end delay
+    frames = np.arange((num_blocks - 1) * block_size, num_blocks * block_size)
+    ramp = delays[:, np.newaxis] + (end_delays - delays)[:, np.newaxis] * np.arange(block_size) / block_size
+    expected = sine(frames[np.newaxis, :] - bank.latency - ramp)
+    assert np.max(np.abs(output - expected)) < tolerance
+
+
+def test_ramp_is_continuous_across_blocks():
+    # Ramping to a delay and then holding it produces no discontinuity at the block boundary
+    bank = DelayLineBank(1, 200, block_size)
+    first = render(bank, [20.0], [24.0])
+    bank.write(sine(np.arange(num_blocks * block_size, (num_blocks + 1) * block_size))[np.newaxis].astype(np.float32))
+    second = bank.read(0, np.array([24.0]))
+    step = abs(second[0, 0] - first[0, -1])
+    assert step < 2 * np.max(np.abs(np.diff(first[0])))
+
+
+def test_thiran_tap_resumes_without_click():
+    # Tap 1 is not read for several blocks, during which the input keeps changing
+    bank = DelayLineBank(1, 200, block_size, "thiran", num_taps=2)
+    delays = np.array([10.3, 20.7])
+    for block_index in range(30):
+        frames = np.arange(block_index * block_size, (block_index + 1) * block_size)
+        bank.write(sine(frames)[np.newaxis].astype(np.float32))
+        taps = np.array([0]) if 10 <= block_index < 20 else np.array([0, 1])
+        output = bank.read(0, delays[taps], taps=taps)
+        if block_index == 20:
+            expected = sine(frames[np.newaxis, :] - bank.latency - delays[:, np.newaxis])
+            assert np.max(np.abs(output - expected)) < 1e-4
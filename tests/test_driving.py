@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from openwfs.constants import speed_of_sound
+from openwfs.driving import compute_driving_functions, get_speaker_spacing, speaker_normals
+
+#--------------------------------------------------------------------------------
+# A line array along the X axis at y = 1, facing the listening area at y < 1,
+# with the reference (listening) position at the origin.
+#--------------------------------------------------------------------------------
+num_speakers = 41
+speaker_spacing = 0.1
+speaker_positions = np.stack([(np.arange(num_speakers) - num_speakers // 2) * speaker_spacing,
+                              np.ones(num_speakers),
+                              np.zeros(num_speakers)], axis=-1)
+speaker_orientations = np.zeros(num_speakers)
+
+
+def test_speaker_normals():
+    normals = speaker_normals([0.0, np.pi / 2])
+    assert np.allclose(normals, [[0, -1, 0], [1, 0, 0]])
+
+
+def test_speaker_spacing():
+    assert get_speaker_spacing(speaker_positions) == pytest.approx(speaker_spacing)
+
+
+def test_source_behind_array():
+    source = [0.5, 3.0, 0.0]
+    gains, delays = compute_driving_functions([source], speaker_positions, speaker_orientations)
+    distances = np.linalg.norm(speaker_positions - source, axis=1)
+
+    assert gains.shape == delays.shape == (1, num_speakers)
+    assert np.all(gains > 0)
+    assert np.allclose(delays[0], distances / speed_of_sound)
+    # The speaker closest to the source is the loudest
+    assert np.argmax(gains[0]) == np.argmin(distances)
+
+
+def test_amplitude_term():
+    source = [0.0, 3.0, 0.0]
+    gains, _ = compute_driving_functions([source], speaker_positions, speaker_orientations)
+    vectors = speaker_positions - source
+    distances = np.linalg.norm(vectors, axis=1)
+    cosines = -vectors[:, 1] / distances
+    wavenumber = 2 * np.pi * 5000 / speed_of_sound
+    expected = speaker_spacing * np.sqrt(wavenumber / (2 * np.pi)) * cosines / np.sqrt(distances)
+    assert np.allclose(gains[0], expected)
+
+    # Gains scale with the square root of the reference distance
+    far_gains, _ = compute_driving_functions([source], speaker_positions, speaker_orientations,
+                                             reference_distance=4.0)
+    assert np.allclose(far_gains, 2 * gains)
+
+
+def test_distance_attenuation():
+    sources = [[0.0, 2.0, 0.0], [0.0, 6.0, 0.0], [0.0, 20.0, 0.0]]
+    gains, _ = compute_driving_functions(sources, speaker_positions, speaker_orientations)
+    centre = num_speakers // 2
+    assert gains[0, centre] > gains[1, centre] > gains[2, centre]
+
+
+def test_focused_source():
+    source = [0.0, 0.5, 0.0]
+    gains, delays = compute_driving_functions([source], speaker_positions, speaker_orientations)
+    active = gains[0] > 0
+    distances = np.linalg.norm(speaker_positions - source, axis=1)
+
+    assert np.any(active)
+    # Delays are time-reversed, so the nearest speaker is delayed the most, and the furthest active
+    # speaker is not delayed
+    assert np.argmax(delays[0]) == np.argmin(distances)
+    assert np.min(delays[0, active]) == pytest.approx(0.0)
+    assert np.allclose(delays[0, active], (np.max(distances[active]) - distances[active]) / speed_of_sound)
+
+
+def test_inactive_speakers():
+    # Of two speakers facing in opposite directions, a source is behind only one
+    positions = np.array([[0.0, 0.0, 0.0], [0.2, 0.0, 0.0]])
+    orientations = np.array([0.0, np.pi])
+    gains, delays = compute_driving_functions([[0.1, 1.0, 0.0]], positions, orientations)
+    assert gains[0, 0] > 0
+    assert gains[0, 1] == 0
+    assert delays[0, 1] == 0
@@ -0,0 +1,79 @@
+import threading
+import numpy as np
+from multiprocessing import Process
+from openwfs.positions import PositionTable
+
+
+def test_write_and_read():
+    table = PositionTable(3, [[0, 0, 0], [1, 1, 1], [2, 2, 2]])
+    positions, source_sequences, sequence = table.read()
+    assert np.array_equal(positions, [[0, 0, 0], [1, 1, 1], [2, 2, 2]])
+    assert np.array_equal(source_sequences, [0, 0, 0])
+
+    table.write(1, [5, 6, 7], target_time=10.0)
+    positions, target_times, source_sequences, new_sequence = table.read_targets()
+    assert np.array_equal(positions[1], [5, 6, 7])
+    assert target_times[1] == 10.0
+    assert np.isnan(target_times[0])
+    assert np.array_equal(source_sequences, [0, 1, 0])
+    assert new_sequence == sequence + 2
+    assert new_sequence % 2 == 0
+
+
+def test_write_many():
+    table = PositionTable(4)
+    table.write_many([0, 2], [[1, 2, 3], [4, 5, 6]], update_times=[1.0, 2.0])
+    positions, source_sequences, _ = table.read()
+    assert np.array_equal(positions, [[1, 2, 3], [0, 0, 0], [4, 5, 6], [0, 0, 0]])
+    assert np.array_equal(source_sequences, [1, 0, 1, 0])
+    assert np.array_equal(table.update_times[[0, 2]], [1.0, 2.0])
+    assert np.all(np.isnan(table.update_times[[1, 3]]))
+
+    position, target_time, source_sequence = table.read_source_target(2)
+    assert np.array_equal(position, [4, 5, 6])
+    assert np.isnan(target_time)
+    assert source_sequence == 1
+
+
+def write_from_process(table: PositionTable):
+    table.write(0, [1, 2, 3])
+
+
+def test_shared_between_processes():
+    table = PositionTable(2)
+    process = Process(target=write_from_process, args=(table,))
+    process.start()
+    process.join()
+    positions, source_sequences, _ = table.read()
+    assert np.array_equal(positions[0], [1, 2, 3])
+    assert source_sequences[0] == 1
+
+
+def test_reads_are_consistent_during_writes():
+    # Every write sets every coordinate of every source to the same value, so a snapshot that mixes
+    # two writes would contain different values
+    num_sources = 64
+    table = PositionTable(num_sources)
+    stop = threading.Event()
+
+    def write():
+        value = 0
+        while not stop.is_set():
+            value += 1
+            table.write_many(np.arange(num_sources), np.full((num_sources, 3), value))
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        last_sequence = 0
+        for _ in range(2000):
+            positions, target_times, source_sequences, sequence = table.read_targets()
+            assert sequence % 2 == 0
+            assert sequence >= last_sequence
+            assert np.all(positions == positions[0, 0])
+            assert np.all(source_sequences == source_sequences[0])
+            last_sequence = sequence
+    finally:
+        stop.set()
+        writer.join()
+    assert last_sequence > 0